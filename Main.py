@@ -1,13 +1,37 @@
-from OpenGL.GLUT import *
-from init import *
-from player import Player
-from camera import Camera
-from fps_counter import FPSCounter
-from position_counter import PositionCounter
-from score_counter import ScoreCounter
-from shader_program import load_shader_file, ShaderProgram
-
-from init import all_terrain_positions
+import os
+import sys
+import time
+import random
+import argparse
+from startup_trace import trace
+
+with trace.phase("import OpenGL.GLUT", "import"):
+    from OpenGL.GLUT import *
+with trace.phase("import init (OpenGL, glfw, imgui, numpy, PIL)", "import"):
+    import numpy as np
+    from init import *
+with trace.phase("import game modules (freetype)", "import"):
+    from player import Player
+    from terrain import load_heightfield, triangle_positions, TerrainIndex
+    from terrain_renderer import fit_planar_uv
+    from asset_cache import load_render_mesh
+    from world_streaming import StreamingWorld
+    from scene_layout import SceneLayout, layout_key, load_or_generate, random_seed
+    from scene_bvh import SceneBVH
+    from fixed_timestep import FixedTimestep, TICK_RATE, lerp_angle
+    from input_recording import InputRecording
+    from game_simulation import GameSimulation, monkey_transform, hummingbird_transform
+    from leaf_base import FallingLeaves
+    from model import instance_data
+    from camera import Camera
+    from fps_counter import FPSCounter
+    from position_counter import PositionCounter
+    from score_counter import ScoreCounter
+    from shader_program import load_shader_file, ShaderProgram
+    from asset_loader import AssetLoader
+    from asset_registry import registry
+
+from init import terrain_placement
 
 # Constants for object types
 OBJECT_TYPES = {
@@ -33,26 +57,511 @@ OBJECT_HEIGHT_OFFSETS = {
         "ball": -0.1
     }
 
-def main():
+# Terrain object types that block the player -> model they are drawn with
+TERRAIN_COLLIDERS = {"bark": "bark", "cactus1": "cactus1", "additional_rocks": "rock"}
+
+# Terrain object types drawn with instanced draw calls -> model they are drawn with;
+# the colliders also cast shadows, balls are repacked every frame as they get collected
+INSTANCED_PROPS = dict(TERRAIN_COLLIDERS, grass="grass")
+
+# Props scattered over the baked map, in placement order:
+# terrain object type -> (placement type, count, x and z range, minimum spacing, keep the monkey path free)
+SCENE_PROPS = {
+    "bark": ("bark", 10, (-50, 50), 5.0, True),
+    "additional_rocks": ("rock", 3, (-50, 50), 8.0, True),
+    "cactus1": ("cactus1", 100, (-50, 50), 5.0, True),
+    "ball": ("ball", 20, (-50, 50), 5.0, True),
+    "grass": ("grass", 100, (-50, 100), 2.0, False),
+}
+
+# Props collected by distance sit close to the ground, so they get exact mesh heights
+EXACT_HEIGHT_PROPS = ("ball",)
+
+# Props scattered on streamed world chunks (--stream-world), at the densities of the baked map:
+# terrain object type -> (expected count per 16 x 16 chunk, minimum spacing, height offset)
+WORLD_PROPS = {
+    "bark": (0.25, 5.0, OBJECT_HEIGHT_OFFSETS["bark"]),
+    "cactus1": (2.5, 5.0, OBJECT_HEIGHT_OFFSETS["cactus1"]),
+    "additional_rocks": (0.08, 8.0, OBJECT_HEIGHT_OFFSETS["rock"]),
+    "ball": (0.5, 5.0, OBJECT_HEIGHT_OFFSETS["ball"]),
+    "grass": (1.1, 2.0, OBJECT_HEIGHT_OFFSETS["grass"]),
+}
+
+# Path the monkey walks along, kept free of props: (x_min, x_max, z_min, z_max)
+MONKEY_PATH_ZONE = (-2.0, 2.0, -20.0, 20.0)
+
+# Falling leaf particles
+LEAF_COUNT = 5000
+
+# Headless runs steer the player with random keys, held for this many ticks each
+AUTOPILOT_HOLD_TICKS = 30
+
+# Ticks of a headless run when neither TICKS nor a recording to replay are given
+HEADLESS_TICKS = 10000
+
+# Models loaded at startup: name -> (OBJ path, texture path, material)
+MODEL_ASSETS = {
+    "ground": ("models/ground-large.obj", "textures/texture3.jpg",
+               dict(ambient=glm.vec3(0.7), diffuse=glm.vec3(1.0), specular=glm.vec3(0.3), shininess=16.0)),
+    "rock": ("models/rock.obj", "textures/rock_texture.jpg",
+             dict(ambient=glm.vec3(0.5), diffuse=glm.vec3(0.7), specular=glm.vec3(0.1), shininess=8.0)),
+    "monkey": ("models/monkey.obj", "textures/texture2.jpg",
+               dict(ambient=glm.vec3(0.8), diffuse=glm.vec3(1.2), specular=glm.vec3(0.7), shininess=64.0)),
+    "grass": ("models/grass.obj", "textures/grass_texture.jpg",
+              dict(ambient=glm.vec3(0.4), diffuse=glm.vec3(0.8), specular=glm.vec3(0.2), shininess=8.0)),
+    "sphere": ("models/sphere.obj", "textures/sphere.png",
+               dict(ambient=glm.vec3(1.0), diffuse=glm.vec3(1.5), specular=glm.vec3(1.5), shininess=128.0)),
+    "cube": ("models/cube.obj", "textures/sphere.png",
+             dict(ambient=glm.vec3(0.8), diffuse=glm.vec3(1.2), specular=glm.vec3(2.0), shininess=512.0)),
+    "light_sphere": ("models/sphere.obj", "textures/light.png",
+                     dict(ambient=glm.vec3(1.0), diffuse=glm.vec3(1.5), specular=glm.vec3(1.5), shininess=32.0)),
+    "hummingbird": ("models/koliber.obj", "textures/koliber.jpg",
+                    dict(ambient=glm.vec3(0.8), diffuse=glm.vec3(1.0), specular=glm.vec3(0.5), shininess=32.0)),
+    "lego": ("models/lego.obj", "textures/lego.png",
+             dict(ambient=glm.vec3(0.8), diffuse=glm.vec3(1.0), specular=glm.vec3(0.5), shininess=32.0)),
+    "bark": ("models/bark.obj", "textures/bark.png",
+             dict(ambient=glm.vec3(0.5), diffuse=glm.vec3(0.8), specular=glm.vec3(0.0), shininess=0.0)),
+    "cactus1": ("models/cactus1.obj", "textures/cactus.jpg",
+                dict(ambient=glm.vec3(0.5), diffuse=glm.vec3(0.8), specular=glm.vec3(0.2), shininess=16.0)),
+    "ball": ("models/sphere.obj", "textures/koliber.jpg",
+             dict(ambient=glm.vec3(0.5), diffuse=glm.vec3(0.8), specular=glm.vec3(0.2), shininess=16.0))
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Balls on Pluto")
+    parser.add_argument("--startup-report", nargs="?", const="startup_trace.json", metavar="PATH",
+                        help="exit after the first frame, write the startup timeline to PATH "
+                             "(default: startup_trace.json) and print a summary")
+    parser.add_argument("--stream-world", action="store_true",
+                        help="endless world: generate terrain and props in chunks around the player")
+    parser.add_argument("--seed", type=int, metavar="N",
+                        help="generate the scene from seed N (default: a random seed); the layout is "
+                             "stored and loaded again on later runs with the same seed and assets")
+    parser.add_argument("--layout", metavar="PATH",
+                        help="use the scene layout stored in PATH, or generate it and store it there")
+    parser.add_argument("--headless", type=int, nargs="?", const=0, metavar="TICKS",
+                        help="run TICKS simulation ticks without a window as fast as possible, with the "
+                             "player on autopilot or replaying --replay, and print ticks/s and per-subsystem "
+                             f"timings (default: the whole recording, or {HEADLESS_TICKS})")
+    parser.add_argument("--record", metavar="PATH",
+                        help="record the seed, the --layout file and the input of every simulation tick to PATH")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="replay the seed, layout and input recorded in PATH, stop after its last tick and "
+                             "check that the score and player position match the recorded run")
+    args = parser.parse_args(argv)
+    if args.stream_world:
+        if args.headless is not None:
+            parser.error("--headless does not support --stream-world")
+        if args.record or args.replay:
+            # Chunks load in the background, so the props around the player depend on timing
+            parser.error("--record and --replay do not support --stream-world")
+    return args
+
+
+def initial_transformations():
+    """Model matrices of the standalone objects by model name, as at the start of the game."""
+    return {
+        "ground": glm.translate(glm.mat4(1.0), glm.vec3(0.0, -0.8, 0.0)),
+        "rock": glm.translate(glm.mat4(1.0), glm.vec3(-5.0, -0.7, -2.0)),
+        "monkey": glm.translate(glm.mat4(1.0), glm.vec3(0.0, 1.0, 0.0)),
+        "sphere": glm.translate(glm.mat4(1.0), glm.vec3(3.0, 1.0, 0.0)),
+        "grass": glm.translate(glm.mat4(1.0), glm.vec3(0.0, 3.0, 0.0)),
+        "cube": glm.translate(glm.mat4(1.0), glm.vec3(0.0, -1.0, -5.0)),
+        #"ball": glm.translate(glm.mat4(1.0), glm.vec3(0.0, 1.0, 0.0)), 
+        "hummingbird": glm.translate(glm.mat4(1.0), glm.vec3(2.0, 2.0, -3.0)),
+        #"bark": glm.translate(glm.mat4(1.0), glm.vec3(5.0, -0.8, 0.0))
+        #"cactus1": glm.translate(glm.mat4(1.0), glm.vec3(0.0, -0.8, 0.0))
+    }
+
+
+def generate_scene_layout(seed, terrain, exclude_zone):
+    """
+    Scatters the props of SCENE_PROPS over the baked terrain.
+
+    Args:
+        seed: Scene seed; the same seed always gives the same layout
+        terrain: terrain.Heightfield of the ground; the ground mesh itself is
+            indexed for the exact heights of EXACT_HEIGHT_PROPS
+        exclude_zone: (x_min, x_max, z_min, z_max) kept free of props
+
+    Returns:
+        scene_layout.SceneLayout
+    """
+    rng = np.random.default_rng(seed)
+    terrain_placement.clear() #Czyszczenie listy przed generowaniem nowych pozycji
+
+    positions = {}
+    for object_type, (placement_type, count, (low, high), spacing, keep_path_free) in SCENE_PROPS.items():
+        with trace.phase(f"generate {placement_type} positions", "scene"):
+            points = generate_random_terrain_positions(count, low, high, spacing, OBJECT_HEIGHT_OFFSETS[placement_type],
+                                                       exclude_zone=exclude_zone if keep_path_free else None,
+                                                       object_type=placement_type, rng=rng)
+            positions[object_type] = np.array([(pos.x, pos.y, pos.z) for pos in points], dtype=np.float32).reshape(-1, 3)
+
+    # Set terrain heights from the baked heightfield, one batched query per object type
+    with trace.phase("terrain heights", "scene"):
+        print("Calculating terrain heights...")
+        terrain_index = None
+        for object_type, points in positions.items():
+            source = terrain
+            if object_type in EXACT_HEIGHT_PROPS:
+                if terrain_index is None:
+                    with trace.phase("terrain index", "scene"):
+                        terrain_index = TerrainIndex(triangle_positions(MODEL_ASSETS["ground"][0]))
+                source = terrain_index
+            placement_type = SCENE_PROPS[object_type][0]
+            points[:, 1] = source.heights_at(points[:, [0, 2]]) + OBJECT_HEIGHT_OFFSETS[placement_type]
+
+    return SceneLayout(seed, positions)
+
+
+def load_scene_layout(args, seed, terrain):
+    """
+    Returns the scene layout of a run: the one pinned with --layout, the
+    stored one of an explicitly seeded run, or a newly generated one.
+
+    Args:
+        args: Parsed command line
+        seed: Scene seed
+        terrain: terrain.Heightfield of the ground
+
+    Returns:
+        scene_layout.SceneLayout
+    """
+    # Layouts of explicitly seeded runs are stored, so relaunching with the seed skips generating them
+    recipe = [SCENE_PROPS, OBJECT_HEIGHT_OFFSETS, TYPE_SPACING, EXACT_HEIGHT_PROPS, MONKEY_PATH_ZONE]
+    key = layout_key(seed, recipe, [MODEL_ASSETS["ground"][0]]) if args.seed is not None else None
+    with trace.phase("scene layout", "scene"):
+        return load_or_generate(key, lambda: generate_scene_layout(seed, terrain, MONKEY_PATH_ZONE), args.layout)
+
+
+def apply_scene_layout(layout, models, player, scene):
+    """
+    Creates the props of a scene layout and registers their collision objects and balls.
+
+    Args:
+        layout: scene_layout.SceneLayout
+        models: Loaded models by name
+        player: Player receiving the collision objects
+        scene: scene_bvh.SceneBVH receiving the props' meshes
+
+    Returns:
+        tuple: (terrain object transforms by type, grass positions); the balls
+        are player.collectibles, so collected ones disappear
+    """
+    terrain_objects = {object_type: layout.transforms(object_type)
+                       for object_type in SCENE_PROPS if object_type not in ("grass", "ball")}
+
+    # Add terrain objects to collision system
+    with trace.phase("collision objects", "scene"):
+        for object_type, transforms in terrain_objects.items():
+            add_terrain_collisions(player, models, object_type, transforms)
+            add_scene_instances(scene, object_type, transforms)
+        for transform in layout.transforms("ball"):
+            player.add_collectible(transform)
+    terrain_objects["ball"] = player.collectibles
+
+    return terrain_objects, layout.vectors("grass")
+
+
+def add_terrain_collisions(player, models, object_type, transforms):
+    """
+    Registers collision objects for terrain props of one type.
+
+    Args:
+        player: Player receiving the collision objects
+        models: Loaded models by name
+        object_type: Terrain object type ("bark", "cactus1", "additional_rocks", ...)
+        transforms: glm.mat4 of each prop
+
+    Returns:
+        List of the added collision entries
+    """
+    model_name = TERRAIN_COLLIDERS.get(object_type)
+    if model_name is None:
+        return []
+    height_offset = OBJECT_HEIGHT_OFFSETS.get(model_name, 0.0)  # Pobierz offset wysokości
+    return [player.add_collision_object(models[model_name], transform, OBJECT_TYPES[model_name]["scale"], height_offset)
+            for transform in transforms]
+
+
+def add_scene_instances(scene, object_type, transforms):
+    """
+    Places the meshes of terrain props of one type in the scene BVH.
+
+    Args:
+        scene: scene_bvh.SceneBVH
+        object_type: Terrain object type ("bark", "cactus1", "additional_rocks", ...)
+        transforms: glm.mat4 of each prop
+
+    Returns:
+        List of the added instance ids
+    """
+    model_name = TERRAIN_COLLIDERS.get(object_type)
+    if model_name is None:
+        return []
+    return [scene.add_file(MODEL_ASSETS[model_name][0], transform, object_type) for transform in transforms]
+
+
+def add_object_collisions(player, scene, models, transformations):
+    """
+    Registers the standalone objects (rock, monkey, sphere, ...) with the
+    collision system and the scene BVH.
+
+    Args:
+        player: Player receiving the collision objects
+        scene: scene_bvh.SceneBVH
+        models: Models by name
+        transformations: Model matrices by name, see initial_transformations
+
+    Returns:
+        tuple: (collision entries by name, scene instance ids by name)
+    """
+    collision_entries = {}
+    for name, model in models.items():
+        if OBJECT_TYPES.get(name, {}).get("collision", False):
+            scale = OBJECT_TYPES[name]["scale"]
+            height_offset = OBJECT_HEIGHT_OFFSETS.get(name, 0.0)  # Pobierz offset wysokości
+            collision_entries[name] = player.add_collision_object(model, transformations.get(name, glm.mat4(1.0)),
+                                                                  scale, height_offset)
+
+    # Only the objects drawn at their own transformation; the props are added with their layout or chunks
+    with trace.phase("scene BVH", "scene"):
+        scene_instances = {name: scene.add_file(MODEL_ASSETS[name][0], transformations[name], name)
+                           for name in collision_entries if name in transformations}
+    return collision_entries, scene_instances
+
+
+def autopilot_keys(rng):
+    """Random key states for headless runs: mostly walking forwards, now and then turning."""
+    turn = rng.random()
+    return {'w': bool(rng.random() < 0.8), 's': False, 'a': bool(turn < 0.25), 'd': bool(turn > 0.75)}
+
+
+def next_tick_input(simulation, keys, replay=None, recording=None):
+    """
+    Input of the next simulation tick.
+
+    Args:
+        simulation: GameSimulation about to tick
+        keys: Current key states
+        replay: InputRecording whose input replaces keys and simulation.move_player, or None
+        recording: InputRecording the input is appended to, or None
+
+    Returns:
+        Key states for GameSimulation.tick
+    """
+    if replay is not None:
+        keys, simulation.move_player = replay[simulation.tick_count]
+    if recording is not None:
+        recording.append(keys, simulation.move_player)
+    return keys
+
+
+def finish_recordings(simulation, replay, recording, path):
+    """
+    Checks a replay that ran to its end and writes a new recording.
+
+    Returns:
+        Result of InputRecording.check, or None when no replay ran to its end
+    """
+    matches = None
+    if replay is not None and simulation.tick_count == len(replay):
+        matches = replay.check(simulation)
+    if recording is not None:
+        recording.finish(simulation)
+        try:
+            recording.save(path)
+            print(f"Recorded {len(recording)} ticks to '{path}'")
+        except OSError as e:
+            print(f"Could not write input recording '{path}': {e}")
+    return matches
+
+
+def run_headless(args, seed, replay=None, recording=None):
+    """
+    Builds the scene without a window or GL context and runs args.headless
+    simulation ticks as fast as possible, for soak tests and profiling.
+
+    Args:
+        args: Parsed command line
+        seed: Scene seed, also seeding the autopilot
+        replay: InputRecording to replay instead of the autopilot, or None
+        recording: InputRecording to record the run to, or None
+
+    Returns:
+        Exit code: 1 when a replay diverged from its recording or has no recorded outcome
+    """
+    setup_start = time.perf_counter()
+    with trace.phase("terrain heightfield", "scene"):
+        terrain = load_heightfield(MODEL_ASSETS["ground"][0])
+
+    # Without GL there are no Model objects; collision entries name their model instead
+    models = {name: name for name in MODEL_ASSETS}
+    player = Player(None, terrain)
+    scene = SceneBVH()
+    collision_entries, scene_instances = add_object_collisions(player, scene, models, initial_transformations())
+    apply_scene_layout(load_scene_layout(args, seed, terrain), models, player, scene)
+    simulation = GameSimulation(player, collision_entries, scene_instances, scene, FallingLeaves(LEAF_COUNT))
+    print(f"Headless scene set up in {(time.perf_counter() - setup_start) * 1000:.0f} ms: "
+          f"{len(player.colliders)} collision objects, {len(player.collectibles)} balls, {len(scene)} meshes")
+
+    ticks = args.headless or (len(replay) if replay is not None else HEADLESS_TICKS)
+    if replay is not None:
+        ticks = min(ticks, len(replay))
+    rng = np.random.default_rng(seed)
+    step = FixedTimestep(replay.tick_rate if replay is not None else TICK_RATE).step
+    keys = autopilot_keys(rng)
+    start = time.perf_counter()
+    for tick in range(ticks):
+        if tick % AUTOPILOT_HOLD_TICKS == 0:
+            keys = autopilot_keys(rng)
+        simulation.tick(step, next_tick_input(simulation, keys, replay, recording))
+    simulation.print_timings(time.perf_counter() - start)
+    position = player.position
+    print(f"Score: {simulation.score}, player at ({position.x:.2f}, {position.y:.2f}, {position.z:.2f})")
+    if finish_recordings(simulation, replay, recording, args.record) is False:
+        return 1
+    return 0
+
+
+def prop_instances(terrain_objects, colors, object_types=INSTANCED_PROPS):
+    """
+    Packs the transforms of scattered props for instanced drawing.
+
+    Args:
+        terrain_objects: Transforms by terrain object type
+        colors: Colors by model name
+        object_types: Terrain object types to pack -> model they are drawn with
+
+    Returns:
+        dict: model name -> ((N, 4, 4) model matrices, per-instance data from model.instance_data)
+    """
+    batches = {}
+    for object_type, model_name in object_types.items():
+        matrices = np.array(list(terrain_objects.get(object_type, ())), dtype=np.float32).reshape(-1, 4, 4)
+        batches[model_name] = (matrices, instance_data(matrices, colors[model_name]))
+    return batches
+
+
+def grass_transforms(grass_positions):
+    """Model matrices of the grass tufts at their positions."""
+    return [glm.translate(glm.mat4(1.0), position) for position in grass_positions]
+
+
+def draw_instances(model, batch, camera_position, lighting_model):
+    """
+    Draws a batch of prop instances, one instanced draw call per LOD in use.
+
+    Args:
+        model: Model the instances share
+        batch: (model matrices, per-instance data) from prop_instances
+        camera_position: Camera position, for the LOD of every instance
+        lighting_model: Lighting model (0 - Phong, 1 - Blinn-Phong)
+    """
+    matrices, instances = batch
+    if len(matrices) == 0:
+        return
+    lods = model.lods_for(matrices, camera_position)
+    for lod in np.unique(lods):
+        model.draw_instanced(instances[lods == lod], lighting_model, int(lod))
+
+
+def pick_object(scene, window, view, projection):
+    """
+    Casts a ray from the camera through the mouse cursor.
+
+    Args:
+        scene: scene_bvh.SceneBVH
+        window: GLFW window
+        view: View matrix
+        projection: Projection matrix
+
+    Returns:
+        (distance, item, normal) of the closest object under the cursor, or None
+    """
+    x, y = glfw.get_cursor_pos(window)
+    width, height = glfw.get_window_size(window)
+    if width == 0 or height == 0:
+        return None
+    ndc_x = 2.0 * x / width - 1.0
+    ndc_y = 1.0 - 2.0 * y / height
+
+    # Unproject the cursor onto the near and far planes
+    inverse = glm.inverse(projection * view)
+    near = inverse * glm.vec4(ndc_x, ndc_y, -1.0, 1.0)
+    far = inverse * glm.vec4(ndc_x, ndc_y, 1.0, 1.0)
+    near = glm.vec3(near) / near.w
+    far = glm.vec3(far) / far.w
+    return scene.first_hit(tuple(near), tuple(far - near), glm.length(far - near))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    replay = None
+    if args.replay:
+        replay = InputRecording.load(args.replay)
+        if replay is None:
+            return 1
+        if args.seed is not None and args.seed != replay.seed:
+            print(f"Replaying with the recorded seed {replay.seed} instead of {args.seed}")
+        args.seed = replay.seed
+        if args.layout != replay.layout:
+            if args.layout is not None:
+                print(f"Replaying with the recorded scene layout {replay.layout or '(from the seed)'} "
+                      f"instead of '{args.layout}'")
+            args.layout = replay.layout
+        if args.layout is not None and not os.path.exists(args.layout):
+            print(f"Recorded scene layout '{args.layout}' is missing, the replay will likely diverge")
+        print(f"Replaying {len(replay)} ticks from '{args.replay}'")
+    seed = args.seed if args.seed is not None else random_seed()
+    print(f"Scene seed: {seed}")
+    random.seed(seed)
+    recording = None
+    if args.record:
+        recording = InputRecording(seed, replay.tick_rate if replay is not None else TICK_RATE, layout=args.layout)
+    if args.headless is not None:
+        return run_headless(args, seed, replay, recording)
+
     # Initialize window and OpenGL context
-    window = init_window("Balls on Pluto")
-    glutInit()
-    imgui.create_context()
-    g.impl = GlfwRenderer(window)
-    fps_counter = FPSCounter()
-    position_counter = PositionCounter()
-    score_counter = ScoreCounter()
-
-    vertex_shader_source = load_shader_file("shadow_vertex_shader.glsl")
-    fragment_shader_source = load_shader_file("shadow_fragment_shader.glsl")
-    # Initialize shadow mapping
-    shadow_mapping = ShadowMapping()
-    shadow_program = ShaderProgram(vertex_shader_source, fragment_shader_source)
-
-    # Initialize shaders and skybox
-    program, skybox_program, leaf_program = init_shaders()
-    skybox = CSkyBox(skybox_program)
-    init_lights()
+    with trace.phase("init_window"):
+        window = init_window("Balls on Pluto")
+    with trace.phase("glutInit"):
+        glutInit()
+    with trace.phase("imgui"):
+        imgui.create_context()
+        g.impl = GlfwRenderer(window)
+
+    # Initialize shaders
+    with trace.phase("init_shaders"):
+        program, skybox_program, leaf_program = init_shaders()
+        vertex_shader_source = load_shader_file("shadow_vertex_shader.glsl")
+        fragment_shader_source = load_shader_file("shadow_fragment_shader.glsl")
+        shadow_program = ShaderProgram(vertex_shader_source, fragment_shader_source)
+
+    # Start decoding skybox, textures and meshes on worker threads
+    loader = AssetLoader()
+    loader.add_skybox("skybox", skybox_program)
+    loader.add_texture("leaf_texture", "textures/treeLeaf.png")
+    for name, (obj_path, texture_path, material) in MODEL_ASSETS.items():
+        # The ground is drawn as chunks cut from its mesh, its Model only holds the texture and material
+        loader.add_model(name, obj_path if name != "ground" else None, program, texture_path, **material)
+    if not args.stream_world:
+        loader.add_terrain("terrain", MODEL_ASSETS["ground"][0])
+
+    # Main-thread setup that does not depend on the assets runs meanwhile
+    with trace.phase("counters and TextRenderer"):
+        fps_counter = FPSCounter()
+        position_counter = PositionCounter()
+        score_counter = ScoreCounter()
+    with trace.phase("ShadowMapping and lights"):
+        shadow_mapping = ShadowMapping()
+        init_lights()
+
+    # Upload assets as they arrive while drawing a progress bar
+    with trace.phase("loading screen"):
+        assets = loader.run_loading_screen(window, g.impl)
+    skybox = assets["skybox"]
     
     # Initialize lighting variables
     lighting_vars = {
@@ -74,8 +583,9 @@ def main():
     ], dtype=np.float32)
     
     leaf_indices = np.array([0, 1, 2, 2, 3, 0], dtype=np.uint32)
-    leaf_texture = Model.load_texture(None, "textures/treeLeaf.png")
-    leaves = CMultipleLeaves(leaf_vertices, leaf_indices, 5000, leaf_texture)
+    leaf_texture = assets["leaf_texture"].texture if assets["leaf_texture"] else None
+    with trace.phase("CMultipleLeaves"):
+        leaves = CMultipleLeaves(leaf_vertices, leaf_indices, LEAF_COUNT, leaf_texture)
 
     # Initialize camera
     camera = Camera(
@@ -85,127 +595,67 @@ def main():
         angle=0.0
     )
 
-    # Initialize models with their properties
-    models = {
-        "ground": Model("models/ground-large.obj", program, "textures/texture3.jpg", 
-                       ambient=glm.vec3(0.7), diffuse=glm.vec3(1.0), specular=glm.vec3(0.3), shininess=16.0),
-        "rock": Model("models/rock.obj", program, "textures/rock_texture.jpg", 
-                     ambient=glm.vec3(0.5), diffuse=glm.vec3(0.7), specular=glm.vec3(0.1), shininess=8.0),
-        "monkey": Model("models/monkey.obj", program, "textures/texture2.jpg", 
-                       ambient=glm.vec3(0.8), diffuse=glm.vec3(1.2), specular=glm.vec3(0.7), shininess=64.0),
-        "grass": Model("models/grass.obj", program, "textures/grass_texture.jpg", 
-                      ambient=glm.vec3(0.4), diffuse=glm.vec3(0.8), specular=glm.vec3(0.2), shininess=8.0),
-        "sphere": Model("models/sphere.obj", program, "textures/sphere.png", 
-                       ambient=glm.vec3(1.0), diffuse=glm.vec3(1.5), specular=glm.vec3(1.5), shininess=128.0),
-        "cube": Model("models/cube.obj", program, "textures/sphere.png", 
-                     ambient=glm.vec3(0.8), diffuse=glm.vec3(1.2), specular=glm.vec3(2.0), shininess=512.0),
-        "light_sphere": Model("models/sphere.obj", program, "textures/light.png",
-                            ambient=glm.vec3(1.0), diffuse=glm.vec3(1.5), specular=glm.vec3(1.5), shininess=32.0),
-        "hummingbird": Model("models/koliber.obj", program, "textures/koliber.jpg",
-                           ambient=glm.vec3(0.8), diffuse=glm.vec3(1.0), specular=glm.vec3(0.5), shininess=32.0),
-        "lego": Model("models/lego.obj", program, "textures/lego.png",
-                     ambient=glm.vec3(0.8), diffuse=glm.vec3(1.0), specular=glm.vec3(0.5), shininess=32.0),
-        "bark": Model("models/bark.obj", program, "textures/bark.png",
-                       ambient=glm.vec3(0.5), diffuse=glm.vec3(0.8), specular=glm.vec3(0.0), shininess=0.0),
-        "cactus1": Model("models/cactus1.obj", program, "textures/cactus.jpg",
-                        ambient=glm.vec3(0.5), diffuse=glm.vec3(0.8), specular=glm.vec3(0.2), shininess=16.0),
-        "ball": Model("models/sphere.obj", program, "textures/koliber.jpg",
-                        ambient=glm.vec3(0.5), diffuse=glm.vec3(0.8), specular=glm.vec3(0.2), shininess=16.0)
-    }
+    # Collect the loaded models
+    models = {name: assets[name] for name in MODEL_ASSETS}
 
     # Set model names for collision detection
     for name, model in models.items():
         model.name = name
 
     # Initialize transformations
-    transformations = {
-        "ground": glm.translate(glm.mat4(1.0), glm.vec3(0.0, -0.8, 0.0)),
-        "rock": glm.translate(glm.mat4(1.0), glm.vec3(-5.0, -0.7, -2.0)),
-        "monkey": glm.translate(glm.mat4(1.0), glm.vec3(0.0, 1.0, 0.0)),
-        "sphere": glm.translate(glm.mat4(1.0), glm.vec3(3.0, 1.0, 0.0)),
-        "grass": glm.translate(glm.mat4(1.0), glm.vec3(0.0, 3.0, 0.0)),
-        "cube": glm.translate(glm.mat4(1.0), glm.vec3(0.0, -1.0, -5.0)),
-        #"ball": glm.translate(glm.mat4(1.0), glm.vec3(0.0, 1.0, 0.0)), 
-        "hummingbird": glm.translate(glm.mat4(1.0), glm.vec3(2.0, 2.0, -3.0)),
-        #"bark": glm.translate(glm.mat4(1.0), glm.vec3(5.0, -0.8, 0.0))
-        #"cactus1": glm.translate(glm.mat4(1.0), glm.vec3(0.0, -0.8, 0.0))
-    }
+    transformations = initial_transformations()
 
     # Initialize player and collision objects
-    player = Player(models["lego"], models["ground"])
+    with trace.phase("terrain heightfield", "scene"):
+        terrain = load_heightfield(MODEL_ASSETS["ground"][0])
+        print(f"Terrain heightfield: {terrain.columns}x{terrain.rows} samples, max error {terrain.max_error:.3f}")
+
+    # Meshes of the placed objects for ray queries (camera pull-in, mouse picking)
+    scene = SceneBVH()
+
+    world = None
+    if args.stream_world:
+        # Streamed props join and leave the collision system with their chunk
+        def chunk_loaded(chunk):
+            for object_type, props in chunk.props.items():
+                transforms = [transform for _, transform in props]
+                chunk.collision_entries += add_terrain_collisions(player, models, object_type, transforms)
+                chunk.scene_instances += add_scene_instances(scene, object_type, transforms)
+            chunk.collectibles = [player.add_collectible(transform) for _, transform in chunk.props.get("ball", ())]
+
+        def chunk_unloaded(chunk):
+            player.remove_collision_objects(chunk.collision_entries)
+            player.remove_collectibles(chunk.collectibles)
+            for instance in chunk.scene_instances:
+                scene.remove(instance)
+
+        # The baked map stays in the middle of an endless generated world, textured like the ground mesh
+        ground_vertices, _, ground_ranges = load_render_mesh(MODEL_ASSETS["ground"][0])
+        if ground_ranges is not None:
+            ground_vertices = ground_vertices[:ground_ranges[0][3]]
+        uv_transform = fit_planar_uv(ground_vertices)
+        world = StreamingWorld(WORLD_PROPS, seed=seed, base=terrain, uv_transform=uv_transform,
+                               exclude_zones=[MONKEY_PATH_ZONE],
+                               on_chunk_loaded=chunk_loaded, on_chunk_unloaded=chunk_unloaded)
+        terrain_chunks = world.terrain
+    else:
+        terrain_chunks = assets["terrain"]
+    with trace.phase("Player"):
+        player = Player(models["lego"], world if world is not None else terrain)
     
     # Add collision objects
-    for name, model in models.items():
-        if OBJECT_TYPES.get(name, {}).get("collision", False):
-            scale = OBJECT_TYPES[name]["scale"]
-            height_offset = OBJECT_HEIGHT_OFFSETS.get(name, 0.0)  # Pobierz offset wysokości
-            player.add_collision_object(model, transformations.get(name, glm.mat4(1.0)), scale, height_offset)
-
-    monkey_path_zone = (-2.0, 2.0, -20.0, 20.0)  # Define the path zone for the monkey
-
-    all_terrain_positions.clear() #Czyszczenie listy przed generowaniem nowych pozycji
-
-    # Generate terrain positions with appropriate height offsets
-    bark_positions = generate_random_terrain_positions(10, -50, 50, 5.0, OBJECT_HEIGHT_OFFSETS["bark"], exclude_zone=monkey_path_zone, object_type="bark")
-    additional_rock_positions = generate_random_terrain_positions(3, -50, 50, 8.0, OBJECT_HEIGHT_OFFSETS["rock"], exclude_zone=monkey_path_zone, object_type="rock")
-    cactus1_positions = generate_random_terrain_positions(100, -50, 50, 5.0, OBJECT_HEIGHT_OFFSETS["cactus1"], exclude_zone=monkey_path_zone, object_type="cactus1")
-    ball_positions = generate_random_terrain_positions(20, -50, 50, 5.0, OBJECT_HEIGHT_OFFSETS["ball"], exclude_zone=monkey_path_zone, object_type="ball")
-    grass_positions = generate_random_terrain_positions(100, -50, 100, 2.0, OBJECT_HEIGHT_OFFSETS["grass"], object_type="grass")
-    
-    
-    
-
-    # Set terrain heights with debug info for first few positions
-    print("Calculating terrain heights...")
-    for i, pos in enumerate(grass_positions):
-        debug = i < 3  # Debug tylko dla pierwszych 3 pozycji
-        height = get_terrain_height(models["ground"].vertices, pos, debug)
-        pos.y = height + OBJECT_HEIGHT_OFFSETS["grass"]
-
-    for pos in bark_positions:
-        height = get_terrain_height(models["ground"].vertices, pos)
-        pos.y = height + OBJECT_HEIGHT_OFFSETS["bark"]
-
-    for pos in cactus1_positions:
-        height = get_terrain_height(models["ground"].vertices, pos)
-        pos.y = height + OBJECT_HEIGHT_OFFSETS["cactus1"]
-
-    for pos in additional_rock_positions:
-        height = get_terrain_height(models["ground"].vertices, pos)
-        pos.y = height + OBJECT_HEIGHT_OFFSETS["rock"]
-
-    for pos in ball_positions:
-        height = get_terrain_height(models["ground"].vertices, pos)
-        pos.y = height + OBJECT_HEIGHT_OFFSETS["ball"]
-
-    # Create terrain transformations
-    terrain_objects = {
-        "bark": [glm.translate(glm.mat4(1.0), pos) for pos in bark_positions],
-        "cactus1": [glm.translate(glm.mat4(1.0), pos) for pos in cactus1_positions],
-        "additional_rocks": [glm.translate(glm.mat4(1.0), pos) for pos in additional_rock_positions],
-        "ball": [glm.translate(glm.mat4(1.0), pos) for pos in ball_positions]
-        
-    }
-
-    # Add terrain objects to collision system
-    for object_type, transforms in terrain_objects.items():
-        for transform in transforms:
-            if object_type in ["bark", "cactus1"]:
-                height_offset = OBJECT_HEIGHT_OFFSETS.get(object_type, 0.0)  # Pobierz offset wysokości
-                player.add_collision_object(
-                    models[object_type], 
-                    transform,
-                    OBJECT_TYPES[object_type]["scale"],
-                    height_offset
-                )
-            elif object_type == "additional_rocks":
-                height_offset = OBJECT_HEIGHT_OFFSETS.get("rock", 0.0)  # Pobierz offset wysokości dla kamieni
-                player.add_collision_object(
-                    models["rock"], 
-                    transform,
-                    OBJECT_TYPES["rock"]["scale"],
-                    height_offset
-                )
+    collision_entries, scene_instances = add_object_collisions(player, scene, models, transformations)
+
+    if world is not None:
+        player.bounds = None
+        with trace.phase("world chunks", "scene"):
+            world.update(player.position, block=True)
+        terrain_objects = world.prop_transforms()
+        grass_positions = [glm.vec3(transform[3]) for transform in terrain_objects.pop("grass")]
+        terrain_objects["ball"] = player.collectibles
+    else:
+        terrain_objects, grass_positions = apply_scene_layout(load_scene_layout(args, seed, terrain),
+                                                              models, player, scene)
 
     # Initialize colors
     colors = {
@@ -220,34 +670,29 @@ def main():
         "ball": glm.vec3(1.0, 0.5, 0.0),
         "cactus1": glm.vec3(0.2, 0.8, 0.2)
     }
+    prop_batches = prop_instances(dict(terrain_objects, grass=grass_transforms(grass_positions)), colors)
 
     # Initialize key states
     keys = {
         'w': False, 's': False, 'a': False, 'd': False,
         'c': False, 'c_pressed': False,
+        'mouse_pressed': False,
         'minus': False, 'equal': False,
         '0': False, '9': False,
     }
 
     # Initialize animation variables
+    clock = FixedTimestep(replay.tick_rate if replay is not None else TICK_RATE)
     last_frame_time = glfw.get_time()
-    monkey_angle = 0.0
-    monkey_z = 0.0
-    monkey_direction = 1.0
-    movement_speed = 4.0
-    rotation_speed = 50.0
-    distance_limit = 20.0
-    light_angle = 0.0
     light_radius = 8.0
-    light_speed = 5.0
     light_height = 3.0
-    hummingbird_rotation_speed = 90.0
-    hummingbird_angle = 0.0
-    
-    
+    simulation = GameSimulation(player, collision_entries, scene_instances, scene, leaves.particles, world)
+    previous_state = simulation.state()
 
     # Main game loop
+    first_frame = True
     while not glfw.window_should_close(window):
+        frame_start = time.perf_counter()
         current_frame_time = glfw.get_time()
         delta_time = current_frame_time - last_frame_time
         last_frame_time = current_frame_time
@@ -269,13 +714,12 @@ def main():
         keys['0'] = glfw.get_key(window, glfw.KEY_0) == glfw.PRESS
         keys['9'] = glfw.get_key(window, glfw.KEY_9) == glfw.PRESS
 
-        # Check for ball collection
-        collected_balls = player.check_ball_collection(terrain_objects["ball"])
-        if collected_balls:
-            # Remove collected balls in reverse order to maintain correct indices
-            for index in sorted(collected_balls, reverse=True):
-                terrain_objects["ball"].pop(index)
-                score_counter.increment()
+        # Stream world chunks around the camera; props change only when chunks did
+        if world is not None and world.update(camera.position):
+            terrain_objects = world.prop_transforms()
+            grass_positions = [glm.vec3(transform[3]) for transform in terrain_objects.pop("grass")]
+            terrain_objects["ball"] = player.collectibles
+            prop_batches = prop_instances(dict(terrain_objects, grass=grass_transforms(grass_positions)), colors)
 
         # Handle camera mode toggle
         c_key_current = glfw.get_key(window, glfw.KEY_C) == glfw.PRESS
@@ -283,59 +727,75 @@ def main():
             camera.toggle_camera_mode()
         keys['c_pressed'] = c_key_current
 
-        # Update player and camera
-        if camera.camera_mode == "third_person":
-            player.update(delta_time, keys)
-            camera.follow_player(player.position, player.direction)
-        else:
+        # The free camera only looks at the world, it moves with the frame time
+        if camera.camera_mode == "free":
             camera.update(delta_time, keys)
 
-        # Update monkey animation
-        monkey_z += monkey_direction * movement_speed * delta_time
-        if abs(monkey_z) >= distance_limit:
-            monkey_direction *= -1
-
-        monkey_angle += rotation_speed * delta_time
-        if monkey_angle >= 360.0:
-            monkey_angle -= 360.0
+        # Advance the game in fixed ticks, however long the frame took
+        simulation.move_player = camera.camera_mode == "third_person"
+        simulation.animate_light = lighting_vars['animate_light'] and not g.main_light.is_directional
+        simulation.animate_leaves = lighting_vars['animate_leaves']
+        for _ in range(clock.advance(delta_time)):
+            if replay is not None and simulation.tick_count == len(replay):
+                glfw.set_window_should_close(window, True)
+                break
+            tick_keys = next_tick_input(simulation, keys, replay, recording)
+            previous_state = simulation.state()
+            for _ in simulation.tick(clock.step, tick_keys):
+                score_counter.increment()
 
-        transformations["monkey"] = glm.translate(glm.mat4(1.0), glm.vec3(0.0, 1.0, monkey_z))
-        transformations["monkey"] = glm.rotate(transformations["monkey"], glm.radians(monkey_angle), glm.vec3(0.0, 1.0, 0.0))
+        # A replay shows the camera mode of the recorded run
+        if replay is not None and (camera.camera_mode == "third_person") != simulation.move_player:
+            camera.toggle_camera_mode()
 
-        # Update hummingbird animation
-        hummingbird_angle += hummingbird_rotation_speed * delta_time
-        if hummingbird_angle >= 360.0:
-            hummingbird_angle -= 360.0
+        # Draw the world between the last two ticks
+        alpha = clock.alpha
+        (previous_position, previous_angle, previous_direction,
+         previous_monkey_z, previous_monkey_angle, previous_hummingbird_angle, previous_light_angle) = previous_state
+        player_position = glm.mix(previous_position, player.position, alpha)
+        player_direction = glm.normalize(glm.mix(previous_direction, player.direction, alpha))
+        player_matrix = player.get_model_matrix(player_position, previous_angle + (player.angle - previous_angle) * alpha)
+        monkey_z = previous_monkey_z + (simulation.monkey_z - previous_monkey_z) * alpha
+        transformations["monkey"] = monkey_transform(monkey_z, lerp_angle(previous_monkey_angle,
+                                                                          simulation.monkey_angle, alpha))
+        transformations["hummingbird"] = hummingbird_transform(
+            lerp_angle(previous_hummingbird_angle, simulation.hummingbird_angle, alpha))
 
-        model_matrix = glm.mat4(1.0)
-        model_matrix = glm.translate(model_matrix, glm.vec3(2.0, 2.0, -3.0))
-        model_matrix = glm.rotate(model_matrix, glm.radians(hummingbird_angle), glm.vec3(0.0, 1.0, 0.0))
-        transformations["hummingbird"] = model_matrix
+        if camera.camera_mode == "third_person":
+            camera.follow_player(player_position, player_direction, scene)
 
         # Update projection matrix based on current framebuffer size
         aspect_ratio = fb_width / fb_height if fb_height != 0 else 1.0
         projection = glm.perspective(glm.radians(45.0), aspect_ratio, 0.1, 100.0)
 
+        # Pick the object under the cursor on a left click outside the UI
+        mouse_current = glfw.get_mouse_button(window, glfw.MOUSE_BUTTON_LEFT) == glfw.PRESS
+        if mouse_current and not keys['mouse_pressed'] and not imgui.get_io().want_capture_mouse:
+            hit = pick_object(scene, window, camera.get_view_matrix(), projection)
+            if hit is not None:
+                print(f"Picked {hit[1]} at distance {hit[0]:.2f}")
+        keys['mouse_pressed'] = mouse_current
+
         # Render shadows
         shadow_mapping.start_shadow_pass()
         shadow_program.use()
         shadow_program.set_mat4("lightSpaceMatrix", shadow_mapping.light_space_matrix)
         
         
-        # Draw shadow maps for main objects
+        # Draw shadow maps for main objects; the ground is drawn as chunks inside the light frustum
         for name, model in models.items():
             if name != "grass" and name != "light_sphere":
-                shadow_program.set_mat4("model", transformations.get(name, player.get_model_matrix()))
-                model.draw_shadow_map(shadow_program)
+                shadow_program.set_mat4("model", transformations.get(name, player_matrix))
+                if name == "ground":
+                    terrain_chunks.draw(shadow_mapping.light_space_matrix, camera.position, transformations["ground"])
+                    continue
+                model.draw_shadow_map(shadow_program, shadow_mapping.mesh_lod)
         
-        # Draw shadow maps for terrain objects
-        for object_type, transforms in terrain_objects.items():
-            for transform in transforms:
-                shadow_program.set_mat4("model", transform)
-                if object_type in ["bark", "cactus1"]:
-                    models[object_type].draw_shadow_map(shadow_program)
-                elif object_type == "additional_rocks":
-                    models["rock"].draw_shadow_map(shadow_program)
+        # Draw shadow maps for terrain objects, one instanced draw call per type
+        shadow_program.set_bool("useInstancing", True)
+        for model_name in TERRAIN_COLLIDERS.values():
+            models[model_name].draw_shadow_map_instanced(prop_batches[model_name][1], shadow_mapping.mesh_lod)
+        shadow_program.set_bool("useInstancing", False)
 
         shadow_mapping.end_shadow_pass(fb_width, fb_height)
 
@@ -344,12 +804,9 @@ def main():
 
         # Update animated light position
         if lighting_vars['animate_light'] and not g.main_light.is_directional:
-            light_angle += light_speed * delta_time
-            if light_angle >= 360.0:
-                light_angle -= 360.0
-            
-            light_x = math.cos(glm.radians(light_angle)) * light_radius
-            light_z = math.sin(glm.radians(light_angle)) * light_radius
+            render_light_angle = lerp_angle(previous_light_angle, simulation.light_angle, alpha)
+            light_x = math.cos(glm.radians(render_light_angle)) * light_radius
+            light_z = math.sin(glm.radians(render_light_angle)) * light_radius
             g.main_light.position = glm.vec3(light_x, light_height, light_z)
 
         # Set up view matrix
@@ -388,7 +845,8 @@ def main():
             light_transform = glm.scale(light_transform, glm.vec3(0.2))
             program.set_mat4("model", light_transform)
             program.set_int("current_object", OBJECT_NORMAL)
-            models["light_sphere"].draw(g.main_light.color, lighting_vars['current_lighting_model'])
+            models["light_sphere"].draw(g.main_light.color, lighting_vars['current_lighting_model'],
+                                        models["light_sphere"].lod_for(light_transform, camera.position))
 
         # Set up additional lights
         current_index = 1
@@ -399,7 +857,8 @@ def main():
                 light_transform = glm.scale(light_transform, glm.vec3(0.2))
                 program.set_mat4("model", light_transform)
                 program.set_int("current_object", OBJECT_NORMAL)
-                models["light_sphere"].draw(light.color, lighting_vars['current_lighting_model'])
+                models["light_sphere"].draw(light.color, lighting_vars['current_lighting_model'],
+                                            models["light_sphere"].lod_for(light_transform, camera.position))
                 current_index += 1
 
         # Draw main objects
@@ -413,36 +872,35 @@ def main():
                 else:
                     program.set_int("current_object", OBJECT_NORMAL)
                     program.set_mat4("model", transformations[name])
-                
-                model.draw(colors.get(name, glm.vec3(1.0)), lighting_vars['current_lighting_model'])
+
+                if name == "ground":
+                    # Only the chunks inside the view frustum, each at its distance LOD
+                    model.bind_material(colors.get(name, glm.vec3(1.0)), lighting_vars['current_lighting_model'])
+                    terrain_chunks.draw(projection * view, camera.position, transformations[name])
+                    continue
+                model.draw(colors.get(name, glm.vec3(1.0)), lighting_vars['current_lighting_model'],
+                           model.lod_for(transformations[name], camera.position))
 
         # Draw player (Lego)
         program.set_int("current_object", OBJECT_NORMAL)
-        program.set_mat4("model", player.get_model_matrix())
-        models["lego"].draw(colors["lego"], lighting_vars['current_lighting_model'])
+        program.set_mat4("model", player_matrix)
+        models["lego"].draw(colors["lego"], lighting_vars['current_lighting_model'],
+                            models["lego"].lod_for(player_matrix, camera.position))
 
-        # Draw terrain objects
+        # Draw terrain objects and grass instanced, one draw call per type and LOD
         program.set_int("current_object", OBJECT_NORMAL)
-        for object_type, transforms in terrain_objects.items():
-            for transform in transforms:
-                program.set_mat4("model", transform)
-                if object_type in ["bark", "cactus1"]:
-                    models[object_type].draw(colors[object_type], lighting_vars['current_lighting_model'])
-                elif object_type == "additional_rocks":
-                    models["rock"].draw(colors["rock"], lighting_vars['current_lighting_model'])
-                elif object_type == "ball":
-                    models["ball"].draw(colors["ball"], lighting_vars['current_lighting_model'])
-
-        # Draw grass
-        for pos in grass_positions:
-            program.set_mat4("model", glm.translate(glm.mat4(1.0), pos))
-            models["grass"].draw(colors["grass"], lighting_vars['current_lighting_model'])
+        program.set_bool("useInstancing", True)
+        batches = dict(prop_batches, **prop_instances(terrain_objects, colors, {"ball": "ball"}))
+        for model_name, batch in batches.items():
+            draw_instances(models[model_name], batch, camera.position, lighting_vars['current_lighting_model'])
+        program.set_bool("useInstancing", False)
 
         # Draw leaves with updated matrices
         leaf_program.use()
         leaf_program.set_mat4("view", view)
         leaf_program.set_mat4("projection", projection)
-        leaves.update_positions(delta_time, lighting_vars['animate_leaves'])
+        if lighting_vars['animate_leaves']:
+            leaves.upload()
         leaves.draw()
 
         position_counter.update((player.position.x, player.position.y, player.position.z))
@@ -474,9 +932,31 @@ def main():
         # Swap buffers
         glfw.swap_buffers(window)
 
+        if first_frame:
+            first_frame = False
+            trace.record("first frame", "frame", frame_start, time.perf_counter())
+            if args.startup_report:
+                break
+
+    replay_matches = finish_recordings(simulation, replay, recording, args.record)
+
+    if args.startup_report:
+        trace.print_summary()
+        trace.write_json(args.startup_report)
+        print(f"Startup timeline written to '{args.startup_report}'")
+
     # Cleanup
+    for model in models.values():
+        model.cleanup()
+    registry.release(assets["leaf_texture"])
+    skybox.cleanup()
+    if world is not None:
+        world.delete()
+    else:
+        terrain_chunks.delete()
     g.impl.shutdown()
     glfw.terminate()
+    return 1 if replay_matches is False else 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
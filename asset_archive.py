@@ -0,0 +1,327 @@
+import io
+import os
+import sys
+import glob
+import json
+import mmap
+import struct
+import argparse
+import threading
+import numpy as np
+
+# Archive layout: fixed header, 64-byte aligned blobs, JSON index at the end
+ARCHIVE_MAGIC = b"ASSETPAK"
+ARCHIVE_VERSION = 1
+ARCHIVE_HEADER = struct.Struct("<8sIIQQ")  # magic, version, reserved, index offset, index size
+ARCHIVE_ALIGNMENT = 64
+ARCHIVE_NAME = "assets.pak"
+
+# Frozen (PyInstaller) builds keep their data files next to the unpacked modules
+if getattr(sys, 'frozen', False):
+    BASE_DIR = sys._MEIPASS
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cache arrays read at runtime, by cache; the first group fully present for a source is baked
+RUNTIME_ARRAYS = {
+    "meshes": [("lod_vertices", "lod_indices", "lod_ranges"), ("vertices",)],
+    "textures": [("mips", "mip_shapes"), ("rgb",)],
+}
+
+# Cache arrays baked in addition, whenever they are present for a source
+OPTIONAL_ARRAYS = {
+    "meshes": ("heightfield", "heightfield_info", "heightfield_coverage",
+               "terrain_chunk_vertices", "terrain_chunk_indices", "terrain_chunk_ranges",
+               "terrain_chunk_table", "terrain_chunk_info"),
+    "textures": (),
+}
+
+# Files stored verbatim, relative to BASE_DIR
+RAW_FILE_PATTERNS = ("shaders/*.glsl", "fonts/*.ttf")
+
+
+def array_name(cache_name, source_name, tag):
+    """Archive entry name of a cached array."""
+    return f"{source_name}#{cache_name}/{tag}"
+
+
+class ArchiveWriter:
+    def __init__(self, path):
+        """
+        Writes an asset archive.
+
+        Entries are appended to a temporary file as they are added; close()
+        writes the index and moves the archive into place.
+
+        Args:
+            path: Output archive path
+        """
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.index = {}
+        self.file = open(self.tmp_path, 'wb')
+        self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, 0, 0))
+
+    def _write(self, name, data, source, **info):
+        padding = -self.file.tell() % ARCHIVE_ALIGNMENT
+        self.file.write(b"\0" * padding)
+        offset = self.file.tell()
+        self.file.write(data)
+
+        entry = {'offset': offset, 'size': len(memoryview(data).cast('B'))}
+        entry.update(info)
+        if source is not None and os.path.exists(source):
+            stat = os.stat(source)
+            entry['source'] = os.path.relpath(os.path.abspath(source), BASE_DIR).replace(os.sep, "/")
+            entry['mtime_ns'] = stat.st_mtime_ns
+            entry['source_size'] = stat.st_size
+        self.index[name] = entry
+
+    def add_bytes(self, name, data, source=None):
+        """
+        Stores a file verbatim.
+
+        Args:
+            name: Entry name (relative path with '/' separators)
+            data: File contents
+            source: File the entry was read from, for staleness checks
+        """
+        self._write(name, data, source, kind='bytes')
+
+    def add_array(self, name, array, source=None):
+        """
+        Stores a NumPy array in its in-memory layout.
+
+        Args:
+            name: Entry name, see array_name
+            array: Array to store
+            source: Asset file the array was derived from, for staleness checks
+        """
+        array = np.ascontiguousarray(array)
+        self._write(name, array.data, source, kind='array',
+                    dtype=array.dtype.str, shape=list(array.shape))
+
+    def close(self):
+        """Writes the index and header and moves the archive into place."""
+        index = json.dumps(self.index, sort_keys=True).encode('utf-8')
+        index_offset = self.file.tell()
+        self.file.write(index)
+        self.file.seek(0)
+        self.file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, 0, index_offset, len(index)))
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class AssetArchive:
+    def __init__(self, path):
+        """
+        Read-only view of an asset archive.
+
+        The whole file is memory-mapped once; entries are returned as views
+        into the mapping, so reading an asset copies nothing and only touches
+        the pages that are actually used.
+
+        Args:
+            path: Archive path
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, index_offset, index_size = ARCHIVE_HEADER.unpack_from(self._mmap, 0)
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            self._mmap.close()
+            raise ValueError(f"'{path}' is not a version {ARCHIVE_VERSION} asset archive")
+        self.index = json.loads(bytes(self._mmap[index_offset:index_offset + index_size]))
+
+    def bytes(self, name):
+        """Returns a read-only memoryview of an entry."""
+        entry = self.index[name]
+        return memoryview(self._mmap)[entry['offset']:entry['offset'] + entry['size']]
+
+    def array(self, name):
+        """Returns a read-only array viewing an entry."""
+        entry = self.index[name]
+        dtype = np.dtype(entry['dtype'])
+        count = entry['size'] // dtype.itemsize
+        return np.frombuffer(self._mmap, dtype=dtype, count=count,
+                             offset=entry['offset']).reshape(entry['shape'])
+
+
+class AssetResolver:
+    def __init__(self, base_dir=BASE_DIR, archive_path=None):
+        """
+        Single entry point for reading shipped asset files.
+
+        Assets are served from the packed archive when one is present and
+        from loose files otherwise. During development an archive entry is
+        ignored once its source file has changed, so a stale bake never hides
+        an edit.
+
+        Args:
+            base_dir: Directory that relative asset paths are resolved against
+            archive_path: Archive to use (default: ARCHIVE_NAME in base_dir)
+        """
+        self.base_dir = base_dir
+        self.archive_path = archive_path or os.path.join(base_dir, ARCHIVE_NAME)
+        self._archive = None
+        self._opened = False
+        self._lock = threading.Lock()
+
+    @property
+    def archive(self):
+        """The opened AssetArchive, or None when there is none."""
+        if not self._opened:
+            # Asset worker threads may get here at the same time
+            with self._lock:
+                if not self._opened:
+                    if os.path.exists(self.archive_path):
+                        try:
+                            self._archive = AssetArchive(self.archive_path)
+                        except (IOError, ValueError) as e:
+                            print(f"Ignoring asset archive '{self.archive_path}': {e}")
+                    self._opened = True
+        return self._archive
+
+    def name(self, path):
+        """Archive entry name of an asset path (relative to base_dir, '/' separators)."""
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.base_dir)
+        return os.path.normpath(path).replace(os.sep, "/")
+
+    def path(self, relative):
+        """Filesystem path of a loose asset file."""
+        return os.path.join(self.base_dir, relative)
+
+    def _entry(self, name):
+        archive = self.archive
+        entry = archive.index.get(name) if archive is not None else None
+        if entry is None or getattr(sys, 'frozen', False) or 'source' not in entry:
+            return entry
+        try:
+            stat = os.stat(self.path(entry['source']))
+        except OSError:
+            return entry
+        if stat.st_mtime_ns != entry['mtime_ns'] or stat.st_size != entry['source_size']:
+            return None
+        return entry
+
+    def load_array(self, cache_name, source_path, tag):
+        """
+        Returns a preprocessed array from the archive.
+
+        Args:
+            cache_name: Cache the array belongs to ("meshes" or "textures")
+            source_path: Source asset path
+            tag: Name of the cached array
+
+        Returns:
+            Read-only array viewing the archive, or None if it is not archived
+        """
+        name = array_name(cache_name, self.name(source_path), tag)
+        if self._entry(name) is None:
+            return None
+        return self.archive.array(name)
+
+    def read_bytes(self, relative):
+        """
+        Returns the contents of an asset file.
+
+        Args:
+            relative: Path relative to base_dir, e.g. "shaders/vertex_shader.glsl"
+
+        Returns:
+            memoryview into the archive, or bytes read from the loose file
+        """
+        name = self.name(relative)
+        if self._entry(name) is not None:
+            return self.archive.bytes(name)
+        with open(self.path(relative), 'rb') as file:
+            return file.read()
+
+    def read_text(self, relative, encoding='utf-8'):
+        """Returns the contents of a text asset file."""
+        return bytes(self.read_bytes(relative)).decode(encoding)
+
+    def open_binary(self, relative):
+        """Returns a binary stream over an asset file, for APIs that want a file object."""
+        return io.BytesIO(self.read_bytes(relative))
+
+
+# Resolver used by the game for all shipped assets
+resolver = AssetResolver()
+
+
+def bake(output, paths=None):
+    """
+    Packs preprocessed assets and raw data files into one archive.
+
+    Models, textures and cubemap faces are run through the asset caches and
+    stored in the binary form the runtime reads; shaders and fonts are
+    stored verbatim.
+
+    Args:
+        output: Archive path to write
+        paths: Asset files to include (default: everything shipped with the game)
+
+    Returns:
+        Number of entries written
+    """
+    from asset_cache import CACHES, warm, default_assets
+
+    paths = paths or default_assets(BASE_DIR)
+    warm(paths)
+
+    writer = ArchiveWriter(output)
+    try:
+        for path in paths:
+            source_name = resolver.name(path)
+            for cache_name, cache in CACHES.items():
+                cached = set(cache.cached_tags(path))
+                for tags in RUNTIME_ARRAYS[cache_name]:
+                    if cached.issuperset(tags):
+                        for tag in tags:
+                            writer.add_array(array_name(cache_name, source_name, tag), cache.load(path, tag), path)
+                        break
+                for tag in OPTIONAL_ARRAYS[cache_name]:
+                    if tag in cached:
+                        writer.add_array(array_name(cache_name, source_name, tag), cache.load(path, tag), path)
+
+        for pattern in RAW_FILE_PATTERNS:
+            for path in sorted(glob.glob(os.path.join(BASE_DIR, pattern))):
+                with open(path, 'rb') as file:
+                    writer.add_bytes(resolver.name(path), file.read(), path)
+    except Exception:
+        writer.file.close()
+        os.remove(writer.tmp_path)
+        raise
+    writer.close()
+    return len(writer.index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect the packed asset archive.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bake_parser = subparsers.add_parser("bake", help="pack all assets into one archive")
+    bake_parser.add_argument("paths", nargs="*", help="asset files (default: all models, textures and skyboxes)")
+    bake_parser.add_argument("--output", default=os.path.join(BASE_DIR, ARCHIVE_NAME), help="archive path")
+
+    list_parser = subparsers.add_parser("list", help="list archive entries")
+    list_parser.add_argument("--archive", default=os.path.join(BASE_DIR, ARCHIVE_NAME), help="archive path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "bake":
+        count = bake(args.output, args.paths)
+        print(f"Wrote {count} entries to '{args.output}' ({os.path.getsize(args.output) / 2**20:.1f} MiB)")
+    elif args.command == "list":
+        archive = AssetArchive(args.archive)
+        for name, entry in sorted(archive.index.items()):
+            shape = f" {entry['dtype']} {tuple(entry['shape'])}" if entry['kind'] == 'array' else ""
+            print(f"{name:<56}{entry['size'] / 1024:>10.1f} KiB{shape}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
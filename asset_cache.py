@@ -0,0 +1,573 @@
+import os
+import sys
+import json
+import struct
+import glob
+import shutil
+import hashlib
+import argparse
+import numpy as np
+
+from asset_archive import resolver
+from objloader import loadOBJPacked, streamOBJ, VERTEX_COMPONENTS
+from mesh_optimizer import optimize_mesh
+from mesh_simplify import build_lods, pack_lods
+
+# Bump when the layout of any cached array changes, or the parsers change what it holds
+CACHE_VERSION = 2
+CACHE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+# OBJ files at least this large are streamed and drawn without an index buffer
+STREAMING_THRESHOLD_BYTES = 64 << 20
+
+# Fixed size of the .npy header written by ArrayStreamWriter
+NPY_HEADER_BYTES = 128
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Computes the SHA-1 of a file's contents.
+
+    Args:
+        path: Path to the file
+        chunk_size: Read size in bytes
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _npy_header(dtype, shape):
+    """Builds a version 1.0 .npy header padded to NPY_HEADER_BYTES, so it can be rewritten in place."""
+    text = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (np.dtype(dtype).str, tuple(shape))
+    text = text.ljust(NPY_HEADER_BYTES - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(text)) + text.encode("latin1")
+
+
+class ArrayStreamWriter:
+    def __init__(self, cache, source_path, tag, width, dtype=np.float32):
+        """
+        Writes a cache array block by block without holding it in memory.
+
+        Rows are appended straight to a temporary .npy file whose header is
+        patched with the final row count on close; readers never see the
+        entry before it is complete.
+
+        Args:
+            cache: AssetCache the array belongs to
+            source_path: Source asset the array is derived from
+            tag: Name of the cached array
+            width: Columns per row
+            dtype: Element type
+        """
+        self.cache = cache
+        self.source_path = source_path
+        self.tag = tag
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+
+        key, _ = cache._validate(source_path)
+        os.makedirs(cache.directory, exist_ok=True)
+        self.path = cache._array_path(key, tag)
+        self.tmp_path = self.path + ".tmp"
+        self.file = open(self.tmp_path, 'wb')
+        self.file.write(_npy_header(self.dtype, (0, width)))
+
+    def append(self, block):
+        """
+        Appends rows to the array.
+
+        Args:
+            block: (n, width) array; it is not referenced after the call
+        """
+        block = np.ascontiguousarray(block, dtype=self.dtype)
+        if block.ndim != 2 or block.shape[1] != self.width:
+            raise ValueError(f"Expected (n, {self.width}) rows, got {block.shape}")
+        self.file.write(block.data)
+        self.rows += len(block)
+
+    def close(self):
+        """
+        Finishes the entry and records it in the cache header.
+
+        Returns:
+            Read-only memory-mapped (rows, width) array
+        """
+        shape = (self.rows, self.width)
+        self.file.seek(0)
+        self.file.write(_npy_header(self.dtype, shape))
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+        key, header = self.cache._validate(self.source_path)
+        header['arrays'][self.tag] = {'dtype': str(self.dtype), 'shape': list(shape)}
+        self.cache._write_header(key, header)
+        return np.load(self.path, mmap_mode='r')
+
+    def abort(self):
+        """Discards the partial array."""
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class AssetCache:
+    def __init__(self, name, version=CACHE_VERSION):
+        """
+        On-disk cache of arrays derived from source asset files.
+
+        Every source file gets a JSON header (path, mtime, size, content hash)
+        and one .npy file per cached array ("tag"). Arrays are loaded back
+        with numpy.memmap, so a warm load costs little more than reading
+        the bytes.
+
+        Args:
+            name: Cache subdirectory (e.g. "meshes")
+            version: Format version; entries written by another version are rebuilt
+        """
+        self.name = name
+        self.version = version
+        self.directory = os.path.join(CACHE_ROOT, name)
+
+    def _key(self, source_path):
+        path = os.path.normcase(os.path.abspath(source_path))
+        digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+        return f"{os.path.basename(source_path)}.{digest}"
+
+    def _header_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _array_path(self, key, tag):
+        return os.path.join(self.directory, f"{key}.{tag}.npy")
+
+    def _read_header(self, key):
+        try:
+            with open(self._header_path(key), 'r') as file:
+                return json.load(file)
+        except (IOError, ValueError):
+            return None
+
+    def _write_header(self, key, header):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._header_path(key) + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(header, file, indent=2)
+        os.replace(tmp_path, self._header_path(key))
+
+    def _new_header(self, source_path, stat):
+        return {
+            'source': os.path.abspath(source_path),
+            'version': self.version,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha1': file_hash(source_path),
+            'arrays': {}
+        }
+
+    def _validate(self, source_path):
+        """
+        Returns the header for a source file, invalidating stale entries.
+
+        A matching mtime and size is trusted as-is. Otherwise the content
+        hash decides: an unchanged file (e.g. after a fresh checkout) only
+        gets its header refreshed, a changed file drops all cached arrays.
+        """
+        key = self._key(source_path)
+        stat = os.stat(source_path)
+        header = self._read_header(key)
+
+        if header is None or header.get('version') != self.version:
+            self.invalidate(source_path)
+            header = self._new_header(source_path, stat)
+            self._write_header(key, header)
+            return key, header
+
+        if header['mtime_ns'] == stat.st_mtime_ns and header['size'] == stat.st_size:
+            return key, header
+
+        sha1 = file_hash(source_path)
+        if sha1 != header['sha1']:
+            self.invalidate(source_path)
+            header = self._new_header(source_path, stat)
+        else:
+            header['mtime_ns'] = stat.st_mtime_ns
+            header['size'] = stat.st_size
+        self._write_header(key, header)
+        return key, header
+
+    def load(self, source_path, tag):
+        """
+        Loads a cached array if it is present and up to date.
+
+        Arrays baked into the asset archive are served from there first, so
+        frozen builds work without the loose source files.
+
+        Args:
+            source_path: Source asset the array was derived from
+            tag: Name of the cached array
+
+        Returns:
+            Read-only memory-mapped array, or None on a cache miss
+        """
+        array = resolver.load_array(self.name, source_path, tag)
+        if array is not None:
+            return array
+
+        key, header = self._validate(source_path)
+        if tag not in header['arrays']:
+            return None
+        try:
+            return np.load(self._array_path(key, tag), mmap_mode='r')
+        except (IOError, ValueError) as e:
+            print(f"Cache entry '{tag}' for '{source_path}' is unreadable: {e}")
+            return None
+
+    def store(self, source_path, tag, array):
+        """
+        Writes an array to the cache.
+
+        Args:
+            source_path: Source asset the array was derived from
+            tag: Name of the cached array
+            array: NumPy array to store
+        """
+        key, header = self._validate(source_path)
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = self._array_path(key, tag)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            np.save(file, np.ascontiguousarray(array))
+        os.replace(tmp_path, path)
+
+        header['arrays'][tag] = {'dtype': str(array.dtype), 'shape': list(array.shape)}
+        self._write_header(key, header)
+
+    def open_stream(self, source_path, tag, width, dtype=np.float32):
+        """
+        Starts writing an array too large to build in memory.
+
+        Args:
+            source_path: Source asset the array is derived from
+            tag: Name of the cached array
+            width: Columns per row
+            dtype: Element type
+
+        Returns:
+            ArrayStreamWriter; call close() to commit or abort() to discard
+        """
+        return ArrayStreamWriter(self, source_path, tag, width, dtype)
+
+    def get_or_build(self, source_path, tag, build):
+        """
+        Returns the cached array, building and storing it on a miss.
+
+        Args:
+            source_path: Source asset the array is derived from
+            tag: Name of the cached array
+            build: Callable returning the array (or None on failure)
+
+        Returns:
+            NumPy array (memory-mapped when it came from the cache), or None
+        """
+        try:
+            array = self.load(source_path, tag)
+        except OSError as e:
+            print(f"Cache lookup failed for '{source_path}': {e}")
+            return build()
+
+        if array is not None:
+            return array
+
+        array = build()
+        if array is not None:
+            try:
+                self.store(source_path, tag, array)
+            except OSError as e:
+                print(f"Could not write cache entry for '{source_path}': {e}")
+        return array
+
+    def get_or_build_many(self, source_path, tags, build):
+        """
+        Like get_or_build, for several arrays that are produced together.
+
+        Args:
+            source_path: Source asset the arrays are derived from
+            tags: Names of the cached arrays
+            build: Callable returning a tuple of arrays in tag order (or None)
+
+        Returns:
+            Tuple of arrays, or None if building failed
+        """
+        try:
+            arrays = tuple(self.load(source_path, tag) for tag in tags)
+        except OSError as e:
+            print(f"Cache lookup failed for '{source_path}': {e}")
+            return build()
+
+        if all(array is not None for array in arrays):
+            return arrays
+
+        arrays = build()
+        if arrays is not None:
+            try:
+                for tag, array in zip(tags, arrays):
+                    self.store(source_path, tag, array)
+            except OSError as e:
+                print(f"Could not write cache entry for '{source_path}': {e}")
+        return arrays
+
+    def source_hash(self, source_path):
+        """Returns the SHA-1 of a source file's contents, hashing it only when it has changed."""
+        return self._validate(source_path)[1]['sha1']
+
+    def cached_tags(self, source_path):
+        """Returns the tags of all arrays cached for a source file."""
+        header = self._read_header(self._key(source_path))
+        return list(header['arrays']) if header is not None else []
+
+    def archived(self, source_path, tag):
+        """Returns True if the array is served from the asset archive."""
+        return resolver.load_array(self.name, source_path, tag) is not None
+
+    def invalidate(self, source_path):
+        """Removes all cached arrays for a source file."""
+        key = self._key(source_path)
+        for path in glob.glob(os.path.join(self.directory, glob.escape(key) + ".*")):
+            os.remove(path)
+
+    def clear(self):
+        """Removes the whole cache directory."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def entries(self):
+        """
+        Lists cached sources.
+
+        Returns:
+            List of header dictionaries
+        """
+        headers = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            try:
+                with open(path, 'r') as file:
+                    headers.append(json.load(file))
+            except (IOError, ValueError):
+                continue
+        return headers
+
+
+mesh_cache = AssetCache("meshes")
+texture_cache = AssetCache("textures")
+
+
+def load_mesh(obj_path):
+    """
+    Loads the packed vertex data of an OBJ file through the mesh cache.
+
+    Args:
+        obj_path: Path to the .obj file
+
+    Returns:
+        (N, 8) float32 array as produced by objloader.loadOBJPacked, or None
+    """
+    return mesh_cache.get_or_build(obj_path, "vertices", lambda: loadOBJPacked(obj_path))
+
+
+def load_indexed_mesh(obj_path):
+    """
+    Loads a deduplicated, vertex-cache-optimized mesh through the mesh cache.
+
+    Args:
+        obj_path: Path to the .obj file
+
+    Returns:
+        tuple: (vertices (M, 8) float32, indices (N,) uint32), or (None, None)
+    """
+    def build():
+        vertex_data = load_mesh(obj_path)
+        if vertex_data is None:
+            return None
+        return optimize_mesh(vertex_data)
+
+    arrays = mesh_cache.get_or_build_many(obj_path, ("indexed_vertices", "indices"), build)
+    return arrays if arrays is not None else (None, None)
+
+
+def load_lod_mesh(obj_path):
+    """
+    Loads the LOD chain of a mesh through the mesh cache.
+
+    All LODs share one vertex and one index buffer; LOD 0 comes first and is
+    the mesh returned by load_indexed_mesh.
+
+    Args:
+        obj_path: Path to the .obj file
+
+    Returns:
+        tuple: (vertices float32, indices uint32, ranges (L, 4) int64), see
+        mesh_simplify.pack_lods, or (None, None, None)
+    """
+    def build():
+        vertices, indices = load_indexed_mesh(obj_path)
+        if vertices is None:
+            return None
+        return pack_lods(build_lods(vertices, indices))
+
+    arrays = mesh_cache.get_or_build_many(obj_path, ("lod_vertices", "lod_indices", "lod_ranges"), build)
+    return arrays if arrays is not None else (None, None, None)
+
+
+def load_streamed_mesh(obj_path, progress=None):
+    """
+    Loads the packed vertex data of a very large OBJ file with bounded memory.
+
+    On a miss the file is parsed with objloader.streamOBJ and every block is
+    appended to the cache on disk, so the full vertex array is never
+    resident; the result is a memory map of the finished entry. Shares the
+    "vertices" entry with load_mesh.
+
+    Args:
+        obj_path: Path to the .obj file
+        progress: Optional progress(bytes_read, total_bytes) callback
+
+    Returns:
+        (N, 8) float32 array (memory-mapped), or None
+    """
+    try:
+        vertex_data = mesh_cache.load(obj_path, "vertices")
+        if vertex_data is not None:
+            return vertex_data
+        writer = mesh_cache.open_stream(obj_path, "vertices", VERTEX_COMPONENTS)
+    except OSError as e:
+        print(f"Cache unavailable for '{obj_path}', loading in memory: {e}")
+        return loadOBJPacked(obj_path)
+
+    try:
+        count = streamOBJ(obj_path, writer.append, progress=progress)
+    except Exception:
+        writer.abort()
+        raise
+    if count is None:
+        writer.abort()
+        return None
+    return writer.close()
+
+
+def _is_streamed(obj_path):
+    """Returns True if a mesh is (or was baked) in the streamed, non-indexed form."""
+    if mesh_cache.archived(obj_path, "lod_vertices"):
+        return False
+    if mesh_cache.archived(obj_path, "vertices"):
+        return True
+    return os.path.getsize(obj_path) >= STREAMING_THRESHOLD_BYTES
+
+
+def load_render_mesh(obj_path, progress=None):
+    """
+    Loads a mesh in the form the renderer should draw it.
+
+    Regular models get the optimized index buffer with their LOD chain.
+    Files of at least STREAMING_THRESHOLD_BYTES are streamed instead and
+    drawn as plain triangle lists without LODs: deduplicating them would
+    need the whole mesh in memory.
+
+    Args:
+        obj_path: Path to the .obj file
+        progress: Optional progress(bytes_read, total_bytes) callback (streamed files only)
+
+    Returns:
+        tuple: (vertices float32, indices uint32 or None, LOD ranges (L, 4) or None),
+        or (None, None, None)
+    """
+    if _is_streamed(obj_path):
+        vertex_data = load_streamed_mesh(obj_path, progress)
+        return (vertex_data, None, None) if vertex_data is not None else (None, None, None)
+    return load_lod_mesh(obj_path)
+
+
+# Caches known to the command line tool, by name
+CACHES = {
+    "meshes": mesh_cache,
+    "textures": texture_cache,
+}
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+CUBEMAP_FACE_NAMES = ("posx", "negx", "posy", "negy", "posz", "negz")
+
+
+def warm(paths):
+    """
+    Builds cache entries for the given asset files.
+
+    Args:
+        paths: OBJ files, textures or cubemap face images to pre-process
+    """
+    from texture_cache import load_texture_levels, load_cubemap_face
+    from terrain import TERRAIN_MODELS, load_heightfield
+    from terrain_renderer import load_mesh_chunks
+
+    terrain_names = {resolver.name(path) for path in TERRAIN_MODELS}
+    for path in paths:
+        name, ext = os.path.splitext(os.path.basename(path).lower())
+        if ext == ".obj":
+            load_render_mesh(path)
+            if resolver.name(path) in terrain_names:
+                load_heightfield(path)
+                load_mesh_chunks(path)
+        elif ext in IMAGE_EXTENSIONS and name in CUBEMAP_FACE_NAMES:
+            load_cubemap_face(path)
+        elif ext in IMAGE_EXTENSIONS:
+            load_texture_levels(path)
+        else:
+            print(f"Skipping '{path}': unsupported asset type")
+
+
+def default_assets(base_dir):
+    """Returns every model, texture and cubemap face shipped with the game."""
+    paths = sorted(glob.glob(os.path.join(base_dir, "models", "*.obj")))
+    for pattern in ("textures/*", "skybox*/*"):
+        paths += sorted(p for p in glob.glob(os.path.join(base_dir, pattern))
+                        if p.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+
+def main(argv=None):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Manage the preprocessed asset cache.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm_parser = subparsers.add_parser("warm", help="pre-build cache entries")
+    warm_parser.add_argument("paths", nargs="*", help="asset files (default: all models, textures and skyboxes)")
+
+    clear_parser = subparsers.add_parser("clear", help="delete cached entries")
+    clear_parser.add_argument("--cache", choices=sorted(CACHES), help="only clear this cache")
+
+    subparsers.add_parser("list", help="list cached entries")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        paths = args.paths or default_assets(base_dir)
+        warm(paths)
+    elif args.command == "clear":
+        for name, cache in CACHES.items():
+            if args.cache in (None, name):
+                cache.clear()
+                print(f"Cleared '{name}' cache")
+    elif args.command == "list":
+        for name, cache in CACHES.items():
+            for header in cache.entries():
+                tags = ", ".join(f"{tag} {tuple(info['shape'])}" for tag, info in header['arrays'].items())
+                print(f"[{name}] {header['source']}: {tags or 'no arrays'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import glfw
+import imgui
+from OpenGL.GL import *
+
+from asset_cache import load_render_mesh
+from asset_registry import registry
+from texture_cache import load_texture_levels, load_cubemap_face
+from model import Model
+from skybox import CSkyBox, SKYBOX_FOLDERS, cubemap_faces
+from terrain_renderer import TerrainChunks, load_mesh_chunks
+from startup_trace import trace
+
+
+class AssetLoader:
+    def __init__(self, max_workers=None):
+        """
+        Loads assets in two stages.
+
+        CPU work (mesh and texture cache reads, or OBJ parsing and PIL
+        decoding on a cache miss) runs
+        on a thread pool as soon as an asset is queued; PIL and NumPy release
+        the GIL for the heavy parts. GL objects can only be created on the
+        thread that owns the context, so finished results wait in a queue
+        until process_uploads is called from the main loop.
+
+        Args:
+            max_workers: Worker thread count (default: CPU count, at most 8)
+        """
+        if max_workers is None:
+            max_workers = min(8, os.cpu_count() or 2)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="asset-loader")
+        self._futures = {}   # (kind, path) -> Future, so files shared by several assets are read once
+        self._pending = []   # (name, futures, upload callback) in submission order
+        self.assets = {}
+        self.streaming = {}  # path -> fraction read, for OBJ files too large to load in one go
+        self.total = 0
+        self.loaded = 0
+
+    def _submit(self, kind, path, load):
+        key = (kind, path)
+        if key not in self._futures:
+            def timed_load(path):
+                with trace.phase(f"{kind} {path}", "asset"):
+                    return load(path)
+            self._futures[key] = self.executor.submit(timed_load, path)
+        return self._futures[key]
+
+    def _result(self, future):
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Asset loading failed: {e}")
+            return None
+
+    def _load_mesh(self, obj_path):
+        def report(bytes_read, total_bytes):
+            self.streaming[obj_path] = bytes_read / total_bytes if total_bytes else 1.0
+        return load_render_mesh(obj_path, report)
+
+    def add(self, name, futures, upload):
+        """
+        Queues a custom asset.
+
+        Args:
+            name: Key of the result in self.assets
+            futures: Futures of the CPU stage
+            upload: Main-thread callback receiving the future results in order
+        """
+        self._pending.append((name, futures, upload))
+        self.total += 1
+
+    def add_model(self, name, obj_path, shader_program, texture_path=None, **material):
+        """
+        Queues a Model; material keyword arguments are passed to Model.
+
+        Args:
+            name: Key of the result in self.assets
+            obj_path: Path to the .obj file, or None for a material-only Model
+            shader_program: Shader program for rendering the model
+            texture_path: Optional texture path
+        """
+        futures = [self._submit("mesh", obj_path, self._load_mesh)] if obj_path is not None else []
+        if texture_path:
+            futures.append(self._submit("texture", texture_path, load_texture_levels))
+
+        def upload(*results):
+            mesh = results[0] if obj_path is not None else None
+            texture_levels = results[-1] if texture_path else None
+            # A texture that failed to load is skipped instead of retried synchronously
+            path = texture_path if texture_levels is not None else None
+            return Model(obj_path, shader_program, path, mesh=mesh, texture_levels=texture_levels, **material)
+
+        self.add(name, futures, upload)
+
+    def add_texture(self, name, path):
+        """Queues a 2D texture; the result is a shared TextureHandle (or None on failure)."""
+        def upload(texture_levels):
+            return registry.acquire_texture(path, texture_levels) if texture_levels is not None else None
+
+        self.add(name, [self._submit("texture", path, load_texture_levels)], upload)
+
+    def add_terrain(self, name, obj_path):
+        """Queues the chunks of a terrain mesh; the result is a TerrainChunks (empty on failure)."""
+        def upload(chunks):
+            return TerrainChunks(chunks or ())
+
+        self.add(name, [self._submit("terrain", obj_path, load_mesh_chunks)], upload)
+
+    def add_skybox(self, name, shader_program, active=0):
+        """
+        Queues a CSkyBox; the six faces of the active set are decoded in
+        parallel, the other sets are loaded later by the skybox itself.
+        """
+        folder = SKYBOX_FOLDERS[active]
+        futures = [self._submit("cubemap_face", face, load_cubemap_face) for face in cubemap_faces(folder)]
+
+        def upload(*faces):
+            decoded = {folder: list(faces)} if all(face is not None for face in faces) else {}
+            return CSkyBox(shader_program, decoded, active)
+
+        self.add(name, futures, upload)
+
+    @property
+    def done(self):
+        return not self._pending
+
+    @property
+    def progress(self):
+        return self.loaded / self.total if self.total else 1.0
+
+    def process_uploads(self, time_budget=0.010):
+        """
+        Creates GL objects for assets whose CPU stage has finished. Main thread only.
+
+        Args:
+            time_budget: Seconds to spend before returning, so a loading frame can be drawn
+        """
+        deadline = time.perf_counter() + time_budget
+        pending = []
+        for entry in self._pending:
+            name, futures, upload = entry
+            if time.perf_counter() < deadline and all(future.done() for future in futures):
+                with trace.phase(f"upload {name}", "upload"):
+                    self.assets[name] = upload(*[self._result(future) for future in futures])
+                self.loaded += 1
+            else:
+                pending.append(entry)
+        self._pending = pending
+
+    def run_loading_screen(self, window, impl):
+        """
+        Uploads everything queued while drawing a progress frame.
+
+        Args:
+            window: GLFW window
+            impl: imgui GLFW renderer
+
+        Returns:
+            Dictionary of loaded assets by name
+        """
+        while not self.done:
+            glfw.poll_events()
+            impl.process_inputs()
+            self.process_uploads()
+            self.render_progress(window, impl)
+
+        self.executor.shutdown(wait=False)
+        self._futures.clear()
+        return self.assets
+
+    def render_progress(self, window, impl):
+        """Draws one loading frame with a progress bar."""
+        fb_width, fb_height = glfw.get_framebuffer_size(window)
+        glViewport(0, 0, fb_width, fb_height)
+        glClearColor(0.05, 0.05, 0.08, 1.0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glClearColor(0.0, 0.0, 0.0, 1.0)
+
+        imgui.new_frame()
+        bar_width = 300
+        imgui.set_next_window_position((fb_width - bar_width) / 2, fb_height / 2)
+        imgui.begin("Loading", flags=(
+            imgui.WINDOW_NO_RESIZE |
+            imgui.WINDOW_NO_MOVE |
+            imgui.WINDOW_NO_COLLAPSE |
+            imgui.WINDOW_NO_TITLE_BAR |
+            imgui.WINDOW_ALWAYS_AUTO_RESIZE
+        ))
+        imgui.text(f"Loading assets... {self.loaded}/{self.total}")
+        imgui.progress_bar(self.progress, (bar_width, 0))
+        for path, fraction in list(self.streaming.items()):
+            if fraction < 1.0:
+                imgui.text(f"Streaming {os.path.basename(path)}... {fraction:.0%}")
+        imgui.end()
+        imgui.render()
+        impl.render(imgui.get_draw_data())
+
+        glfw.swap_buffers(window)
@@ -0,0 +1,397 @@
+import os
+import math
+import ctypes
+import glm
+import numpy as np
+from OpenGL.GL import *
+
+from asset_cache import load_render_mesh
+from texture_cache import load_texture_levels
+from objloader import VERTEX_STRIDE, POSITION_OFFSET, NORMAL_OFFSET, UV_OFFSET
+
+# Vertices per glBufferSubData call when uploading large (memory-mapped) meshes
+UPLOAD_BLOCK_VERTICES = 1 << 16
+
+# Projected bounding-sphere size (fraction of half the screen height) below which
+# LOD i + 1 is used instead of LOD i
+LOD_SCREEN_SIZES = (0.25, 0.12, 0.05)
+DEFAULT_FOV_Y = 45.0
+
+# Per-instance attributes of instanced draws: model matrix (locations 3-6), normal
+# matrix (7-9) and color (10), column-major float32
+INSTANCE_MODEL_LOCATION = 3
+INSTANCE_NORMAL_LOCATION = 7
+INSTANCE_COLOR_LOCATION = 10
+INSTANCE_FLOATS = 16 + 9 + 3
+INSTANCE_STRIDE = INSTANCE_FLOATS * 4
+
+
+def bounding_sphere(vertex_data):
+    """
+    Bounding sphere of a mesh around the center of its bounding box.
+
+    Args:
+        vertex_data: (M, 8) interleaved vertices
+
+    Returns:
+        tuple: (center glm.vec3, radius)
+    """
+    if len(vertex_data) == 0:
+        return glm.vec3(0.0), 0.0
+    positions = np.asarray(vertex_data[:, 0:3], dtype=np.float64)
+    center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+    radius = float(np.sqrt(((positions - center) ** 2).sum(axis=1).max()))
+    return glm.vec3(*center), radius
+
+
+def upload_texture_levels(levels):
+    """
+    Uploads a precomputed RGBA mip chain, one glTexImage2D per level.
+
+    Args:
+        levels: List of (height, width, 4) uint8 arrays from texture_cache.load_texture_levels
+
+    Returns:
+        OpenGL texture ID
+    """
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+
+    for level, img_data in enumerate(levels):
+        height, width = img_data.shape[:2]
+        glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, width, height,
+                     0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, 0)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+
+    return texture
+
+
+class MeshHandle:
+    def __init__(self, key, vertex_data, indices, lod_ranges=None):
+        """
+        GPU copy of a mesh (VAO + VBO + EBO), shared between Models.
+
+        All LODs live in the same buffers and are drawn as sub-ranges of the
+        index buffer. Meshes streamed from very large files have no index
+        buffer and no LODs and are drawn as plain triangle lists.
+
+        Args:
+            key: Registry key (normalized source path)
+            vertex_data: (M, 8) float32 interleaved vertices of all LODs
+            indices: (N,) uint32 triangle indices of all LODs, or None for a triangle list
+            lod_ranges: (L, 4) first index, index count, first vertex and vertex
+                count per LOD, most detailed first (default: a single LOD)
+        """
+        if lod_ranges is None:
+            index_count = len(indices) if indices is not None else 0
+            lod_ranges = [(0, index_count, 0, len(vertex_data))]
+        self.lod_ranges = [tuple(int(value) for value in lod) for lod in lod_ranges]
+        _, index_count, _, vertex_count = self.lod_ranges[0]
+
+        self.key = key
+        # LOD 0 comes first in the shared buffers; these are what collision code sees
+        self.vertex_data = vertex_data[:vertex_count]
+        self.indices = indices[:index_count] if indices is not None else None
+        self.vertex_count = vertex_count
+        self.index_count = index_count
+        self.refcount = 0
+        self.center, self.radius = bounding_sphere(self.vertex_data)
+
+        self.vao = glGenVertexArrays(1)
+        self.vbo = glGenBuffers(1)
+        self.ebo = glGenBuffers(1) if indices is not None else None
+        self.instance_vao = None
+        self.instance_vbo = None
+        self.setup_mesh(vertex_data, indices)
+
+    @property
+    def lod_count(self):
+        return len(self.lod_ranges)
+
+    def setup_mesh(self, vertex_data, indices):
+        """
+        Configures OpenGL buffers for the mesh.
+
+        Args:
+            vertex_data: Vertices of all LODs
+            indices: Indices of all LODs, or None
+        """
+        # Setup VAO, VBO and EBO
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        if indices is not None:
+            glBufferData(GL_ARRAY_BUFFER, vertex_data.nbytes, vertex_data, GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        else:
+            # Streamed meshes are memory-mapped; upload block by block so only one is paged in at a time
+            glBufferData(GL_ARRAY_BUFFER, vertex_data.nbytes, None, GL_STATIC_DRAW)
+            for start in range(0, len(vertex_data), UPLOAD_BLOCK_VERTICES):
+                block = np.ascontiguousarray(vertex_data[start:start + UPLOAD_BLOCK_VERTICES])
+                glBufferSubData(GL_ARRAY_BUFFER, start * VERTEX_STRIDE, block.nbytes, block)
+
+        self._vertex_attributes()
+        glBindVertexArray(0)
+
+    def _vertex_attributes(self):
+        # Attribute layout of the vertex buffer, for the VAO being set up
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+
+        # Vertex positions
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, VERTEX_STRIDE,
+                             ctypes.c_void_p(POSITION_OFFSET))
+
+        # Normals
+        glEnableVertexAttribArray(2)
+        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, VERTEX_STRIDE,
+                             ctypes.c_void_p(NORMAL_OFFSET))
+
+        # Texture coordinates
+        glEnableVertexAttribArray(1)
+        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, VERTEX_STRIDE,
+                             ctypes.c_void_p(UV_OFFSET))
+
+    def _setup_instancing(self):
+        """
+        Creates a second VAO over the same vertex and index buffers, with the
+        per-instance attributes read from instance_vbo (see INSTANCE_STRIDE).
+        """
+        self.instance_vao = glGenVertexArrays(1)
+        self.instance_vbo = glGenBuffers(1)
+        glBindVertexArray(self.instance_vao)
+        self._vertex_attributes()
+        if self.ebo is not None:
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        columns = [(INSTANCE_MODEL_LOCATION + column, 4, column * 16) for column in range(4)]
+        columns += [(INSTANCE_NORMAL_LOCATION + column, 3, 64 + column * 12) for column in range(3)]
+        columns.append((INSTANCE_COLOR_LOCATION, 3, 100))
+        for location, size, offset in columns:
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, INSTANCE_STRIDE, ctypes.c_void_p(offset))
+            glVertexAttribDivisor(location, 1)
+        glBindVertexArray(0)
+
+    def select_lod(self, model_matrix, camera_position, fov_y=DEFAULT_FOV_Y):
+        """
+        Picks a LOD from the projected size of the mesh's bounding sphere.
+
+        Args:
+            model_matrix: glm.mat4 the mesh is drawn with
+            camera_position: glm.vec3 eye position
+            fov_y: Vertical field of view in degrees
+
+        Returns:
+            LOD index, 0 being the most detailed
+        """
+        if self.lod_count == 1:
+            return 0
+        center = glm.vec3(model_matrix * glm.vec4(self.center, 1.0))
+        scale = max(glm.length(glm.vec3(model_matrix[i])) for i in range(3))
+        radius = self.radius * scale
+        distance = glm.distance(center, camera_position)
+        if distance <= radius:
+            return 0
+
+        # Bounding sphere radius as a fraction of half the screen height
+        screen_size = radius / (distance * math.tan(math.radians(fov_y) / 2))
+        lod = 0
+        while lod < self.lod_count - 1 and lod < len(LOD_SCREEN_SIZES) and screen_size < LOD_SCREEN_SIZES[lod]:
+            lod += 1
+        return lod
+
+    def select_lods(self, matrices, camera_position, fov_y=DEFAULT_FOV_Y):
+        """
+        select_lod for many instances at once.
+
+        Args:
+            matrices: (N, 4, 4) model matrices, rows first (numpy.array of glm.mat4)
+            camera_position: glm.vec3 eye position
+            fov_y: Vertical field of view in degrees
+
+        Returns:
+            (N,) LOD indices
+        """
+        matrices = np.asarray(matrices, dtype=np.float64).reshape(-1, 4, 4)
+        if self.lod_count == 1:
+            return np.zeros(len(matrices), dtype=np.int64)
+        centers = matrices[:, :3, :3] @ np.asarray(self.center) + matrices[:, :3, 3]
+        scales = np.linalg.norm(matrices[:, :3, :3], axis=1).max(axis=1)
+        radii = self.radius * scales
+        distances = np.linalg.norm(centers - np.asarray(camera_position), axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            screen_sizes = radii / (distances * math.tan(math.radians(fov_y) / 2))
+        lods = np.zeros(len(matrices), dtype=np.int64)
+        for lod, size in enumerate(LOD_SCREEN_SIZES[:self.lod_count - 1]):
+            lods += (lods == lod) & (screen_sizes < size) & (distances > radii)
+        return lods
+
+    def draw(self, lod=0):
+        """
+        Issues the draw call.
+
+        Args:
+            lod: LOD index, clamped to the available range
+        """
+        glBindVertexArray(self.vao)
+        if self.indices is not None:
+            first_index, index_count, _, _ = self.lod_ranges[min(lod, self.lod_count - 1)]
+            glDrawElements(GL_TRIANGLES, index_count, GL_UNSIGNED_INT,
+                           ctypes.c_void_p(first_index * self.indices.itemsize))
+        else:
+            glDrawArrays(GL_TRIANGLES, 0, self.vertex_count)
+        glBindVertexArray(0)
+
+    def draw_instanced(self, instance_data, lod=0):
+        """
+        Draws many copies of the mesh with one draw call.
+
+        Args:
+            instance_data: (N, INSTANCE_FLOATS) float32 per-instance attributes
+                (model.instance_data), uploaded before drawing
+            lod: LOD index, clamped to the available range
+        """
+        count = len(instance_data)
+        if count == 0:
+            return
+        if self.instance_vao is None:
+            self._setup_instancing()
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, instance_data.nbytes, np.ascontiguousarray(instance_data), GL_STREAM_DRAW)
+        glBindVertexArray(self.instance_vao)
+        if self.indices is not None:
+            first_index, index_count, _, _ = self.lod_ranges[min(lod, self.lod_count - 1)]
+            glDrawElementsInstanced(GL_TRIANGLES, index_count, GL_UNSIGNED_INT,
+                                    ctypes.c_void_p(first_index * self.indices.itemsize), count)
+        else:
+            glDrawArraysInstanced(GL_TRIANGLES, 0, self.vertex_count, count)
+        glBindVertexArray(0)
+
+    def delete(self):
+        """Frees the OpenGL buffers."""
+        vertex_arrays = [array for array in (self.vao, self.instance_vao) if array is not None]
+        glDeleteVertexArrays(len(vertex_arrays), vertex_arrays)
+        buffers = [buffer for buffer in (self.vbo, self.ebo, self.instance_vbo) if buffer is not None]
+        glDeleteBuffers(len(buffers), buffers)
+        self.vao = self.vbo = self.ebo = None
+        self.instance_vao = self.instance_vbo = None
+
+
+class TextureHandle:
+    def __init__(self, key, texture):
+        """
+        Shared 2D texture.
+
+        Args:
+            key: Registry key (normalized source path)
+            texture: OpenGL texture ID
+        """
+        self.key = key
+        self.texture = texture
+        self.refcount = 0
+
+    def delete(self):
+        """Frees the OpenGL texture."""
+        glDeleteTextures(1, [self.texture])
+        self.texture = None
+
+
+class AssetRegistry:
+    def __init__(self):
+        """
+        Reference-counted store of GPU meshes and textures keyed by source path.
+
+        Models acquire handles instead of owning GL objects, so a file used by
+        several Models is uploaded once. The GL objects are deleted when the
+        last handle is released.
+        """
+        self._meshes = {}
+        self._textures = {}
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def acquire_mesh(self, obj_path, mesh=None):
+        """
+        Returns the shared GPU mesh for an OBJ file, uploading it on first use.
+
+        Args:
+            obj_path: Path to the .obj file
+            mesh: Optional preloaded (vertices, indices, LOD ranges) from
+                asset_cache.load_render_mesh; ignored when already resident
+
+        Returns:
+            MeshHandle
+        """
+        key = self._key(obj_path)
+        handle = self._meshes.get(key)
+        if handle is None:
+            if mesh is None:
+                mesh = load_render_mesh(obj_path)
+            handle = MeshHandle(key, *mesh)
+            self._meshes[key] = handle
+        handle.refcount += 1
+        return handle
+
+    def acquire_texture(self, path, texture_levels=None):
+        """
+        Returns the shared texture for an image file, uploading it on first use.
+
+        Args:
+            path: Path to the texture file
+            texture_levels: Optional mip chain from texture_cache.load_texture_levels
+
+        Returns:
+            TextureHandle
+        """
+        key = self._key(path)
+        handle = self._textures.get(key)
+        if handle is None:
+            if texture_levels is None:
+                texture_levels = load_texture_levels(path)
+            handle = TextureHandle(key, upload_texture_levels(texture_levels))
+            self._textures[key] = handle
+        handle.refcount += 1
+        return handle
+
+    def release(self, handle):
+        """
+        Drops one reference; the GL objects are deleted with the last one.
+
+        Args:
+            handle: MeshHandle or TextureHandle (None is ignored)
+        """
+        if handle is None or handle.refcount <= 0:
+            return
+        handle.refcount -= 1
+        if handle.refcount == 0:
+            store = self._meshes if isinstance(handle, MeshHandle) else self._textures
+            if store.get(handle.key) is handle:
+                del store[handle.key]
+            handle.delete()
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with resident mesh/texture counts and total references
+        """
+        return {
+            'meshes': len(self._meshes),
+            'mesh_refs': sum(h.refcount for h in self._meshes.values()),
+            'textures': len(self._textures),
+            'texture_refs': sum(h.refcount for h in self._textures.values()),
+        }
+
+
+# Registry shared by all Models unless one is passed explicitly
+registry = AssetRegistry()
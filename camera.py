@@ -16,6 +16,7 @@ class Camera:
         # Third-person camera parameters
         self.offset_distance = 5.0  # Distance from the character
         self.offset_height = 2.0    # Height above the character
+        self.collision_margin = 0.3  # Distance kept from geometry between the camera and the character
         
         # Camera mode
         self.camera_mode = "third_person"  # "third_person" or "free"
@@ -71,20 +72,34 @@ class Camera:
             self.front = glm.vec3(0.0, 0.0, -1.0)
             self.angle = 0.0
 
-    def follow_player(self, player_pos, player_direction):
+    def follow_player(self, player_pos, player_direction, scene=None):
         """
         Update camera position in third-person mode
+
+        Args:
+            player_pos: Position of the character
+            player_direction: Direction the character faces
+            scene: Optional scene_bvh.SceneBVH; when geometry lies between the
+                character and the camera, the camera is pulled in in front of it
         """
         if self.camera_mode == "third_person":
             # Calculate camera offset relative to the player
             offset = -player_direction * self.offset_distance
             offset.y = self.offset_height
             
+            # Set the point the camera is looking at (slightly above the character)
+            target = player_pos + glm.vec3(0.0, 1.0, 0.0)
+
             # Set the camera position
             self.position = player_pos + offset
+            if scene is not None:
+                fraction = scene.segment_hit(tuple(target), tuple(self.position))
+                if fraction is not None:
+                    # Never all the way onto the target, where there would be no view direction
+                    arm = self.position - target
+                    fraction = max(fraction - self.collision_margin / glm.length(arm), 0.1)
+                    self.position = target + arm * fraction
             
-            # Set the point the camera is looking at (slightly above the character)
-            target = player_pos + glm.vec3(0.0, 1.0, 0.0)
             self.front = glm.normalize(target - self.position)
 
     def get_view_matrix(self):
@@ -0,0 +1,62 @@
+import math
+
+# Simulation ticks per second
+TICK_RATE = 60
+
+# Most ticks run for one rendered frame; time beyond that is dropped, so a long stall
+# slows the game down for a moment instead of making every following frame catch up
+MAX_TICKS_PER_FRAME = 5
+
+
+def lerp_angle(previous, current, alpha):
+    """Interpolates between two angles in degrees along the shorter way round."""
+    difference = (current - previous + 180.0) % 360.0 - 180.0
+    return previous + difference * alpha
+
+
+class FixedTimestep:
+    def __init__(self, rate=TICK_RATE, max_ticks=MAX_TICKS_PER_FRAME):
+        """
+        Accumulator that turns variable frame times into fixed simulation ticks.
+
+        Every tick advances the simulation by exactly 1 / rate seconds, so the
+        game behaves the same at any frame rate and a slow frame cannot make
+        one huge step. The time left over after the last tick of a frame is
+        kept for the next frame; `alpha` tells how far the rendered frame lies
+        between the last two ticks, for interpolating what is drawn.
+
+        Args:
+            rate: Ticks per second
+            max_ticks: Most ticks per frame
+        """
+        self.step = 1.0 / rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+        self.tick_count = 0
+        self.dropped_time = 0.0
+
+    def advance(self, frame_time):
+        """
+        Adds the duration of a rendered frame.
+
+        Args:
+            frame_time: Seconds since the previous frame
+
+        Returns:
+            Number of ticks to simulate now
+        """
+        self.accumulator += max(frame_time, 0.0)
+        ticks = min(int(math.floor(self.accumulator / self.step)), self.max_ticks)
+        self.accumulator -= ticks * self.step
+        if self.accumulator >= self.step:
+            # Behind by more than max_ticks: drop the backlog but keep the fraction for interpolation
+            backlog = self.accumulator - self.accumulator % self.step
+            self.dropped_time += backlog
+            self.accumulator -= backlog
+        self.tick_count += ticks
+        return ticks
+
+    @property
+    def alpha(self):
+        """Fraction of a tick the rendered frame lies after the last simulated tick (0 to 1)."""
+        return self.accumulator / self.step
@@ -0,0 +1,156 @@
+import time
+import glm
+
+# Parts of a tick timed by GameSimulation, in the order they run
+SUBSYSTEMS = ("player", "balls", "animation", "leaves")
+
+
+def monkey_transform(z, angle):
+    """Model matrix of the monkey walking along the z axis and turning around itself."""
+    transform = glm.translate(glm.mat4(1.0), glm.vec3(0.0, 1.0, z))
+    return glm.rotate(transform, glm.radians(angle), glm.vec3(0.0, 1.0, 0.0))
+
+
+def hummingbird_transform(angle):
+    """Model matrix of the hummingbird turning in place."""
+    transform = glm.translate(glm.mat4(1.0), glm.vec3(2.0, 2.0, -3.0))
+    return glm.rotate(transform, glm.radians(angle), glm.vec3(0.0, 1.0, 0.0))
+
+
+class GameSimulation:
+    def __init__(self, player, collision_entries, scene_instances, scene, leaves=None, world=None):
+        """
+        The game logic, advanced one fixed tick at a time and free of any drawing.
+
+        The windowed game and headless runs (Main.py --headless) step the
+        same object, so both simulate exactly the same thing. The time spent
+        in every subsystem is summed up in `timings`.
+
+        Args:
+            player: Player, with its collision objects and balls registered
+            collision_entries: Collision entries of the standalone objects by model name
+            scene_instances: SceneBVH instance ids of the standalone objects by model name
+            scene: scene_bvh.SceneBVH the moving objects are kept up to date in
+            leaves: leaf_base.FallingLeaves particles, or None
+            world: StreamingWorld collected balls are removed from, or None
+        """
+        self.player = player
+        self.collision_entries = collision_entries
+        self.scene_instances = scene_instances
+        self.scene = scene
+        self.leaves = leaves
+        self.world = world
+
+        # Switches set by the game from its camera mode and context menu
+        self.move_player = True
+        self.animate_light = True
+        self.animate_leaves = True
+
+        # Monkey walking back and forth along the z axis while turning
+        self.monkey_angle = 0.0
+        self.monkey_z = 0.0
+        self.monkey_direction = 1.0
+        self.movement_speed = 4.0
+        self.rotation_speed = 50.0
+        self.distance_limit = 20.0
+
+        self.hummingbird_rotation_speed = 90.0
+        self.hummingbird_angle = 0.0
+        self.light_speed = 5.0
+        self.light_angle = 0.0
+
+        self.score = 0
+        self.tick_count = 0
+        self.timings = dict.fromkeys(SUBSYSTEMS, 0.0)
+
+    def state(self):
+        """
+        Snapshot of what is drawn, for interpolating between two ticks.
+
+        Returns:
+            tuple: (player position, player angle, player direction, monkey z,
+            monkey angle, hummingbird angle, light angle)
+        """
+        return (glm.vec3(self.player.position), self.player.angle, glm.vec3(self.player.direction),
+                self.monkey_z, self.monkey_angle, self.hummingbird_angle, self.light_angle)
+
+    def tick(self, step, keys):
+        """
+        Advances the game by one tick.
+
+        Args:
+            step: Tick length in seconds
+            keys: Key states ('w', 's', 'a', 'd', ...)
+
+        Returns:
+            List of the transforms of the balls collected in this tick
+        """
+        timings = self.timings
+        start = time.perf_counter()
+
+        # Player movement and collision
+        if self.move_player:
+            self.player.update(step, keys)
+        now = time.perf_counter()
+        timings["player"] += now - start
+        start = now
+
+        # Ball collection; collected balls leave player.collectibles and so the scene
+        collected = self.player.check_ball_collection()
+        for transform in collected:
+            if self.world is not None:
+                self.world.remove_prop("ball", transform)
+        self.score += len(collected)
+        now = time.perf_counter()
+        timings["balls"] += now - start
+        start = now
+
+        # Monkey, hummingbird and light animation
+        self.monkey_z += self.monkey_direction * self.movement_speed * step
+        if abs(self.monkey_z) >= self.distance_limit:
+            self.monkey_direction *= -1
+
+        self.monkey_angle += self.rotation_speed * step
+        if self.monkey_angle >= 360.0:
+            self.monkey_angle -= 360.0
+
+        monkey_matrix = monkey_transform(self.monkey_z, self.monkey_angle)
+        self.player.move_collision_object(self.collision_entries["monkey"], monkey_matrix)
+        self.scene.move(self.scene_instances["monkey"], monkey_matrix)
+
+        self.hummingbird_angle += self.hummingbird_rotation_speed * step
+        if self.hummingbird_angle >= 360.0:
+            self.hummingbird_angle -= 360.0
+        self.scene.move(self.scene_instances["hummingbird"], hummingbird_transform(self.hummingbird_angle))
+
+        if self.animate_light:
+            self.light_angle += self.light_speed * step
+            if self.light_angle >= 360.0:
+                self.light_angle -= 360.0
+        now = time.perf_counter()
+        timings["animation"] += now - start
+        start = now
+
+        # Falling leaves
+        if self.leaves is not None and self.animate_leaves:
+            self.leaves.step(step)
+        timings["leaves"] += time.perf_counter() - start
+
+        self.tick_count += 1
+        return collected
+
+    def print_timings(self, elapsed):
+        """
+        Prints the tick rate and the time spent in every subsystem.
+
+        Args:
+            elapsed: Wall-clock seconds the ticks took
+        """
+        ticks = max(self.tick_count, 1)
+        print(f"{self.tick_count} ticks in {elapsed:.3f} s: {self.tick_count / max(elapsed, 1e-9):.0f} ticks/s")
+        print(f"{'subsystem':<12}{'total ms':>10}{'us/tick':>10}{'share':>8}")
+        total = sum(self.timings.values())
+        for name in SUBSYSTEMS:
+            seconds = self.timings[name]
+            print(f"{name:<12}{seconds * 1000:>10.1f}{seconds / ticks * 1e6:>10.1f}"
+                  f"{seconds / max(total, 1e-12) * 100:>7.1f}%")
@@ -2,26 +2,34 @@ import sys
 import glm
 import glfw
 import math
-import random
 import imgui
 from imgui.integrations.glfw import GlfwRenderer
 from OpenGL.GL import *
-import numpy as np
 
 from model import Model
-from shader_program import ShaderProgram
+from shader_program import ShaderProgram, load_shader_file
 from camera import Camera
 from lighting import Light
 from skybox import CSkyBox
 from context_menu import ContextMenu
 from leaf_base import CMultipleLeaves
 from shadows import ShadowMapping
+from placement import PlacementGrid, poisson_disk, in_zones
 
 # Constants for object identification
 OBJECT_NORMAL = 0
 OBJECT_HUMMINGBIRD = 1
 
-all_terrain_positions = []
+# Dostosowujemy minimalne odstępy dla różnych typów obiektów
+TYPE_SPACING = {
+    "rock": 8.0,
+    "cactus1": 6.0,
+    "bark": 6.0,
+    "grass": 2.0
+}
+
+# Everything placed by generate_random_terrain_positions, so later object types keep their distance
+terrain_placement = PlacementGrid()
 
 class WindowDimensions:
     def __init__(self, width, height):
@@ -163,139 +171,43 @@ def init_window(title):
     
     return window
 
-def generate_random_terrain_positions(num_positions, min_dist=-50, max_dist=50, min_spacing=3.0, height_offset=0.0, exclude_zone=None, object_type=""):
-    global all_terrain_positions
-    positions = []
-    max_attempts = num_positions * 20
-    
-    # Dostosowujemy minimalne odstępy dla różnych typów obiektów
-    type_spacing = {
-        "rock": 8.0,
-        "cactus1": 6.0,
-        "bark": 6.0,
-        "grass": 2.0
-    }
-    
-    print("====================================")
-    print(f"Generowanie pozycji dla typu: '{object_type}'")
-    print(f"Wymagany odstep bazowy: {min_spacing}")
-    print(f"Liczba obiektow do wygenerowania: {num_positions}")
-    print("====================================")
-    
-    attempts = 0
-    while len(positions) < num_positions and attempts < max_attempts:
-        attempts += 1
-        x = random.uniform(min_dist, max_dist)
-        z = random.uniform(min_dist, max_dist)
-        pos = glm.vec3(x, height_offset, z)
-        
+def generate_random_terrain_positions(num_positions, min_dist=-50, max_dist=50, min_spacing=3.0, height_offset=0.0, exclude_zone=None, object_type="", rng=None):
+    """
+    Scatters objects of one type over a square of the terrain.
+
+    The positions are a Poisson-disk sample (placement.poisson_disk): objects
+    of this type are at least max(min_spacing, TYPE_SPACING[object_type])
+    apart, and at least the larger of the two types' spacings away from
+    everything placed before them since the last terrain_placement.clear().
+    Fewer positions are returned when the square cannot hold more.
+
+    Args:
+        num_positions: Number of positions wanted
+        min_dist: Lower x and z limit of the square
+        max_dist: Upper x and z limit of the square
+        min_spacing: Spacing between objects of this type, and of this type
+            from others if it is not in TYPE_SPACING
+        height_offset: y of the returned positions
+        exclude_zone: (x_min, x_max, z_min, z_max) kept free, or None
+        object_type: Object type, the key into TYPE_SPACING
+        rng: numpy.random.Generator (default: a fresh unseeded one)
+
+    Returns:
+        List of glm.vec3 positions
+    """
+    spacing = TYPE_SPACING.get(object_type, min_spacing)
+
+    def reject(candidates, margin):
+        blocked = terrain_placement.too_close(candidates, spacing, margin)
         if exclude_zone:
-            x_min, x_max, z_min, z_max = exclude_zone
-            if x_min <= x <= x_max and z_min <= z <= z_max:
-                continue
-        
-        too_close = False
-        collision_info = ""
-        
-        # Sprawdź odległość od obiektów tego samego typu
-        for existing_pos in positions:
-            distance = glm.length(glm.vec2(pos.x - existing_pos.x, pos.z - existing_pos.z))
-            if distance < min_spacing:
-                too_close = True
-                collision_info = f"Kolizja z tym samym typem ('{object_type}'), odległość: {distance:.2f}"
-                break
-        
-        # Sprawdź odległość od obiektów innych typów
-        if not too_close:
-            for existing_pos, existing_type in all_terrain_positions:
-                required_spacing = max(
-                    type_spacing.get(object_type, min_spacing),
-                    type_spacing.get(existing_type, min_spacing)
-                )
-                
-                distance = glm.length(glm.vec2(pos.x - existing_pos.x, pos.z - existing_pos.z))
-                if distance < required_spacing:
-                    too_close = True
-                    collision_info = f"Kolizja między '{object_type}' a '{existing_type}', odległość: {distance:.2f}, wymagana: {required_spacing}"
-                    break
-        
-        if not too_close:
-            positions.append(pos)
-            all_terrain_positions.append((pos, object_type))
-            if len(positions) % 10 == 0:
-                print(f"Wygenerowano {len(positions)}/{num_positions} pozycji dla '{object_type}'")
-        elif attempts % 100 == 0:
-            print(f"Nieudana próba ({attempts}): {collision_info}")
-    
-    print("====================================")
-    print(f"Zakonczono generowanie '{object_type}'")
-    print(f"Wygenerowano {len(positions)}/{num_positions} pozycji po {attempts} probach")
-    print("====================================\n")
-    
-    return positions
-
-def get_terrain_height(vertices, pos, debug=False):
-    try:
-        min_height = float('-inf')
-        max_dist = 1000.0
-
-        if abs(pos.x) > max_dist or abs(pos.z) > max_dist:
-            return -0.8
-
-        # Konwertuj vertices na numpy array dla lepszej wydajności
-        vertices_array = np.array(vertices).reshape(-1, 3)
-        
-        for i in range(0, len(vertices_array), 3):
-            if i + 2 >= len(vertices_array):
-                break
-
-            v1 = glm.vec3(*vertices_array[i])
-            v2 = glm.vec3(*vertices_array[i + 1])
-            v3 = glm.vec3(*vertices_array[i + 2])
+            blocked |= in_zones(candidates, [exclude_zone], margin)
+        return blocked
 
-            if point_in_triangle(pos.x, pos.z, v1.x, v1.z, v2.x, v2.z, v3.x, v3.z):
-                height = interpolate_height(pos.x, pos.z, v1, v2, v3)
-                if debug:
-                    print(f"Triangle vertices: {v1}, {v2}, {v3}")
-                    print(f"Calculated height: {height}")
-                min_height = max(min_height, height)
-
-        final_height = -0.8 if min_height == float('-inf') else min_height
-        if debug:
-            print(f"Final height for position {pos}: {final_height}")
-        return final_height
-
-    except Exception as e:
-        print(f"Error in get_terrain_height: {e}")
-        return -0.8
-
-def point_in_triangle(px, pz, x1, z1, x2, z2, x3, z3):
-    def sign(p1x, p1z, p2x, p2z, p3x, p3z):
-        return (p1x - p3x) * (p2z - p3z) - (p2x - p3x) * (p1z - p3z)
-    
-    d1 = sign(px, pz, x1, z1, x2, z2)
-    d2 = sign(px, pz, x2, z2, x3, z3)
-    d3 = sign(px, pz, x3, z3, x1, z1)
-
-    has_neg = (d1 < 0) or (d2 < 0) or (d3 < 0)
-    has_pos = (d1 > 0) or (d2 > 0) or (d3 > 0)
-
-    return not (has_neg and has_pos)
-
-def interpolate_height(x, z, v1, v2, v3):
-    try:
-        edge1 = v2 - v1
-        edge2 = v3 - v1
-        normal = glm.normalize(glm.cross(edge1, edge2))
-        
-        if abs(normal.y) < 0.001:
-            return v1.y
-            
-        d = -(normal.x * v1.x + normal.y * v1.y + normal.z * v1.z)
-        return (-normal.x * x - normal.z * z - d) / normal.y
-    except Exception as e:
-        print(f"Error in interpolate_height: {e}")
-        return -0.8
+    points = poisson_disk((min_dist, min_dist, max_dist, max_dist), max(min_spacing, spacing),
+                          num_positions, rng, reject=reject)
+    terrain_placement.add(points, spacing)
+    print(f"Placed {len(points)}/{num_positions} '{object_type}' positions")
+    return [glm.vec3(x, height_offset, z) for x, z in points.tolist()]
 
 def init_lights():
     print("Initializing lights...")
@@ -319,18 +231,12 @@ def init_lights():
 
 def init_shaders():
     try:
-        with open("shaders/vertex_shader.glsl", "r") as f:
-            vertex_src = f.read()
-        with open("shaders/fragment_shader.glsl", "r") as f:
-            fragment_src = f.read()
-        with open("shaders/skybox_vertex_shader.glsl", "r") as f:
-            skybox_vertex_src = f.read()
-        with open("shaders/skybox_fragment_shader.glsl", "r") as f:
-            skybox_fragment_src = f.read()
-        with open("shaders/leaf_vertex_shader.glsl", "r") as f:
-            leaf_vertex_src = f.read()
-        with open("shaders/leaf_fragment_shader.glsl", "r") as f:
-            leaf_fragment_src = f.read()
+        vertex_src = load_shader_file("vertex_shader.glsl")
+        fragment_src = load_shader_file("fragment_shader.glsl")
+        skybox_vertex_src = load_shader_file("skybox_vertex_shader.glsl")
+        skybox_fragment_src = load_shader_file("skybox_fragment_shader.glsl")
+        leaf_vertex_src = load_shader_file("leaf_vertex_shader.glsl")
+        leaf_fragment_src = load_shader_file("leaf_fragment_shader.glsl")
             
         program = ShaderProgram(vertex_src, fragment_src)
         skybox_program = ShaderProgram(skybox_vertex_src, skybox_fragment_src)
@@ -0,0 +1,139 @@
+import os
+import numpy as np
+
+from fixed_timestep import TICK_RATE
+
+# Bump when the file format or the meaning of the input bits changes
+RECORDING_VERSION = 1
+
+# Keys the simulation reads, one bit each in the order given; the next bit is set on
+# ticks where the player could move (third-person camera)
+INPUT_KEYS = ('w', 's', 'a', 'd')
+MOVE_PLAYER_BIT = 1 << len(INPUT_KEYS)
+
+
+class InputRecording:
+    def __init__(self, seed, tick_rate=TICK_RATE, inputs=(), final_state=None, layout=None):
+        """
+        Player input of a run, one byte per simulation tick, and the seed (or
+        pinned layout file) its scene was made from.
+
+        The simulation is deterministic given its seed and the input of
+        every tick, so a recording replays the same player path, collected
+        balls and score on any build at any frame rate.
+
+        Args:
+            seed: Scene seed of the recorded run
+            tick_rate: Simulation ticks per second of the recorded run
+            inputs: Input bits of every tick
+            final_state: (score, x, y, z) of the player after the last tick, or None
+            layout: Scene layout file the run was pinned to (Main.py --layout), or None
+        """
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.inputs = bytearray(inputs)
+        self.final_state = final_state
+        self.layout = layout
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def append(self, keys, move_player):
+        """
+        Records the input of the next tick.
+
+        Args:
+            keys: Key states ('w', 's', 'a', 'd', ...)
+            move_player: Whether the player could move in this tick
+        """
+        bits = MOVE_PLAYER_BIT if move_player else 0
+        for bit, key in enumerate(INPUT_KEYS):
+            if keys[key]:
+                bits |= 1 << bit
+        self.inputs.append(bits)
+
+    def __getitem__(self, tick):
+        """
+        Returns:
+            tuple: (key states, move_player) of a tick
+        """
+        bits = self.inputs[tick]
+        keys = {key: bool(bits & (1 << bit)) for bit, key in enumerate(INPUT_KEYS)}
+        return keys, bool(bits & MOVE_PLAYER_BIT)
+
+    def finish(self, simulation):
+        """Notes the outcome of the recorded run, for check() on replays."""
+        position = simulation.player.position
+        self.final_state = (simulation.score, position.x, position.y, position.z)
+
+    def check(self, simulation):
+        """
+        Compares a replay that ran all ticks with the recorded outcome and prints the result.
+
+        Returns:
+            True when the score and the player position match exactly
+        """
+        if self.final_state is None:
+            print("Recording has no outcome to compare with")
+            return False
+        position = simulation.player.position
+        replayed = (simulation.score, position.x, position.y, position.z)
+        if replayed == tuple(self.final_state):
+            print(f"Replay matches the recording: score {simulation.score}, "
+                  f"player at ({position.x:.3f}, {position.y:.3f}, {position.z:.3f})")
+            return True
+        print(f"Replay diverged from the recording: score {replayed[0]} (recorded {self.final_state[0]}), "
+              f"player at ({position.x:.3f}, {position.y:.3f}, {position.z:.3f}) "
+              f"(recorded ({self.final_state[1]:.3f}, {self.final_state[2]:.3f}, {self.final_state[3]:.3f}))")
+        return False
+
+    def save(self, path):
+        """
+        Writes the recording to a compressed .npz file.
+
+        Args:
+            path: Recording file; written to a temporary file first and moved into place
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez_compressed(
+                file,
+                version=np.int64(RECORDING_VERSION),
+                seed=np.int64(self.seed),
+                tick_rate=np.int64(self.tick_rate),
+                inputs=np.frombuffer(bytes(self.inputs), dtype=np.uint8),
+                final_state=np.array(self.final_state if self.final_state is not None else (), dtype=np.float64),
+                layout=np.str_(self.layout or ""))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a recording written by save().
+
+        Args:
+            path: Recording file
+
+        Returns:
+            InputRecording, or None if the file is missing, unreadable or of another version
+        """
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != RECORDING_VERSION:
+                    print(f"Input recording '{path}' has another format version")
+                    return None
+                final_state = data['final_state']
+                if len(final_state):
+                    final_state = (int(final_state[0]),) + tuple(float(value) for value in final_state[1:])
+                else:
+                    final_state = None
+                # Recordings written before the layout was stored were all made from their seed
+                layout = str(data['layout']) if 'layout' in data.files else ""
+                return cls(int(data['seed']), int(data['tick_rate']), data['inputs'].tobytes(), final_state,
+                           layout or None)
+        except (IOError, ValueError, KeyError) as e:
+            print(f"Input recording '{path}' is unreadable: {e}")
+            return None
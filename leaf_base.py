@@ -3,6 +3,47 @@ from OpenGL.GL import *
 import random
 import ctypes
 
+class FallingLeaves:
+    def __init__(self, instance_count):
+        """
+        Falling leaf particles on the CPU: position, scale, rotation and velocity
+        of every leaf, 8 floats each. Needs no GL context, so the game logic
+        can run without a window; CMultipleLeaves draws them.
+        """
+        self.instance_count = instance_count
+        self.instance_data = self.generate_instance_data()
+
+    def generate_instance_data(self):
+        instance_data = []
+        for _ in range(self.instance_count):
+            x = random.uniform(-50, 50)
+            y = random.uniform(10, 50)
+            z = random.uniform(-50, 50)
+            scale = random.uniform(0.2, 0.5)
+            rotation = random.uniform(0, 360)
+            vel_x = random.uniform(-1, 1)
+            vel_y = random.uniform(-2, -1)
+            vel_z = random.uniform(-1, 1)
+            instance_data.extend([x, y, z, scale, rotation, vel_x, vel_y, vel_z])
+        return np.array(instance_data, dtype=np.float32)
+
+    def step(self, delta_time):
+        """
+        Moves the leaves by one simulation step.
+        """
+        data = self.instance_data.reshape(-1, 8)
+        ## Position update according to speed
+        data[:, 0:3] += data[:, 5:8] * delta_time
+        ## Leaf rotation
+        data[:, 4] += delta_time * 50
+
+        ## Reset position when the leaf falls too low
+        for i in np.flatnonzero(data[:, 1] < -10): # Y pozytion
+            data[i, 1] = 50
+            data[i, 0] = random.uniform(-50, 50)
+            data[i, 2] = random.uniform(-50, 50)
+
+
 class CLeaf:
     def __init__(self, vertices, indices, texture=None):
         self.vertices = vertices
@@ -44,22 +85,10 @@ class CMultipleLeaves(CLeaf):
     def __init__(self, vertices, indices, instance_count, texture=None):
         super().__init__(vertices, indices, texture)
         self.instance_count = instance_count
-        self.instance_data = self.generate_instance_data()
+        self.particles = FallingLeaves(instance_count)
+        self.instance_data = self.particles.instance_data
         self.setup_instance_attributes()
 
-    def generate_instance_data(self):
-        instance_data = []
-        for _ in range(self.instance_count):
-            x = random.uniform(-50, 50)
-            y = random.uniform(10, 50)
-            z = random.uniform(-50, 50)
-            scale = random.uniform(0.2, 0.5)
-            rotation = random.uniform(0, 360)
-            vel_x = random.uniform(-1, 1)
-            vel_y = random.uniform(-2, -1)
-            vel_z = random.uniform(-1, 1)
-            instance_data.extend([x, y, z, scale, rotation, vel_x, vel_y, vel_z])
-        return np.array(instance_data, dtype=np.float32)
 #Configure instance attributes
     def setup_instance_attributes(self):
         self.instance_vbo = glGenBuffers(1)
@@ -83,24 +112,21 @@ class CMultipleLeaves(CLeaf):
         glEnableVertexAttribArray(6)
         glVertexAttribDivisor(6, 1)
 
+    def upload(self):
+        """
+        Sends the current leaf positions to the instance buffer, once per rendered frame.
+        """
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, self.instance_data.nbytes, self.instance_data)
+
+    def step(self, delta_time):
+        self.particles.step(delta_time)
+
     def update_positions(self, delta_time, animate):
         if not animate:
             return
-        for i in range(self.instance_count):
-            idx = i * 8
-            ## Position update according to speed
-            self.instance_data[idx:idx+3] += self.instance_data[idx+5:idx+8] * delta_time
-            ## Leaf rotation
-            self.instance_data[idx+4] += delta_time * 50
-
-            ## Reset position when the leaf falls too low
-            if self.instance_data[idx+1] < -10: # Y pozytion
-                self.instance_data[idx+1] = 50
-                self.instance_data[idx] = random.uniform(-50, 50)
-                self.instance_data[idx+2] = random.uniform(-50, 50)
-
-        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
-        glBufferSubData(GL_ARRAY_BUFFER, 0, self.instance_data.nbytes, self.instance_data)
+        self.step(delta_time)
+        self.upload()
 
 
     def draw(self):
@@ -0,0 +1,227 @@
+import sys
+import argparse
+from collections import deque
+import numpy as np
+
+# Post-transform vertex cache size assumed when ordering triangles
+DEFAULT_CACHE_SIZE = 16
+
+
+def build_index_buffer(vertex_data):
+    """
+    Deduplicates identical vertices of a de-indexed triangle list.
+
+    Args:
+        vertex_data: (N, K) float32 array, three rows per triangle
+
+    Returns:
+        tuple: (unique vertices (M, K) float32, indices (N,) uint32)
+    """
+    vertex_data = np.ascontiguousarray(vertex_data, dtype=np.float32)
+    if len(vertex_data) == 0:
+        return vertex_data.copy(), np.zeros(0, dtype=np.uint32)
+
+    # Compare whole rows as opaque byte strings
+    rows = vertex_data.view(np.dtype((np.void, vertex_data.dtype.itemsize * vertex_data.shape[1])))
+    _, first, inverse = np.unique(rows.reshape(-1), return_index=True, return_inverse=True)
+    return vertex_data[first], inverse.reshape(-1).astype(np.uint32)
+
+
+def tipsify(indices, vertex_count, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Reorders triangles for post-transform vertex cache locality.
+
+    Implements the linear-time Tipsify algorithm (Sander, Nehab and
+    Barczak, 2007): triangles are emitted in fans around a current vertex,
+    and the next fanning vertex is the one most likely to still be in the
+    cache.
+
+    Args:
+        indices: Triangle index list
+        vertex_count: Number of vertices referenced by the indices
+        cache_size: Target FIFO cache size
+
+    Returns:
+        Reordered uint32 index array
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    tri_count = len(indices) // 3
+    if tri_count == 0:
+        return indices.astype(np.uint32)
+
+    # Vertex -> triangle adjacency in CSR form
+    valence = np.bincount(indices, minlength=vertex_count)
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(valence, out=offsets[1:])
+    adjacency = (np.argsort(indices, kind='stable') // 3).tolist()
+    offsets = offsets.tolist()
+
+    triangles = indices.tolist()
+    live = valence.tolist()
+    cache_time = [0] * vertex_count
+    emitted = bytearray(tri_count)
+    dead_end = []
+    output = []
+
+    time = cache_size + 1
+    cursor = 1
+    fanning = 0
+    while fanning >= 0:
+        candidates = []
+        for t in adjacency[offsets[fanning]:offsets[fanning + 1]]:
+            if emitted[t]:
+                continue
+            base = 3 * t
+            for v in triangles[base:base + 3]:
+                output.append(v)
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - cache_time[v] > cache_size:
+                    cache_time[v] = time
+                    time += 1
+            emitted[t] = 1
+
+        # Pick the candidate that stays in cache longest while still having work left
+        fanning = -1
+        best = -1
+        for v in candidates:
+            if live[v] <= 0:
+                continue
+            priority = 0
+            if time - cache_time[v] + 2 * live[v] <= cache_size:
+                priority = time - cache_time[v]
+            if priority > best:
+                best = priority
+                fanning = v
+
+        if fanning == -1:
+            # Dead end: recently used vertices first, then scan for any vertex with triangles left
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fanning = v
+                    break
+            if fanning == -1:
+                while cursor < vertex_count:
+                    if live[cursor] > 0:
+                        fanning = cursor
+                        break
+                    cursor += 1
+
+    return np.array(output, dtype=np.uint32)
+
+
+def reorder_vertices(vertices, indices):
+    """
+    Renumbers vertices in the order the index buffer first uses them.
+
+    Args:
+        vertices: (M, K) vertex array
+        indices: Index array referencing the vertices
+
+    Returns:
+        tuple: (reordered vertices, remapped uint32 indices)
+    """
+    _, first_use = np.unique(indices, return_index=True)
+    order = np.asarray(indices)[np.sort(first_use)]
+    remap = np.empty(len(vertices), dtype=np.uint32)
+    remap[order] = np.arange(len(order), dtype=np.uint32)
+    return np.ascontiguousarray(vertices[order]), remap[indices]
+
+
+def acmr(indices, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Average cache miss ratio of an index buffer under a FIFO vertex cache.
+
+    Args:
+        indices: Triangle index list
+        cache_size: Simulated cache size
+
+    Returns:
+        Cache misses per triangle (3.0 means no reuse at all)
+    """
+    tri_count = len(indices) // 3
+    if tri_count == 0:
+        return 0.0
+
+    cache = deque()
+    resident = set()
+    misses = 0
+    for v in np.asarray(indices).tolist():
+        if v in resident:
+            continue
+        misses += 1
+        cache.append(v)
+        resident.add(v)
+        if len(cache) > cache_size:
+            resident.discard(cache.popleft())
+    return misses / tri_count
+
+
+def optimize_mesh(vertex_data, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Builds a vertex-cache-optimized indexed mesh from a de-indexed triangle list.
+
+    Args:
+        vertex_data: (N, K) float32 array, three rows per triangle
+        cache_size: Target FIFO cache size
+
+    Returns:
+        tuple: (vertices (M, K) float32, indices (N,) uint32)
+    """
+    vertices, indices = build_index_buffer(vertex_data)
+    indices = tipsify(indices, len(vertices), cache_size)
+    return reorder_vertices(vertices, indices)
+
+
+def mesh_report(obj_path, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Compares a de-indexed mesh with its optimized indexed version.
+
+    Args:
+        obj_path: Path to the .obj file
+        cache_size: Simulated cache size
+
+    Returns:
+        Dictionary with vertex counts, ACMR and buffer sizes
+    """
+    from asset_cache import load_mesh
+
+    vertex_data = np.asarray(load_mesh(obj_path))
+    vertices, indices = build_index_buffer(vertex_data)
+    optimized_vertices, optimized_indices = optimize_mesh(vertex_data, cache_size)
+    return {
+        'path': obj_path,
+        'triangles': len(vertex_data) // 3,
+        'vertices_before': len(vertex_data),
+        'vertices_after': len(optimized_vertices),
+        'acmr_unindexed': 3.0,
+        'acmr_indexed': acmr(indices, cache_size),
+        'acmr_optimized': acmr(optimized_indices, cache_size),
+        'bytes_before': vertex_data.nbytes,
+        'bytes_after': optimized_vertices.nbytes + optimized_indices.nbytes,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report vertex reuse before and after mesh optimization.")
+    parser.add_argument("paths", nargs="*",
+                        default=["models/lego.obj", "models/cactus1.obj", "models/ground-large.obj"],
+                        help="OBJ files to analyse")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="simulated post-transform cache size")
+    args = parser.parse_args(argv)
+
+    print(f"{'model':<28}{'tris':>8}{'verts before':>14}{'verts after':>13}"
+          f"{'ACMR orig':>11}{'ACMR opt':>10}{'KiB before':>12}{'KiB after':>11}")
+    for path in args.paths:
+        r = mesh_report(path, args.cache_size)
+        print(f"{path:<28}{r['triangles']:>8}{r['vertices_before']:>14}{r['vertices_after']:>13}"
+              f"{r['acmr_indexed']:>11.3f}{r['acmr_optimized']:>10.3f}"
+              f"{r['bytes_before'] / 1024:>12.1f}{r['bytes_after'] / 1024:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
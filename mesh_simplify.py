@@ -0,0 +1,270 @@
+import sys
+import argparse
+import numpy as np
+
+from mesh_optimizer import optimize_mesh
+
+# Target triangle count of each LOD relative to the full mesh
+LOD_RATIOS = (1.0, 0.5, 0.25, 0.1)
+
+# Meshes with fewer triangles than this are not simplified
+MIN_LOD_TRIANGLES = 512
+
+# Relative eigenvalue below which a cluster quadric direction counts as flat
+QUADRIC_EPSILON = 1e-3
+
+
+def face_quadrics(positions, indices):
+    """
+    Area-weighted plane quadrics of all triangles.
+
+    Args:
+        positions: (M, 3) vertex positions
+        indices: (N,) triangle indices
+
+    Returns:
+        tuple: (A (T, 3, 3), b (T, 3)) so that the squared plane distance of
+        a point x summed over the triangle is x^T A x + 2 b^T x + c
+    """
+    corners = positions[indices.reshape(-1, 3)].astype(np.float64)
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    double_area = np.linalg.norm(normals, axis=1)
+    normals /= np.maximum(double_area, 1e-20)[:, None]
+    offsets = -np.einsum('ij,ij->i', normals, corners[:, 0])
+
+    weight = 0.5 * double_area
+    A = weight[:, None, None] * normals[:, :, None] * normals[:, None, :]
+    b = (weight * offsets)[:, None] * normals
+    return A, b
+
+
+def cluster_vertices(positions, resolution):
+    """
+    Assigns vertices to the cells of a uniform grid over the bounding box.
+
+    Args:
+        positions: (M, 3) vertex positions
+        resolution: Cells along the longest side of the bounding box
+
+    Returns:
+        tuple: (cluster id per vertex (M,), cluster count, cell size)
+    """
+    low = positions.min(axis=0)
+    extent = positions.max(axis=0) - low
+    cell_size = max(float(extent.max()), 1e-12) / resolution
+    dims = np.maximum(np.ceil(extent / cell_size).astype(np.int64), 1)
+    cells = np.minimum(((positions - low) / cell_size).astype(np.int64), dims - 1)
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, clusters = np.unique(keys, return_inverse=True)
+    clusters = clusters.reshape(-1)
+    return clusters, int(clusters.max()) + 1, cell_size
+
+
+def _surviving_triangles(clusters, indices):
+    """Mask of triangles whose corners fall into three different clusters."""
+    c = clusters[indices.reshape(-1, 3)]
+    return (c[:, 0] != c[:, 1]) & (c[:, 1] != c[:, 2]) & (c[:, 0] != c[:, 2])
+
+
+def cluster_positions(positions, indices, clusters, cluster_count, cell_size):
+    """
+    Places one representative point per cluster at its quadric minimum.
+
+    The summed quadric of a cluster is minimized relative to the mean of its
+    vertices with a truncated pseudo-inverse, so flat or ridge-like clusters
+    (singular quadrics) keep their mean along the unconstrained directions.
+
+    Args:
+        positions: (M, 3) vertex positions
+        indices: (N,) triangle indices
+        clusters: Cluster id per vertex
+        cluster_count: Number of clusters
+        cell_size: Grid cell size, bounds how far a point may move from the mean
+
+    Returns:
+        (cluster_count, 3) float32 positions
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    counts = np.bincount(clusters, minlength=cluster_count).astype(np.float64)
+    mean = np.stack([np.bincount(clusters, positions[:, k], cluster_count) for k in range(3)], axis=1)
+    mean /= np.maximum(counts, 1.0)[:, None]
+
+    # Every triangle's quadric goes to the clusters of all three corners
+    face_A, face_b = face_quadrics(positions, indices)
+    corner_clusters = clusters[indices]
+    corner_faces = np.repeat(np.arange(len(face_A)), 3)
+    A = np.zeros((cluster_count, 3, 3))
+    b = np.zeros((cluster_count, 3))
+    for i in range(3):
+        b[:, i] = np.bincount(corner_clusters, face_b[corner_faces, i], cluster_count)
+        for j in range(3):
+            A[:, i, j] = np.bincount(corner_clusters, face_A[corner_faces, i, j], cluster_count)
+
+    eigenvalues, eigenvectors = np.linalg.eigh(A)
+    cutoff = QUADRIC_EPSILON * np.maximum(eigenvalues[:, -1:], 1e-30)
+    inverse = np.where(eigenvalues > cutoff, 1.0 / np.maximum(eigenvalues, 1e-30), 0.0)
+    gradient = np.einsum('cij,cj->ci', A, mean) + b
+    step = np.einsum('cij,cj,cj->ci', eigenvectors,
+                     inverse, np.einsum('cji,cj->ci', eigenvectors, gradient))
+    result = mean - step
+
+    # Guard against points escaping the cell on badly conditioned clusters
+    moved = np.linalg.norm(step, axis=1) > cell_size * np.sqrt(3.0)
+    result[moved] = mean[moved]
+    return result.astype(np.float32)
+
+
+def simplify(vertices, indices, target_triangles, locked=None):
+    """
+    Simplifies an indexed mesh to about target_triangles with quadric clustering.
+
+    Vertices are snapped to the quadric-optimal point of their grid cell
+    (Lindstrom, "Out-of-Core Simplification of Large Polygonal Models",
+    2000) and triangles that collapse are dropped. The grid resolution is
+    searched so the result has at most target_triangles triangles. Normals
+    and UVs of the original vertices are kept, so texture seams and hard
+    edges survive.
+
+    Locked vertices get a cluster of their own and keep their position, so
+    every edge between two of them survives; pieces of a larger mesh lock
+    their borders to still fit their neighbours at any LOD.
+
+    Args:
+        vertices: (M, 8) float32 interleaved vertices
+        indices: (N,) triangle indices
+        target_triangles: Upper bound on the triangle count (not reached when
+            the edges between locked vertices alone need more triangles)
+        locked: Optional (M,) bool mask of vertices that must not move
+
+    Returns:
+        tuple: (vertices (M', 8) float32, indices (N',) uint32), vertex-cache optimized
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    indices = np.asarray(indices, dtype=np.int64)
+    positions = vertices[:, 0:3]
+
+    # Largest resolution whose surviving triangle count fits the budget
+    low, high = 1, 1024
+    best = None
+    while low <= high:
+        resolution = (low + high) // 2
+        clusters, cluster_count, cell_size = cluster_vertices(positions, resolution)
+        if locked is not None:
+            clusters = clusters.copy()
+            clusters[locked] = cluster_count + np.arange(np.count_nonzero(locked))
+            cluster_count += int(np.count_nonzero(locked))
+        keep = _surviving_triangles(clusters, indices)
+        if keep.sum() <= target_triangles:
+            best = (clusters, cluster_count, cell_size, keep)
+            low = resolution + 1
+        else:
+            high = resolution - 1
+
+    if best is None or not best[3].any():
+        return np.ascontiguousarray(vertices), indices.astype(np.uint32)
+
+    clusters, cluster_count, cell_size, keep = best
+    snapped = vertices.copy()
+    snapped[:, 0:3] = cluster_positions(positions, indices, clusters, cluster_count, cell_size)[clusters]
+    if locked is not None:
+        snapped[locked, 0:3] = positions[locked]
+    triangles = indices.reshape(-1, 3)[keep].reshape(-1)
+    return optimize_mesh(snapped[triangles])
+
+
+def build_lods(vertices, indices, ratios=LOD_RATIOS):
+    """
+    Builds the LOD chain of a mesh, most detailed first.
+
+    Args:
+        vertices: (M, 8) float32 interleaved vertices (LOD 0)
+        indices: (N,) uint32 triangle indices (LOD 0)
+        ratios: Triangle count of each LOD relative to LOD 0
+
+    Returns:
+        List of (vertices, indices) pairs; just LOD 0 for small meshes
+    """
+    lods = [(np.asarray(vertices), np.asarray(indices))]
+    triangle_count = len(indices) // 3
+    if triangle_count < MIN_LOD_TRIANGLES:
+        return lods
+
+    for ratio in ratios[1:]:
+        lod_vertices, lod_indices = simplify(vertices, indices, int(triangle_count * ratio))
+        # Stop once simplification no longer reduces the mesh
+        if len(lod_indices) == 0 or len(lod_indices) >= len(lods[-1][1]):
+            break
+        lods.append((lod_vertices, lod_indices))
+    return lods
+
+
+def pack_lods(lods):
+    """
+    Concatenates a LOD chain into shared vertex and index buffers.
+
+    Args:
+        lods: List of (vertices, indices) pairs
+
+    Returns:
+        tuple: (vertices float32, indices uint32, ranges (L, 4) int64 of
+        first index, index count, first vertex, vertex count per LOD).
+        Indices are rebased so each LOD can be drawn from the shared buffers.
+    """
+    ranges = []
+    first_index = first_vertex = 0
+    for lod_vertices, lod_indices in lods:
+        ranges.append((first_index, len(lod_indices), first_vertex, len(lod_vertices)))
+        first_index += len(lod_indices)
+        first_vertex += len(lod_vertices)
+
+    vertices = np.concatenate([lod_vertices for lod_vertices, _ in lods]).astype(np.float32)
+    indices = np.concatenate([np.asarray(lod_indices, dtype=np.uint32) + np.uint32(first)
+                              for (_, lod_indices), (_, _, first, _) in zip(lods, ranges)])
+    return vertices, indices, np.array(ranges, dtype=np.int64)
+
+
+def lod_report(obj_path):
+    """
+    Returns the triangle count and geometric error of every LOD of a model.
+
+    The error is the largest distance from (up to 2048 of) a LOD's vertices
+    to the nearest LOD 0 vertex, relative to the bounding sphere radius: a
+    cheap one-sided Hausdorff estimate.
+    """
+    from asset_cache import load_lod_mesh
+
+    vertices, indices, ranges = load_lod_mesh(obj_path)
+    _, _, first_vertex, vertex_count = ranges[0]
+    reference = np.asarray(vertices[first_vertex:first_vertex + vertex_count, 0:3], dtype=np.float64)
+    center = (reference.min(axis=0) + reference.max(axis=0)) / 2
+    radius = max(float(np.linalg.norm(reference - center, axis=1).max()), 1e-12)
+
+    rows = []
+    for first_index, index_count, first_vertex, vertex_count in ranges.tolist():
+        points = np.asarray(vertices[first_vertex:first_vertex + vertex_count, 0:3], dtype=np.float64)
+        points = points[::max(1, len(points) // 2048)]
+        error = 0.0
+        for start in range(0, len(points), 256):
+            block = points[start:start + 256]
+            distances = ((block[:, None, :] - reference[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+            error = max(error, float(np.sqrt(distances.max())))
+        rows.append({'triangles': index_count // 3, 'vertices': vertex_count, 'error': error / radius})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the LOD chain generated for each model.")
+    parser.add_argument("paths", nargs="*",
+                        default=["models/lego.obj", "models/cactus1.obj", "models/rock.obj"],
+                        help="OBJ files to analyse")
+    args = parser.parse_args(argv)
+
+    print(f"{'model':<28}{'LOD':>4}{'tris':>8}{'verts':>8}{'error':>9}")
+    for path in args.paths:
+        for lod, row in enumerate(lod_report(path)):
+            print(f"{path:<28}{lod:>4}{row['triangles']:>8}{row['vertices']:>8}{row['error']:>9.2%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,38 +1,64 @@
 from OpenGL.GL import *
-from PIL import Image
-import numpy as np
 import glm
-import ctypes
-from objloader import loadOBJ
+import numpy as np
+from asset_registry import registry as default_registry, INSTANCE_FLOATS
+from objloader import unpackVertices
+
+def instance_data(matrices, colors=(1.0, 1.0, 1.0)):
+    """
+    Packs per-instance attributes for Model.draw_instanced.
+
+    Args:
+        matrices: (N, 4, 4) model matrices, rows first (numpy.array of glm.mat4)
+        colors: (N, 3) per-instance colors, or one color for all instances
+
+    Returns:
+        (N, INSTANCE_FLOATS) float32 array: column-major model matrix, normal matrix, color
+    """
+    matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+    data = np.empty((len(matrices), INSTANCE_FLOATS), dtype=np.float32)
+    data[:, 0:16] = matrices.transpose(0, 2, 1).reshape(-1, 16)
+    # The normal matrix is transpose(inverse(model)); its column-major layout is the
+    # row-major layout of the inverse itself
+    data[:, 16:25] = np.linalg.inv(matrices[:, :3, :3]).reshape(-1, 9)
+    data[:, 25:28] = np.asarray(colors, dtype=np.float32)
+    return data
+
 
 class Model:
     def __init__(self, obj_path, shader_program, texture_path=None, 
                  ambient=glm.vec3(1.0), 
                  diffuse=glm.vec3(1.0), 
                  specular=glm.vec3(1.0), 
-                 shininess=32.0):
+                 shininess=32.0,
+                 mesh=None,
+                 texture_levels=None,
+                 registry=None):
         """
         Initializes the 3D model.
         
         Args:
-            obj_path: Path to the .obj file
+            obj_path: Path to the .obj file, or None for a material drawn with
+                other geometry (the terrain chunks)
             shader_program: Shader program for rendering the model
             texture_path: Optional texture path
             ambient: Ambient light coefficient
             diffuse: Diffuse light coefficient
             specular: Specular light coefficient
             shininess: Material shininess
+            mesh: Optional preloaded (vertices, indices, LOD ranges), e.g. from AssetLoader
+            texture_levels: Optional mip chain from texture_cache.load_texture_levels
+            registry: AssetRegistry holding the shared GPU mesh and texture
         """
-        self.vertices, self.uvs, self.normals = loadOBJ(obj_path)
-        self.shader_program = shader_program
-        self.texture = None
+        # GPU mesh and texture are shared through the registry: Models using the
+        # same OBJ or image file reference one VAO/VBO/EBO and one texture
+        self.registry = registry or default_registry
+        self.mesh = self.registry.acquire_mesh(obj_path, mesh) if obj_path is not None else None
+        self.texture_handle = None
         if texture_path:
-            self.texture = self.load_texture(texture_path)
-            
-        # Initialize VAO and VBO
-        self.vao = glGenVertexArrays(1)
-        self.vbo = glGenBuffers(1)
-        self.setup_mesh()
+            self.texture_handle = self.registry.acquire_texture(texture_path, texture_levels)
+        self._unpacked = None
+        self.shader_program = shader_program
         
         # Material properties
         self.material = {
@@ -42,76 +68,90 @@ class Model:
             'shininess': shininess
         }
 
-    def load_texture(self, file):
+    @property
+    def texture(self):
+        """OpenGL texture ID, or None for untextured models."""
+        return self.texture_handle.texture if self.texture_handle else None
+
+    @property
+    def vertex_data(self):
+        """(M, 8) float32 interleaved vertices of the shared mesh."""
+        return self.mesh.vertex_data
+
+    @property
+    def indices(self):
+        """(N,) uint32 triangle indices of the shared mesh, or None for streamed triangle lists."""
+        return self.mesh.indices
+
+    @property
+    def vertex_count(self):
+        return self.mesh.vertex_count
+
+    @property
+    def index_count(self):
+        return self.mesh.index_count
+
+    @property
+    def positions(self):
         """
-        Loads the texture from a file and configures its parameters.
-        
-        Args:
-            file: Path to the texture file
-            
-        Returns:
-            OpenGL texture ID
+        Returns an (N, 3) array of the vertex positions, three rows per triangle.
         """
-        image = Image.open(file).transpose(Image.FLIP_TOP_BOTTOM)
-        img_data = np.array(image.convert("RGBA"), dtype=np.uint8)
-        
-        texture = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texture)
-        
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, image.width, image.height, 
-                     0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-        
-        # Generate mipmaps and set texture parameters
-        glGenerateMipmap(GL_TEXTURE_2D)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        
-        return texture
+        if self.indices is None:
+            return self.vertex_data[:, 0:3]
+        return self.vertex_data[self.indices, 0:3]
+
+    def _unpack(self):
+        if self._unpacked is None:
+            triangles = self.vertex_data if self.indices is None else self.vertex_data[self.indices]
+            self._unpacked = unpackVertices(triangles)
+        return self._unpacked
+
+    @property
+    def vertices(self):
+        """List of glm.vec3 positions, built on first access (compatibility)."""
+        return self._unpack()[0]
+
+    @property
+    def uvs(self):
+        """List of glm.vec2 texture coordinates, built on first access (compatibility)."""
+        return self._unpack()[1]
+
+    @property
+    def normals(self):
+        """List of glm.vec3 normals, built on first access (compatibility)."""
+        return self._unpack()[2]
 
-    def setup_mesh(self):
+    @property
+    def lod_count(self):
+        return self.mesh.lod_count
+
+    def lod_for(self, model_matrix, camera_position):
         """
-        Configures OpenGL buffers for the model's mesh.
+        Returns the LOD to draw an instance with, from its projected screen size.
+
+        Args:
+            model_matrix: Model matrix of the instance
+            camera_position: Camera position (vec3)
         """
-        combined = []
-        for i in range(len(self.vertices)):
-            # Combine vertices, normals, and texture coordinates
-            combined.extend(self.vertices[i])
-            combined.extend(self.normals[i])
-            if self.uvs:
-                combined.extend(self.uvs[i])
-            else:
-                combined.extend([0.0, 0.0])
+        return self.mesh.select_lod(model_matrix, camera_position)
 
-        vertices = (GLfloat * len(combined))(*combined)
-        
-        # Setup VAO and VBO
-        glBindVertexArray(self.vao)
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferData(GL_ARRAY_BUFFER, len(vertices) * 4, vertices, GL_STATIC_DRAW)
-
-        # Vertex positions
-        glEnableVertexAttribArray(0)
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, (3 + 3 + 2) * 4, 
-                             ctypes.c_void_p(0))
-        
-        # Normals
-        glEnableVertexAttribArray(2)
-        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, (3 + 3 + 2) * 4, 
-                             ctypes.c_void_p(3 * 4))
-        
-        # Texture coordinates
-        glEnableVertexAttribArray(1)
-        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, (3 + 3 + 2) * 4, 
-                             ctypes.c_void_p((3 + 3) * 4))
-        
-        glBindVertexArray(0)
+    def lods_for(self, matrices, camera_position):
+        """
+        lod_for for many instances at once.
+
+        Args:
+            matrices: (N, 4, 4) model matrices, rows first
+            camera_position: Camera position (vec3)
+
+        Returns:
+            (N,) LOD indices
+        """
+        return self.mesh.select_lods(matrices, camera_position)
 
-    def draw(self, object_color=None, lighting_model=0):
+    def bind_material(self, object_color=None, lighting_model=0):
         """
-        Renders the model considering lighting and materials.
-        
+        Binds the texture and sets the material and lighting uniforms used by draw.
+
         Args:
             object_color: Object color (vec3)
             lighting_model: Lighting model (0 - Phong, 1 - Blinn-Phong)
@@ -143,27 +183,61 @@ class Model:
         # Set lighting model
         glUniform1i(glGetUniformLocation(self.shader_program.program, "lightingModel"), 
                     lighting_model)
+
+    def draw(self, object_color=None, lighting_model=0, lod=0):
+        """
+        Renders the model considering lighting and materials.
+        
+        Args:
+            object_color: Object color (vec3)
+            lighting_model: Lighting model (0 - Phong, 1 - Blinn-Phong)
+            lod: Level of detail, 0 being the full mesh (see lod_for)
+        """
+        self.bind_material(object_color, lighting_model)
         
         # Render the model
-        glBindVertexArray(self.vao)
-        glDrawArrays(GL_TRIANGLES, 0, len(self.vertices))
-        glBindVertexArray(0)
+        self.mesh.draw(lod)
+
+    def draw_instanced(self, instances, lighting_model=0, lod=0):
+        """
+        Renders many copies of the model with one draw call; the shader must
+        have useInstancing set.
+
+        Args:
+            instances: Per-instance attributes from instance_data(); their colors
+                take the place of object_color
+            lighting_model: Lighting model (0 - Phong, 1 - Blinn-Phong)
+            lod: Level of detail of all instances
+        """
+        self.bind_material(glm.vec3(1.0), lighting_model)
+        self.mesh.draw_instanced(instances, lod)
 
-    def draw_shadow_map(self, shadow_program=None):
+    def draw_shadow_map(self, shadow_program=None, lod=0):
         """
         Renders the model to a shadow map.
+
+        Args:
+            shadow_program: Shadow shader program (already in use)
+            lod: Level of detail; shadow passes usually pass ShadowMapping.mesh_lod
+        """
+        self.mesh.draw(lod)
+
+    def draw_shadow_map_instanced(self, instances, lod=0):
         """
-        glBindVertexArray(self.vao)
-        glDrawArrays(GL_TRIANGLES, 0, len(self.vertices))
-        glBindVertexArray(0)
+        Renders many copies of the model to a shadow map with one draw call.
+
+        Args:
+            instances: Per-instance attributes from instance_data()
+            lod: Level of detail; shadow passes usually pass ShadowMapping.mesh_lod
+        """
+        self.mesh.draw_instanced(instances, lod)
 
     def cleanup(self):
         """
-        Frees OpenGL resources.
+        Releases the shared mesh and texture; the registry frees the OpenGL
+        resources once no other Model uses them.
         """
-        if self.vao:
-            glDeleteVertexArrays(1, [self.vao])
-        if self.vbo:
-            glDeleteBuffers(1, [self.vbo])
-        if self.texture:
-            glDeleteTextures(1, [self.texture])
+        self.registry.release(self.mesh)
+        self.registry.release(self.texture_handle)
+        self.mesh = None
+        self.texture_handle = None
@@ -1,92 +1,385 @@
+import os
 import glm
-import re
+import numpy as np
 
-def loadOBJ(filename):
+# Layout of one interleaved vertex: position (3), normal (3), texture UV (2)
+VERTEX_COMPONENTS = 3 + 3 + 2
+VERTEX_STRIDE = VERTEX_COMPONENTS * 4
+POSITION_OFFSET = 0
+NORMAL_OFFSET = 3 * 4
+UV_OFFSET = (3 + 3) * 4
+
+# Streaming defaults: 64 Ki vertices (2 MiB) per emitted block, 8 MiB of text per read
+DEFAULT_BLOCK_VERTICES = 3 * 21846
+DEFAULT_CHUNK_BYTES = 8 << 20
+
+# ASCII bytes str.split treats as separators within a line (space, tab, vertical tab, form feed, CR)
+_WHITESPACE = np.frombuffer(b" \t\v\f\r", dtype=np.uint8)
+
+
+def _parse_floats(lines, width):
     """
-    Loads an OBJ file and returns the vertex coordinates,
-    texture coordinates (UV), and normal vectors.
+    Parses the numeric part of 'v'/'vt'/'vn' lines in one NumPy call.
+
+    Args:
+        lines (list): Lines with the keyword already stripped.
+        width (int): Number of components to keep per row.
+
+    Returns:
+        np.ndarray: (len(lines) + 1, width) float32 array. Row 0 is the
+        zero entry that OBJ index 0 (missing attribute) refers to.
+    """
+    table = np.zeros((len(lines) + 1, width), dtype=np.float32)
+    if not lines:
+        return table
+
+    values = np.fromstring(" ".join(lines), dtype=np.float32, sep=" ")
+    if values.size % len(lines) == 0 and values.size // len(lines) >= width:
+        table[1:] = values.reshape(len(lines), -1)[:, :width]
+    else:
+        # Rows with a varying number of components (e.g. optional 'w'), parse per line
+        for i, line in enumerate(lines):
+            parts = line.split()[:width]
+            table[i + 1, :len(parts)] = [float(p) for p in parts]
+    return table
+
+
+def _split_records(lines):
+    """
+    Buckets OBJ lines by keyword; everything else (o, g, s, usemtl, comments) is ignored.
+
+    The keyword is split off at any whitespace, so indented and
+    tab-separated records are read too.
+
+    Args:
+        lines (list): Lines of the file (or of a streamed chunk).
+
+    Returns:
+        tuple: (v, vt, vn, f) lists of lines with the keyword stripped, and a
+        (len(f), 3) int64 array with the number of v, vt and vn records
+        before each face line, for resolving relative indices.
+    """
+    buckets = {'v': [], 'vt': [], 'vn': [], 'f': []}
+    v_lines, vt_lines, vn_lines, f_lines = buckets['v'], buckets['vt'], buckets['vn'], buckets['f']
+    bases = []
+    for line in lines:
+        parts = line.split(None, 1)
+        if len(parts) == 2:
+            bucket = buckets.get(parts[0])
+            if bucket is not None:
+                bucket.append(parts[1])
+                if bucket is f_lines:
+                    bases.append((len(v_lines), len(vt_lines), len(vn_lines)))
+    return v_lines, vt_lines, vn_lines, f_lines, np.array(bases, dtype=np.int64).reshape(-1, 3)
+
+
+def _uniform_corners(text, corner_count, slashes):
+    """
+    Checks in one pass that every corner of the joined face lines has the
+    same number of '/'-separated fields.
+
+    Args:
+        text (str): Face lines joined into one string.
+        corner_count (int): Expected number of whitespace-separated corners.
+        slashes (int): Expected number of '/' per corner.
+
+    Returns:
+        bool: True if there are corner_count corners with exactly slashes each.
+    """
+    chars = np.frombuffer(text.encode('ascii', errors='replace'), dtype=np.uint8)
+    space = np.isin(chars, _WHITESPACE)
+    starts = ~space
+    starts[1:] &= space[:-1]
+    if int(starts.sum()) != corner_count:
+        return False
+    corner_of_char = np.cumsum(starts) - 1
+    per_corner = np.bincount(corner_of_char[chars == ord("/")], minlength=corner_count)
+    return bool(np.all(per_corner == slashes))
+
+
+def _parse_faces(lines, bases):
+    """
+    Parses 'f' lines into a (corners, 3) array of v/vt/vn indices.
+
+    Polygons with more than three corners are fan-triangulated. Negative
+    (relative) indices count back from the records defined before their
+    face, as the OBJ format defines them.
+
+    Args:
+        lines (list): Face lines with the keyword already stripped.
+        bases (np.ndarray): (len(lines), 3) v, vt and vn record counts before
+            each face, see _split_records.
+
+    Returns:
+        np.ndarray: (triangles * 3, 3) int64 array of absolute OBJ indices
+        (0 for a missing attribute).
+    """
+    if not lines:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    # Corner count per face; any run of spaces or tabs separates corners
+    sizes = np.fromiter((len(line.split()) for line in lines), dtype=np.int64, count=len(lines))
+    corner_count = int(sizes.sum())
+
+    # Normalize every corner to "v/vt/vn" so the whole block tokenizes in one pass
+    slashes = lines[0].split()[0].count("/")
+    text = " ".join(lines)
+    if slashes == 2:
+        text = text.replace("//", "/0/")
+    try:
+        tokens = np.fromstring(text.replace("/", " "), dtype=np.int64, sep=" ")
+    except ValueError:
+        # Separators fromstring does not know (e.g. non-breaking spaces), parse per corner below
+        tokens = np.zeros(0, dtype=np.int64)
+
+    # The one-pass tokenization is only safe when every corner has the same format
+    raw = np.zeros((corner_count, 3), dtype=np.int64)
+    if tokens.size == corner_count * (slashes + 1) and _uniform_corners(text, corner_count, slashes):
+        raw[:, :slashes + 1] = tokens.reshape(corner_count, slashes + 1)
+    else:
+        # Mixed corner formats or empty fields, parse per corner
+        faces = [line.split() for line in lines]
+        sizes = np.fromiter((len(face) for face in faces), dtype=np.int64, count=len(faces))
+        corners = [corner for face in faces for corner in face]
+        raw = np.zeros((len(corners), 3), dtype=np.int64)
+        for i, corner in enumerate(corners):
+            for j, value in enumerate(corner.split("/")[:3]):
+                raw[i, j] = int(value) if value else 0
+
+    if (raw < 0).any():
+        face_of_corner = np.repeat(np.arange(len(lines)), sizes)
+        raw = np.where(raw < 0, raw + bases[face_of_corner] + 1, raw)
+
+    if np.all(sizes == 3):
+        return raw
+
+    # Fan triangulation: (0, k, k + 1) for every polygon
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    tri_counts = np.maximum(sizes - 2, 0)
+    first = np.repeat(starts, tri_counts)
+    offsets = np.arange(tri_counts.sum()) - np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts)
+    order = np.stack((first, first + offsets + 1, first + offsets + 2), axis=1).reshape(-1)
+    return raw[order]
+
+
+class _GrowingTable:
+    def __init__(self, width):
+        """
+        Attribute table (positions, UVs or normals) that grows while streaming.
+
+        Rows are kept in one float32 array with amortized doubling, so a
+        million positions cost 12 MB instead of a million glm objects. Row 0
+        is the zero entry that OBJ index 0 refers to, as in _parse_floats.
+
+        Args:
+            width: Components per row
+        """
+        self.data = np.zeros((1024, width), dtype=np.float32)
+        self.count = 1
+
+    def extend(self, rows):
+        """Appends a (n, width) block of rows."""
+        needed = self.count + len(rows)
+        if needed > len(self.data):
+            capacity = len(self.data)
+            while capacity < needed:
+                capacity *= 2
+            data = np.zeros((capacity, self.data.shape[1]), dtype=np.float32)
+            data[:self.count] = self.data[:self.count]
+            self.data = data
+        self.data[self.count:needed] = rows
+        self.count = needed
+
+    def lookup(self, indices):
+        """Gathers rows for absolute OBJ indices."""
+        return self.data[:self.count][indices]
+
+
+class _BlockEmitter:
+    def __init__(self, on_block, block_vertices):
+        """
+        Collects packed vertices and hands them on in fixed-size blocks.
+
+        Args:
+            on_block: Callable receiving each (n, 8) float32 block
+            block_vertices: Rows per block (rounded down to whole triangles)
+        """
+        self.on_block = on_block
+        self.block = np.empty((max(3, block_vertices - block_vertices % 3), VERTEX_COMPONENTS), dtype=np.float32)
+        self.filled = 0
+        self.total = 0
+
+    def emit(self, positions, normals, uvs):
+        start = 0
+        while start < len(positions):
+            count = min(len(positions) - start, len(self.block) - self.filled)
+            rows = self.block[self.filled:self.filled + count]
+            rows[:, 0:3] = positions[start:start + count]
+            rows[:, 3:6] = normals[start:start + count]
+            rows[:, 6:8] = uvs[start:start + count]
+            self.filled += count
+            start += count
+            if self.filled == len(self.block):
+                self.flush()
+
+    def flush(self):
+        if self.filled:
+            self.on_block(self.block[:self.filled])
+            self.total += self.filled
+            self.filled = 0
+
+
+def streamOBJ(filename, on_block, block_vertices=DEFAULT_BLOCK_VERTICES,
+              chunk_bytes=DEFAULT_CHUNK_BYTES, progress=None):
+    """
+    Loads an OBJ file in chunks, emitting packed vertices in fixed-size blocks.
+
+    Only the v/vt/vn tables are kept for the whole file (faces may refer to
+    any earlier vertex); faces are resolved chunk by chunk and never held in
+    full, so peak memory is the attribute tables plus one chunk and one
+    block, independent of the face count. The rows match loadOBJPacked,
+    just delivered in pieces; negative (relative) indices count back from
+    the vertices read so far, as the OBJ format defines them.
 
     Args:
         filename (str): Path to the OBJ file.
+        on_block (callable): Receives each (n, 8) float32 block in file order.
+            The array is reused for the next block, so copy it to keep it.
+        block_vertices (int): Vertices per block; every block but the last is full.
+        chunk_bytes (int): Bytes of text parsed at a time.
+        progress (callable): Optional progress(bytes_read, total_bytes) callback.
 
     Returns:
-        tuple: Three lists containing vertices (vec3), UVs (vec2), and normals (vec3).
+        int: Number of vertices emitted, or None if the file could not be read.
     """
-    
-    vertices = []
-    uvs = []
-    normals = []
-    
-    # Lists for unique vertex data, UVs, and normal vectors
-    uniq_vertices = [glm.vec3(0.0, 0.0, 0.0)]
-    uniq_uvs = [glm.vec2(0.0, 0.0)]
-    uniq_normals = [glm.vec3(0.0, 0.0, 0.0)]
-    
-    # Indices for each list
-    indices_v = []
-    indices_uv = []
-    indices_vn = []
-    
-    print(f"Loading OBJ file '{filename}' ...")
-    
+    print(f"Streaming OBJ file '{filename}' ...")
+
     try:
-        with open(filename, 'r') as file:
-            for line in file:
-                line = line.strip()
-                if not line:
+        file = open(filename, 'rb')
+    except IOError:
+        print(f"Error: File '{filename}' could not be opened.")
+        return None
+
+    total_bytes = os.fstat(file.fileno()).st_size
+    positions = _GrowingTable(3)
+    uvs = _GrowingTable(2)
+    normals = _GrowingTable(3)
+    emitter = _BlockEmitter(on_block, block_vertices)
+
+    with file:
+        bytes_read = 0
+        remainder = b''
+        while True:
+            chunk = file.read(chunk_bytes)
+            bytes_read += len(chunk)
+            if chunk:
+                # Hold back the trailing partial line for the next chunk
+                chunk = remainder + chunk
+                cut = chunk.rfind(b'\n') + 1
+                if cut == 0:
+                    remainder = chunk
                     continue
+                chunk, remainder = chunk[:cut], chunk[cut:]
+            else:
+                chunk, remainder = remainder, b''
+                if not chunk:
+                    break
+
+            lines = chunk.decode('utf-8', errors='replace').splitlines()
+            v_lines, vt_lines, vn_lines, f_lines, bases = _split_records(lines)
+            del lines
+            # Relative indices count from the start of the file, not of the chunk
+            bases += (positions.count - 1, uvs.count - 1, normals.count - 1)
 
-                # Recognizing data types from the line
-                if line.startswith('v '):
-                    # Vertex
-                    parts = line.split()
-                    x, y, z = float(parts[1]), float(parts[2]), float(parts[3])
-                    uniq_vertices.append(glm.vec3(x, y, z))
-                
-                elif line.startswith('vt '):
-                    # Texture UV
-                    parts = line.split()
-                    u, v = float(parts[1]), float(parts[2])
-                    uniq_uvs.append(glm.vec2(u, v))
-                
-                elif line.startswith('vn '):
-                    # Normal vector
-                    parts = line.split()
-                    x, y, z = float(parts[1]), float(parts[2]), float(parts[3])
-                    uniq_normals.append(glm.vec3(x, y, z))
-                
-                elif line.startswith('f '):
-                    # Creating a face (triangle)
-                    parts = line.split()[1:]
-                    face_vertices = []
-                    face_uvs = []
-                    face_normals = []
-
-                    for part in parts:
-                        # Splitting indices by "/"
-                        vertex_indices = part.split('/')
-                        v_idx = int(vertex_indices[0]) if vertex_indices[0] else 0
-                        uv_idx = int(vertex_indices[1]) if len(vertex_indices) > 1 and vertex_indices[1] else 0
-                        vn_idx = int(vertex_indices[2]) if len(vertex_indices) > 2 and vertex_indices[2] else 0
-
-                        face_vertices.append(v_idx)
-                        face_uvs.append(uv_idx)
-                        face_normals.append(vn_idx)
-
-                    # Adding indices for each triangle
-                    indices_v.extend(face_vertices)
-                    indices_uv.extend(face_uvs)
-                    indices_vn.extend(face_normals)
+            # Attributes first: a face may use vertices defined earlier in the same chunk
+            if v_lines:
+                positions.extend(_parse_floats(v_lines, 3)[1:])
+            if vt_lines:
+                uvs.extend(_parse_floats(vt_lines, 2)[1:])
+            if vn_lines:
+                normals.extend(_parse_floats(vn_lines, 3)[1:])
+            if f_lines:
+                faces = _parse_faces(f_lines, bases)
+                emitter.emit(positions.lookup(faces[:, 0]),
+                             normals.lookup(faces[:, 2]),
+                             uvs.lookup(faces[:, 1]))
 
+            if progress is not None:
+                progress(bytes_read, total_bytes)
+
+    emitter.flush()
+    print("Loading complete.")
+    return emitter.total
+
+
+def loadOBJPacked(filename):
+    """
+    Loads an OBJ file with vectorized NumPy parsing.
+
+    Args:
+        filename (str): Path to the OBJ file.
+
+    Returns:
+        np.ndarray: Contiguous (N, 8) float32 array with one de-indexed vertex
+        per row laid out as position, normal, UV (see VERTEX_STRIDE and the
+        *_OFFSET constants), or None if the file could not be read.
+    """
+    print(f"Loading OBJ file '{filename}' ...")
+
+    try:
+        with open(filename, 'r') as file:
+            lines = file.read().splitlines()
     except IOError:
         print(f"Error: File '{filename}' could not be opened.")
-        return None, None, None
+        return None
+
+    v_lines, vt_lines, vn_lines, f_lines, bases = _split_records(lines)
+
+    positions = _parse_floats(v_lines, 3)
+    uvs = _parse_floats(vt_lines, 2)
+    normals = _parse_floats(vn_lines, 3)
+    faces = _parse_faces(f_lines, bases)
 
-    # Creating the final lists for vertices, UVs, and normals using the indices
-    for i in range(len(indices_v)):
-        vertices.append(uniq_vertices[indices_v[i]])
-        uvs.append(uniq_uvs[indices_uv[i]])
-        normals.append(uniq_normals[indices_vn[i]])
+    packed = np.empty((len(faces), VERTEX_COMPONENTS), dtype=np.float32)
+    packed[:, 0:3] = positions[faces[:, 0]]
+    packed[:, 3:6] = normals[faces[:, 2]]
+    packed[:, 6:8] = uvs[faces[:, 1]]
 
     print("Loading complete.")
+    return packed
+
+
+def unpackVertices(packed):
+    """
+    Converts a packed vertex array back to the list-of-glm layout.
+
+    Args:
+        packed (np.ndarray): (N, 8) array as returned by loadOBJPacked.
+
+    Returns:
+        tuple: Three lists containing vertices (vec3), UVs (vec2), and normals (vec3).
+    """
+    vertices = [glm.vec3(*row) for row in packed[:, 0:3].tolist()]
+    uvs = [glm.vec2(*row) for row in packed[:, 6:8].tolist()]
+    normals = [glm.vec3(*row) for row in packed[:, 3:6].tolist()]
     return vertices, uvs, normals
+
+
+def loadOBJ(filename):
+    """
+    Loads an OBJ file and returns the vertex coordinates,
+    texture coordinates (UV), and normal vectors.
+
+    Compatibility wrapper around loadOBJPacked for callers that still
+    expect one glm object per vertex.
+
+    Args:
+        filename (str): Path to the OBJ file.
+
+    Returns:
+        tuple: Three lists containing vertices (vec3), UVs (vec2), and normals (vec3).
+    """
+    packed = loadOBJPacked(filename)
+    if packed is None:
+        return None, None, None
+    return unpackVertices(packed)
@@ -0,0 +1,272 @@
+import math
+import numpy as np
+
+# Candidates thrown at every empty grid cell before the cell is given up (Bridson's k)
+POISSON_ATTEMPTS = 30
+
+# Offsets of the grid cells that can hold a point closer than the radius to a point in
+# the middle cell: the 5 x 5 block without its corners (cells are radius / sqrt(2) wide)
+NEIGHBOUR_OFFSETS = [(di, dj) for di in range(-2, 3) for dj in range(-2, 3)
+                     if (di, dj) != (0, 0) and abs(di) + abs(dj) < 4]
+
+
+def poisson_disk(bounds, radius, count=None, rng=None, attempts=POISSON_ATTEMPTS, reject=None):
+    """
+    Poisson-disk sample of a rectangle: random points no closer than radius.
+
+    Bridson-style dart throwing on a background grid whose cells are
+    radius / sqrt(2) wide, so a cell holds at most one point and a candidate
+    is only compared with the points of the 20 cells around it. Each round
+    throws one candidate into every cell that is still open, in random
+    order and in batches; within a batch the candidates are tested in 9
+    interleaved phases whose cells are too far apart to conflict, so a whole
+    phase is tested at once with NumPy. A cell closes when it gets a point,
+    or when reject() says it is blocked entirely. After `attempts` rounds
+    the sample is maximal (no further point fits), in time linear in the
+    area over radius squared.
+
+    When only `count` points are wanted, sampling stops as soon as they are
+    placed, or once the rounds left could not place the rest at the rate of
+    the last one (the rectangle is too crowded to hold them). Since the
+    cells are visited in random order, the points are spread evenly over the
+    whole rectangle. (Bridson's active list grows the sample outwards from a
+    seed, so its first points would all be clustered.)
+
+    Args:
+        bounds: (x_min, z_min, x_max, z_max) rectangle to fill
+        radius: Minimum distance between points
+        count: Number of points wanted (default: as many as fit)
+        rng: numpy.random.Generator (default: a fresh unseeded one)
+        attempts: Rounds of candidates per cell
+        reject: Optional callable reject(points, margin) returning an (M,)
+            bool mask of the points to discard (exclusion zones, other
+            objects); with margin > 0 only points whose whole neighbourhood
+            of radius margin would be discarded
+
+    Returns:
+        (N, 2) float64 array of XZ positions in random order
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    x_min, z_min, x_max, z_max = bounds
+    cell = radius / math.sqrt(2.0)
+    columns = max(1, int(math.ceil((x_max - x_min) / cell)))
+    rows = max(1, int(math.ceil((z_max - z_min) / cell)))
+    radius_squared = radius * radius
+
+    # Point coordinates per cell (NaN when empty), padded by two cells so neighbour lookups need no bounds checks
+    stride = columns + 4
+    grid_x = np.full((rows + 4) * stride, np.nan)
+    grid_z = np.full((rows + 4) * stride, np.nan)
+    offsets = [di * stride + dj for di, dj in NEIGHBOUR_OFFSETS]
+    open_cells = np.arange(rows * columns)
+    placed = []
+    total = 0
+
+    for attempt in range(attempts):
+        open_cells = rng.permutation(open_cells)
+        total_before = total
+        closed = np.zeros(len(open_cells), dtype=bool)
+        rejected = np.zeros(len(open_cells), dtype=bool)
+        start = 0
+        size = len(open_cells) if count is None else max(1024, 2 * (count - total))
+        while start < len(open_cells) and (count is None or total < count):
+            batch = open_cells[start:start + size]
+            batch_before = total
+            r, c = np.divmod(batch, columns)
+            x = x_min + (c + rng.random(len(batch))) * cell
+            z = z_min + (r + rng.random(len(batch))) * cell
+            keep = np.flatnonzero((x <= x_max) & (z <= z_max))
+            if reject is not None and len(keep):
+                # Usually cheaper than the neighbour checks, so it runs first
+                discarded = reject(np.stack((x[keep], z[keep]), axis=1), 0.0)
+                rejected[start + keep[discarded]] = True
+                keep = keep[~discarded]
+            phase = (r[keep] % 3) * 3 + c[keep] % 3
+            for p in range(9):
+                members = keep[phase == p]
+                xp, zp = x[members], z[members]
+                slots = (r[members] + 2) * stride + c[members] + 2
+                ok = np.ones(len(members), dtype=bool)
+                for offset in offsets:
+                    dx = grid_x.take(slots + offset) - xp
+                    dz = grid_z.take(slots + offset) - zp
+                    ok &= ~(dx * dx + dz * dz < radius_squared)
+                grid_x[slots[ok]] = xp[ok]
+                grid_z[slots[ok]] = zp[ok]
+                closed[start + members[ok]] = True
+                placed.append(slots[ok])
+                total += int(ok.sum())
+            start += size
+            if count is not None:
+                # Enough cells for the points still missing at the success rate of this batch
+                rate = max(total - batch_before, 1) / len(batch)
+                size = max(1024, int(1.2 * (count - total) / rate))
+        if count is not None and total >= count:
+            break
+        # Later rounds fill fewer cells than this one, give up when they cannot reach count
+        if count is not None and (total - total_before) * (attempts - attempt - 1) < count - total:
+            break
+        if rejected.any():
+            # Close the rejected cells that are blocked all over, judged from their centre
+            retry = np.flatnonzero(rejected)
+            r, c = np.divmod(open_cells[retry], columns)
+            centers = np.stack((x_min + (c + 0.5) * cell, z_min + (r + 0.5) * cell), axis=1)
+            closed[retry[reject(centers, cell * math.sqrt(0.5))]] = True
+        open_cells = open_cells[~closed]
+
+    slots = np.concatenate(placed)[:count] if placed else np.zeros(0, dtype=np.int64)
+    points = np.stack((grid_x[slots], grid_z[slots]), axis=1)
+    return points[rng.permutation(len(points))]
+
+
+def in_zones(points, zones, margin=0.0):
+    """
+    Args:
+        points: (N, 2) XZ positions
+        zones: (x_min, x_max, z_min, z_max) rectangles
+        margin: Only count points at least this far inside
+
+    Returns:
+        (N,) bool mask of points inside any of the rectangles
+    """
+    inside = np.zeros(len(points), dtype=bool)
+    for x_min, x_max, z_min, z_max in zones:
+        inside |= ((points[:, 0] >= x_min + margin) & (points[:, 0] <= x_max - margin) &
+                   (points[:, 1] >= z_min + margin) & (points[:, 1] <= z_max - margin))
+    return inside
+
+
+class PlacementGrid:
+    def __init__(self):
+        """
+        Everything placed on the terrain so far, for spacing checks across object types.
+
+        Each placed point keeps its spacing; a new point must be at least the
+        larger of its own and the other point's spacing away. The points are
+        bucketed into a uniform grid in CSR layout (rebuilt lazily after
+        additions), so a batch of candidates is checked with NumPy against
+        the few cells around each of them only.
+        """
+        self.clear()
+
+    def clear(self):
+        """Forgets all placed points."""
+        self._batches = []
+        self._index = None
+        self._blocked = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, points, spacing):
+        """
+        Records placed points.
+
+        Args:
+            points: (N, 2) XZ positions
+            spacing: Distance other objects must keep from these points
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points):
+            self._batches.append((points, float(spacing)))
+            self.count += len(points)
+            self._index = None
+            self._blocked = {}
+
+    def _build_index(self):
+        points = np.concatenate([batch[0] for batch in self._batches])
+        spacings = np.concatenate([np.full(len(batch[0]), batch[1]) for batch in self._batches])
+        low = points.min(axis=0)
+        extent = points.max(axis=0) - low
+
+        # Cells at least as wide as the largest spacing, and no more cells than about 4 per point
+        cell = max(float(spacings.max()), math.sqrt(float(extent[0] * extent[1]) / (4 * len(points))), 1e-6)
+        columns, rows = (extent // cell).astype(np.int64) + 1
+        column, row = np.floor((points - low) / cell).astype(np.int64).T
+        cells = row * columns + column
+        order = np.argsort(cells, kind='stable')
+        starts = np.searchsorted(cells[order], np.arange(rows * columns + 1))
+        self._index = (low, cell, columns, rows, starts, points[order], spacings[order])
+
+    def _blocked_cells(self, spacing, margin):
+        # Raster of cells lying wholly within (larger spacing - margin) of a placed point, any
+        # candidate in one of them is too close without checking; one per spacing and margin
+        key = (spacing, margin)
+        if key not in self._blocked:
+            low, _, _, _, _, points, spacings = self._index
+            extent = points.max(axis=0) - low
+            # Cells a quarter of the largest spacing wide, coarser when that would be more than 2^22 of them
+            cell = max(max(spacing, float(spacings.max())) / 4.0,
+                       math.sqrt(float((extent[0] + 1e-6) * (extent[1] + 1e-6)) / 2**22), 1e-6)
+            columns, rows = (extent // cell).astype(np.int64) + 1
+            blocked = np.zeros(rows * columns, dtype=bool)
+            column, row = np.floor((points - low) / cell).astype(np.int64).T
+            for other in np.unique(spacings):
+                # A cell is covered when every spot in it is in range of every spot in the point's cell
+                reach = (max(other, spacing) - margin) / cell
+                steps = int(math.ceil(reach)) - 2
+                if steps < 0:
+                    continue
+                di, dj = np.mgrid[-steps:steps + 1, -steps:steps + 1].reshape(2, -1)
+                inside = (np.abs(di) + 1) ** 2 + (np.abs(dj) + 1) ** 2 < reach * reach
+                di, dj = di[inside], dj[inside]
+                group = np.flatnonzero(spacings == other)
+                r = row[group, None] + di
+                c = column[group, None] + dj
+                valid = (r >= 0) & (r < rows) & (c >= 0) & (c < columns)
+                blocked[(r * columns + c)[valid]] = True
+            self._blocked[key] = (cell, columns, rows, blocked)
+        return self._blocked[key]
+
+    def too_close(self, candidates, spacing, margin=0.0):
+        """
+        Checks candidates against all placed points.
+
+        Args:
+            candidates: (M, 2) XZ positions
+            spacing: Spacing of the object type being placed
+            margin: Only report candidates that are too close by more than
+                this, i.e. whose whole neighbourhood of radius margin is too close
+
+        Returns:
+            (M,) bool mask, True where a placed point is closer than the larger
+            spacing minus margin
+        """
+        candidates = np.asarray(candidates, dtype=np.float64).reshape(-1, 2)
+        result = np.zeros(len(candidates), dtype=bool)
+        if self.count == 0 or len(candidates) == 0:
+            return result
+        if self._index is None:
+            self._build_index()
+        low, cell, columns, rows, cell_starts, points, spacings = self._index
+
+        # Candidates in a covered cell need no distance checks
+        fine, fine_columns, fine_rows, blocked = self._blocked_cells(spacing, margin)
+        column, row = np.floor((candidates - low) / fine).astype(np.int64).T
+        inside = (row >= 0) & (row < fine_rows) & (column >= 0) & (column < fine_columns)
+        result[inside] = blocked[(row * fine_columns + column)[inside]]
+
+        # Every point closer than max(spacing, cell) lies within `reach` cells of a candidate
+        reach = max(1, int(math.ceil(spacing / cell)))
+        unknown = np.flatnonzero(~result)
+        column, row = np.floor((candidates[unknown] - low) / cell).astype(np.int64).T
+        for di in range(-reach, reach + 1):
+            for dj in range(-reach, reach + 1):
+                r, c = row + di, column + dj
+                inside = (r >= 0) & (r < rows) & (c >= 0) & (c < columns) & ~result[unknown]
+                pending = np.flatnonzero(inside)
+                r, c, pending = r[pending], c[pending], unknown[pending]
+                cells = r * columns + c
+                starts = cell_starts[cells]
+                counts = cell_starts[cells + 1] - starts
+                if not counts.any():
+                    continue
+                # One row per (candidate, point in the cell) pair
+                owners = np.repeat(pending, counts)
+                others = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(len(owners))
+                required = np.maximum(np.maximum(spacings[others], spacing) - margin, 0.0)
+                distance = ((points[others] - candidates[owners]) ** 2).sum(axis=1)
+                result[owners[distance < required * required]] = True
+        return result
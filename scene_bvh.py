@@ -0,0 +1,654 @@
+import sys
+import time
+import argparse
+import numpy as np
+
+from terrain import triangle_positions
+
+# Largest number of primitives in a BVH leaf
+LEAF_SIZE = 4
+
+# Determinants below this are treated as rays parallel to a triangle
+PARALLEL_EPSILON = 1e-12
+
+
+def _segment_reduce(ufunc, values, first, count):
+    """Applies ufunc.reduceat to the rows values[first:first + count] of every segment (count > 0)."""
+    padded = np.concatenate((values, values[-1:]))
+    bounds = np.empty(2 * len(first), dtype=np.int64)
+    bounds[0::2] = first
+    bounds[1::2] = first + count
+    return ufunc.reduceat(padded, bounds, axis=0)[0::2]
+
+
+def build_bvh(lower, upper, leaf_size=LEAF_SIZE):
+    """
+    Builds a bounding-volume hierarchy over boxes by median splits.
+
+    Every node with more than leaf_size boxes is split in half at the
+    median of the box centers along the axis where the centers spread
+    most. All nodes of a level are split at once with one lexsort, so the
+    build is O(n log^2 n) in NumPy calls that each cover the whole level.
+    The two children of a node are stored next to each other.
+
+    Args:
+        lower: (N, 3) lower corners of the primitive boxes
+        upper: (N, 3) upper corners of the primitive boxes
+        leaf_size: Largest number of primitives per leaf
+
+    Returns:
+        tuple: (node_lower (M, 3), node_upper (M, 3), left (M,) index of the
+        first child or -1 for leaves, first (M,) and count (M,) range of a
+        node's primitives in order, order (N,) primitive indices)
+    """
+    centers = (np.asarray(lower, dtype=np.float64) + np.asarray(upper, dtype=np.float64)) * 0.5
+    order = np.arange(len(centers))
+    level_first = np.zeros(1, dtype=np.int64)
+    level_count = np.full(1, len(centers), dtype=np.int64)
+    level_nodes = np.zeros(1, dtype=np.int64)
+    firsts, counts, lefts = [level_first], [level_count], []
+    total = 1
+
+    while len(level_nodes):
+        left = np.full(len(level_nodes), -1, dtype=np.int64)
+        split = np.flatnonzero(level_count > leaf_size)
+        if len(split) == 0:
+            lefts.append(left)
+            break
+        first, count = level_first[split], level_count[split]
+
+        # Sort each node's primitives along the axis its centers spread most
+        sorted_centers = centers[order]
+        extent = (_segment_reduce(np.maximum, sorted_centers, first, count) -
+                  _segment_reduce(np.minimum, sorted_centers, first, count))
+        axis = np.argmax(extent, axis=1)
+        segment = np.repeat(np.arange(len(split)), count)
+        positions = np.repeat(first - np.cumsum(count) + count, count) + np.arange(len(segment))
+        keys = sorted_centers[positions, axis[segment]]
+        order[positions] = order[positions[np.lexsort((keys, segment))]]
+
+        # Children split the sorted range in half and are numbered in pairs
+        half = count // 2
+        left[split] = total + 2 * np.arange(len(split))
+        total += 2 * len(split)
+        lefts.append(left)
+        level_first = np.stack((first, first + half), axis=1).ravel()
+        level_count = np.stack((half, count - half), axis=1).ravel()
+        level_nodes = np.arange(len(level_first))
+        firsts.append(level_first)
+        counts.append(level_count)
+
+    first = np.concatenate(firsts)
+    count = np.concatenate(counts)
+    left = np.concatenate(lefts + [np.full(len(first) - sum(map(len, lefts)), -1, dtype=np.int64)])
+    node_lower = _segment_reduce(np.minimum, np.asarray(lower, dtype=np.float64)[order], first, count)
+    node_upper = _segment_reduce(np.maximum, np.asarray(upper, dtype=np.float64)[order], first, count)
+    return node_lower, node_upper, left, first, count, order
+
+
+def _traverse(left, roots, test, visit):
+    """
+    Walks BVHs for many queries at once, one tree level per step.
+
+    Args:
+        left: (M,) first child of every node, -1 for leaves
+        roots: (Q,) root node of each query
+        test: test(queries, nodes) returning the mask of query/node pairs to descend into
+        visit: visit(queries, nodes) called for the query/leaf pairs that pass the test
+    """
+    queries = np.arange(len(roots))
+    nodes = np.asarray(roots, dtype=np.int64)
+    while len(queries):
+        keep = test(queries, nodes)
+        queries, nodes = queries[keep], nodes[keep]
+        children = left[nodes]
+        leaf = children < 0
+        if leaf.any():
+            visit(queries[leaf], nodes[leaf])
+        inner = ~leaf
+        queries = np.repeat(queries[inner], 2)
+        nodes = np.repeat(children[inner], 2)
+        nodes[1::2] += 1
+
+
+def _expand(first, count):
+    """Indices first[k] .. first[k] + count[k] - 1 of all ranges, and the range each came from."""
+    owner = np.repeat(np.arange(len(first)), count)
+    return np.repeat(first - np.cumsum(count) + count, count) + np.arange(len(owner)), owner
+
+
+def _ray_box(origins, inverse_directions, limits, lower, upper):
+    """Mask of rays entering the boxes before their limits."""
+    with np.errstate(invalid='ignore'):
+        t0 = (lower - origins) * inverse_directions
+        t1 = (upper - origins) * inverse_directions
+    near = np.fmax.reduce(np.fmin(t0, t1), axis=1)
+    far = np.fmin.reduce(np.fmax(t0, t1), axis=1)
+    return (near <= far) & (far >= 0.0) & (near <= limits)
+
+
+def _ray_triangles(origins, directions, v0, e1, e2, limits):
+    """Möller-Trumbore: ray parameters of the hits (inf where a ray misses its triangle)."""
+    p = np.cross(directions, e2)
+    det = (e1 * p).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0 / det
+        s = origins - v0
+        u = (s * p).sum(axis=1) * inverse
+        q = np.cross(s, e1)
+        v = (directions * q).sum(axis=1) * inverse
+        t = (e2 * q).sum(axis=1) * inverse
+    hit = (np.abs(det) > PARALLEL_EPSILON) & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t >= 0.0) & (t <= limits)
+    return np.where(hit, t, np.inf)
+
+
+def closest_points_on_triangles(points, a, b, c):
+    """
+    Closest point of each triangle to a point (Ericson, Real-Time Collision Detection 5.1.5).
+
+    Args:
+        points: (N, 3) query points
+        a, b, c: (N, 3) triangle corners
+
+    Returns:
+        (N, 3) closest points
+    """
+    ab, ac = b - a, c - a
+    ap, bp, cp = points - a, points - b, points - c
+    d1, d2 = (ab * ap).sum(axis=1), (ac * ap).sum(axis=1)
+    d3, d4 = (ab * bp).sum(axis=1), (ac * bp).sum(axis=1)
+    d5, d6 = (ab * cp).sum(axis=1), (ac * cp).sum(axis=1)
+    va, vb, vc = d3 * d6 - d5 * d4, d5 * d2 - d1 * d6, d1 * d4 - d3 * d2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        on_ab = a + ab * (d1 / (d1 - d3))[:, None]
+        on_ac = a + ac * (d2 / (d2 - d6))[:, None]
+        on_bc = b + (c - b) * ((d4 - d3) / ((d4 - d3) + (d5 - d6)))[:, None]
+        denominator = 1.0 / (va + vb + vc)
+        inside = a + ab * (vb * denominator)[:, None] + ac * (vc * denominator)[:, None]
+
+    # Voronoi regions of the corners, then of the edges, then the face; the first match wins
+    regions = [(d1 <= 0) & (d2 <= 0), (d3 >= 0) & (d4 <= d3), (d6 >= 0) & (d5 <= d6),
+               (vc <= 0) & (d1 >= 0) & (d3 <= 0), (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+               (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)]
+    choices = [a, b, c, on_ab, on_ac, on_bc]
+    return np.select([region[:, None] for region in regions], choices, inside)
+
+
+class MeshBVH:
+    def __init__(self, positions, leaf_size=LEAF_SIZE):
+        """
+        BVH over the triangles of one mesh, in model space.
+
+        Built once per mesh and shared by every placed instance of it.
+
+        Args:
+            positions: (3T, 3) vertex positions, three rows per triangle
+                (Model.positions)
+            leaf_size: Largest number of triangles per leaf
+        """
+        triangles = np.asarray(positions, dtype=np.float64).reshape(-1, 3, 3)
+        lower, upper = triangles.min(axis=1), triangles.max(axis=1)
+        self.node_lower, self.node_upper, self.left, self.first, self.count, order = build_bvh(lower, upper, leaf_size)
+        triangles = triangles[order]
+        self.v0 = triangles[:, 0]
+        self.e1 = triangles[:, 1] - triangles[:, 0]
+        self.e2 = triangles[:, 2] - triangles[:, 0]
+        self.triangle_count = len(triangles)
+
+    @property
+    def node_count(self):
+        return len(self.left)
+
+    @property
+    def bounds(self):
+        """(lower, upper) corners of the mesh's bounding box."""
+        return self.node_lower[0], self.node_upper[0]
+
+
+class SceneBVH:
+    def __init__(self):
+        """
+        Ray, segment and sphere queries against placed meshes.
+
+        A two-level hierarchy: every mesh has a MeshBVH in model space, and
+        a top-level BVH over the world bounding boxes of the instances
+        selects the instances a query can touch. Queries are transformed
+        into each instance's model space, so the triangles are never copied
+        per instance, and moving an instance only refits the boxes of the
+        small top level (lazily, on the next query).
+
+        All queries are vectorized: any number of rays or spheres is
+        answered with one pass over the tree levels.
+        """
+        self._meshes = {}  # key -> index into _mesh_list
+        self._mesh_list = []
+        self._instances = {}  # id -> [mesh index, matrix, item]
+        self._next_id = 0
+        self._packed = None
+        self._top = None
+        self._refit = False
+
+    def __len__(self):
+        return len(self._instances)
+
+    def mesh_bvh(self, model):
+        """Returns the MeshBVH of a Model's mesh, building it on first use."""
+        key = model.mesh.key
+        if key not in self._meshes:
+            self.add_mesh(key, MeshBVH(model.positions))
+        return self._mesh_list[self._meshes[key]]
+
+    def add_mesh(self, key, mesh):
+        """Registers a prebuilt MeshBVH under a key, for add()."""
+        self._meshes[key] = len(self._mesh_list)
+        self._mesh_list.append(mesh)
+        self._packed = None
+
+    def add_model(self, model, transform, item=None):
+        """
+        Places a Model.
+
+        Args:
+            model: Model whose LOD 0 triangles are queried
+            transform: glm.mat4 or (4, 4) model matrix
+            item: Value queries return for this instance (default: the model)
+
+        Returns:
+            Instance id
+        """
+        self.mesh_bvh(model)
+        return self.add(model.mesh.key, transform, model if item is None else item)
+
+    def add_file(self, obj_path, transform, item=None):
+        """
+        Places the LOD 0 mesh of an OBJ file, loaded through the mesh cache
+        without GL (e.g. for headless runs); shares the mesh with add_model.
+
+        Returns:
+            Instance id
+        """
+        if obj_path not in self._meshes:
+            self.add_mesh(obj_path, MeshBVH(triangle_positions(obj_path)))
+        return self.add(obj_path, transform, item)
+
+    def add(self, key, transform, item=None):
+        """
+        Places an instance of a registered mesh.
+
+        Args:
+            key: Mesh key given to add_mesh (Model.mesh.key for add_model)
+            transform: glm.mat4 or (4, 4) model matrix
+            item: Value queries return for this instance
+
+        Returns:
+            Instance id
+        """
+        instance = self._next_id
+        self._next_id += 1
+        self._instances[instance] = [self._meshes[key], self._matrix(transform), item]
+        self._top = None
+        return instance
+
+    def move(self, instance, transform):
+        """
+        Sets the model matrix of an instance, e.g. an animated one.
+
+        The top level keeps its shape and only has its boxes refitted, so
+        moving objects every frame stays cheap.
+        """
+        matrix = self._matrix(transform)
+        self._instances[instance][1] = matrix
+        if self._top is not None:
+            row = self._top[5][instance]
+            self._top[2][row] = matrix
+            self._top[3][row] = np.linalg.inv(matrix)
+            self._refit = True
+
+    def remove(self, instance):
+        """Removes an instance; ids that were already removed are ignored."""
+        if self._instances.pop(instance, None) is not None:
+            self._top = None
+
+    def item(self, instance):
+        """Returns the item of an instance."""
+        return self._instances[instance][2]
+
+    @staticmethod
+    def _matrix(transform):
+        if isinstance(transform, np.ndarray):
+            return np.asarray(transform, dtype=np.float64)
+        # glm matrices are column-major: transform[c] is column c
+        return np.array([[transform[c][r] for c in range(4)] for r in range(4)], dtype=np.float64)
+
+    def _pack(self):
+        # All mesh trees in one set of arrays, node and triangle indices offset per mesh
+        if self._packed is None:
+            meshes = self._mesh_list
+            node_offsets = np.cumsum([0] + [mesh.node_count for mesh in meshes])
+            triangle_offsets = np.cumsum([0] + [mesh.triangle_count for mesh in meshes])
+            self._packed = {
+                'roots': node_offsets[:-1],
+                'lower': np.concatenate([mesh.node_lower for mesh in meshes]),
+                'upper': np.concatenate([mesh.node_upper for mesh in meshes]),
+                'left': np.concatenate([np.where(mesh.left >= 0, mesh.left + offset, -1)
+                                        for mesh, offset in zip(meshes, node_offsets)]),
+                'first': np.concatenate([mesh.first + offset for mesh, offset in zip(meshes, triangle_offsets)]),
+                'count': np.concatenate([mesh.count for mesh in meshes]),
+                'v0': np.concatenate([mesh.v0 for mesh in meshes]),
+                'e1': np.concatenate([mesh.e1 for mesh in meshes]),
+                'e2': np.concatenate([mesh.e2 for mesh in meshes]),
+            }
+        return self._packed
+
+    def _world_boxes(self, meshes, matrices):
+        # World boxes around the transformed corners of the mesh boxes
+        boxes = np.array([self._mesh_list[mesh].bounds for mesh in meshes]).reshape(-1, 2, 3)
+        corners = np.stack([np.stack((boxes[:, i, 0], boxes[:, j, 1], boxes[:, k, 2]), axis=1)
+                            for i, j, k in np.ndindex(2, 2, 2)], axis=1)
+        world = corners @ matrices[:, :3, :3].transpose(0, 2, 1) + matrices[:, None, :3, 3]
+        return world.min(axis=1), world.max(axis=1)
+
+    def _top_level(self):
+        # Instance arrays and the BVH over the instances' world boxes
+        if self._top is None:
+            ids = np.array(list(self._instances), dtype=np.int64)
+            entries = list(self._instances.values())
+            meshes = np.array([entry[0] for entry in entries], dtype=np.int64)
+            matrices = np.array([entry[1] for entry in entries]).reshape(-1, 4, 4)
+            inverses = np.linalg.inv(matrices)
+            tree = build_bvh(*self._world_boxes(meshes, matrices), 1) if len(ids) else None
+            rows = {instance: row for row, instance in enumerate(ids.tolist())}
+            self._top = (ids, meshes, matrices, inverses, tree, rows)
+            self._refit = False
+        elif self._refit:
+            _, meshes, matrices, _, tree, _ = self._top
+            lower, upper = self._world_boxes(meshes, matrices)
+            _, _, _, first, count, order = tree
+            tree[0][:] = _segment_reduce(np.minimum, lower[order], first, count)
+            tree[1][:] = _segment_reduce(np.maximum, upper[order], first, count)
+            self._refit = False
+        return self._top
+
+    def _instance_pairs(self, query_count, test):
+        """
+        (query, instance row) pairs whose instance boxes pass the test.
+
+        Args:
+            query_count: Number of queries
+            test: test(queries, lower, upper) returning the mask of queries touching the boxes
+        """
+        tree = self._top_level()[4]
+        if tree is None or query_count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        node_lower, node_upper, left, first, count, order = tree
+        found = []
+
+        def visit(queries, nodes):
+            rows, owner = _expand(first[nodes], count[nodes])
+            found.append((queries[owner], order[rows]))
+
+        _traverse(left, np.zeros(query_count, dtype=np.int64),
+                  lambda queries, nodes: test(queries, node_lower[nodes], node_upper[nodes]), visit)
+        if not found:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate([pair[0] for pair in found]), np.concatenate([pair[1] for pair in found])
+
+    def _cast(self, origins, directions, limits):
+        """Closest hits of the rays origin + t * direction with 0 <= t <= limit."""
+        count = len(origins)
+        best = np.array(limits, dtype=np.float64)
+        distances = np.full(count, np.inf)
+        hit_pairs = np.full(count, -1, dtype=np.int64)
+        hit_triangles = np.full(count, -1, dtype=np.int64)
+        with np.errstate(divide='ignore'):
+            inverse_directions = 1.0 / directions
+
+        pair_query, pair_row = self._instance_pairs(count, lambda queries, lower, upper: _ray_box(
+            origins[queries], inverse_directions[queries], best[queries], lower, upper))
+        ids, meshes, _, inverses = self._top_level()[:4]
+        packed = self._pack()
+
+        # Rays in each instance's model space; t is the same there as in world space
+        inverse = inverses[pair_row]
+        model_origins = np.einsum('pij,pj->pi', inverse[:, :3, :3], origins[pair_query]) + inverse[:, :3, 3]
+        model_directions = np.einsum('pij,pj->pi', inverse[:, :3, :3], directions[pair_query])
+        with np.errstate(divide='ignore'):
+            model_inverse_directions = 1.0 / model_directions
+
+        def test(pairs, nodes):
+            return _ray_box(model_origins[pairs], model_inverse_directions[pairs], best[pair_query[pairs]],
+                            packed['lower'][nodes], packed['upper'][nodes])
+
+        def visit(pairs, nodes):
+            triangles, owner = _expand(packed['first'][nodes], packed['count'][nodes])
+            pairs = pairs[owner]
+            queries = pair_query[pairs]
+            t = _ray_triangles(model_origins[pairs], model_directions[pairs], packed['v0'][triangles],
+                               packed['e1'][triangles], packed['e2'][triangles], best[queries])
+            hit = np.flatnonzero(np.isfinite(t))
+            if len(hit) == 0:
+                return
+            # Closest hit per query, kept if it beats the best so far
+            order = hit[np.lexsort((t[hit], queries[hit]))]
+            first = order[np.r_[True, queries[order][1:] != queries[order][:-1]]]
+            first = first[t[first] < distances[queries[first]]]
+            query = queries[first]
+            distances[query] = best[query] = t[first]
+            hit_pairs[query] = pairs[first]
+            hit_triangles[query] = triangles[first]
+
+        _traverse(packed['left'], packed['roots'][meshes[pair_row]], test, visit)
+
+        instances = np.full(count, -1, dtype=np.int64)
+        normals = np.zeros((count, 3))
+        hit = np.flatnonzero(hit_pairs >= 0)
+        if len(hit):
+            pairs, triangles = hit_pairs[hit], hit_triangles[hit]
+            instances[hit] = ids[pair_row[pairs]]
+            # Normals go to world space with the inverse transpose and face the ray
+            normal = np.cross(packed['e1'][triangles], packed['e2'][triangles])
+            normal = np.einsum('pji,pj->pi', inverse[pairs, :3, :3], normal)
+            normal /= np.linalg.norm(normal, axis=1, keepdims=True)
+            facing = np.where((normal * directions[hit]).sum(axis=1) > 0.0, -1.0, 1.0)
+            normals[hit] = normal * facing[:, None]
+        return distances, instances, normals
+
+    def raycast(self, origins, directions, max_distance=np.inf):
+        """
+        Casts rays against the scene.
+
+        Args:
+            origins: (N, 3) ray origins
+            directions: (N, 3) ray directions (need not be normalized)
+            max_distance: Scalar or (N,) limit of the hit distances
+
+        Returns:
+            tuple: (distances (N,), inf for misses; instance ids (N,), -1 for
+            misses; unit world normals (N, 3) facing the ray origins)
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        directions = directions / np.linalg.norm(directions, axis=1, keepdims=True)
+        limits = np.broadcast_to(np.asarray(max_distance, dtype=np.float64), (len(origins),))
+        return self._cast(origins, directions, limits)
+
+    def segment_cast(self, starts, ends):
+        """
+        Finds where segments first hit the scene.
+
+        Args:
+            starts: (N, 3) segment starts
+            ends: (N, 3) segment ends
+
+        Returns:
+            tuple: (fractions (N,) of the way from start to end, inf for
+            misses; instance ids; unit world normals), as for raycast
+        """
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 3)
+        return self._cast(starts, ends - starts, np.ones(len(starts)))
+
+    def sphere_overlaps(self, centers, radii):
+        """
+        Finds the instances whose surfaces the spheres touch.
+
+        Args:
+            centers: (N, 3) sphere centers
+            radii: Scalar or (N,) sphere radii
+
+        Returns:
+            tuple: (query indices, instance ids) of all touching pairs, each pair once
+        """
+        centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(centers),))
+
+        def touches_box(queries, lower, upper):
+            offset = np.clip(centers[queries], lower, upper) - centers[queries]
+            return (offset * offset).sum(axis=1) <= radii[queries] ** 2
+
+        pair_query, pair_row = self._instance_pairs(len(centers), touches_box)
+        ids, meshes, matrices, inverses = self._top_level()[:4]
+        packed = self._pack()
+
+        # Model-space boxes around the spheres' world boxes for descending the mesh trees
+        inverse = inverses[pair_row]
+        low, high = centers[pair_query] - radii[pair_query, None], centers[pair_query] + radii[pair_query, None]
+        extent = np.abs(inverse[:, :3, :3]) @ ((high - low) * 0.5)[:, :, None]
+        middle = np.einsum('pij,pj->pi', inverse[:, :3, :3], (low + high) * 0.5) + inverse[:, :3, 3]
+        box_lower, box_upper = middle - extent[:, :, 0], middle + extent[:, :, 0]
+        touching = []
+
+        def test(pairs, nodes):
+            return np.all((packed['lower'][nodes] <= box_upper[pairs]) &
+                          (packed['upper'][nodes] >= box_lower[pairs]), axis=1)
+
+        def visit(pairs, nodes):
+            triangles, owner = _expand(packed['first'][nodes], packed['count'][nodes])
+            pairs = pairs[owner]
+            # Triangles whose boxes miss the sphere's box are skipped cheaply
+            v0, e1, e2 = packed['v0'][triangles], packed['e1'][triangles], packed['e2'][triangles]
+            close = np.flatnonzero(np.all((v0 + np.minimum(np.minimum(e1, e2), 0.0) <= box_upper[pairs]) &
+                                          (v0 + np.maximum(np.maximum(e1, e2), 0.0) >= box_lower[pairs]), axis=1))
+            triangles, pairs = triangles[close], pairs[close]
+            # The exact test runs in world space, where the sphere is still a sphere
+            matrix = matrices[pair_row[pairs]]
+            rotation = matrix[:, :3, :3]
+            a = np.einsum('pij,pj->pi', rotation, packed['v0'][triangles]) + matrix[:, :3, 3]
+            b = a + np.einsum('pij,pj->pi', rotation, packed['e1'][triangles])
+            c = a + np.einsum('pij,pj->pi', rotation, packed['e2'][triangles])
+            queries = pair_query[pairs]
+            offset = closest_points_on_triangles(centers[queries], a, b, c) - centers[queries]
+            touching.append(np.unique(pairs[(offset * offset).sum(axis=1) <= radii[queries] ** 2]))
+
+        _traverse(packed['left'], packed['roots'][meshes[pair_row]], test, visit)
+        pairs = np.unique(np.concatenate(touching)) if touching else np.zeros(0, dtype=np.int64)
+        return pair_query[pairs], ids[pair_row[pairs]]
+
+    def first_hit(self, origin, direction, max_distance=np.inf):
+        """
+        Casts one ray, e.g. for mouse picking.
+
+        Returns:
+            (distance, item, normal) of the closest hit, or None
+        """
+        distances, instances, normals = self.raycast(np.asarray(origin), np.asarray(direction), max_distance)
+        if instances[0] < 0:
+            return None
+        return float(distances[0]), self.item(int(instances[0])), normals[0]
+
+    def segment_hit(self, start, end):
+        """
+        Casts one segment, e.g. from the player to the third-person camera.
+
+        Returns:
+            Fraction of the way from start to end at the first hit, or None
+        """
+        fractions, instances, _ = self.segment_cast(np.asarray(start), np.asarray(end))
+        return float(fractions[0]) if instances[0] >= 0 else None
+
+    def touching(self, center, radius):
+        """Returns the items of the instances whose surfaces a sphere touches."""
+        _, instances = self.sphere_overlaps(np.asarray(center), radius)
+        return [self.item(int(instance)) for instance in instances]
+
+
+def _benchmark_scene(rng):
+    """The props of the baked map, as meshes from the asset cache (no GL needed)."""
+    # Mesh -> number of randomly placed and turned instances, as in Main.SCENE_PROPS
+    placements = {"models/cactus1.obj": 100, "models/bark.obj": 10, "models/rock.obj": 4, "models/monkey.obj": 1}
+    scene = SceneBVH()
+    print(f"{'mesh':<24}{'tris':>8}{'nodes':>8}{'build ms':>10}")
+    for path, count in placements.items():
+        positions = triangle_positions(path)
+        start = time.perf_counter()
+        mesh = MeshBVH(positions)
+        elapsed = time.perf_counter() - start
+        print(f"{path:<24}{mesh.triangle_count:>8}{mesh.node_count:>8}{elapsed * 1000:>10.1f}")
+        scene.add_mesh(path, mesh)
+        for _ in range(count):
+            angle = rng.uniform(0.0, 2.0 * np.pi)
+            matrix = np.eye(4)
+            matrix[[0, 0, 2, 2], [0, 2, 0, 2]] = np.cos(angle), np.sin(angle), -np.sin(angle), np.cos(angle)
+            matrix[:3, 3] = rng.uniform(-50.0, 50.0), 0.0, rng.uniform(-50.0, 50.0)
+            scene.add(path, matrix, path)
+    start = time.perf_counter()
+    scene._top_level()
+    print(f"top level over {len(scene)} instances: {(time.perf_counter() - start) * 1000:.2f} ms")
+    return scene
+
+
+def _brute_force_cast(scene, origins, directions):
+    """Closest hit distance of every ray against every triangle of every instance."""
+    ids, meshes, matrices = scene._top_level()[:3]
+    rotation, offset = matrices[:, :3, :3], matrices[:, :3, 3]
+    v0 = np.concatenate([scene._mesh_list[mesh].v0 @ rotation[k].T + offset[k] for k, mesh in enumerate(meshes)])
+    e1 = np.concatenate([scene._mesh_list[mesh].e1 @ rotation[k].T for k, mesh in enumerate(meshes)])
+    e2 = np.concatenate([scene._mesh_list[mesh].e2 @ rotation[k].T for k, mesh in enumerate(meshes)])
+    distances = np.full(len(origins), np.inf)
+    for ray in range(len(origins)):
+        t = _ray_triangles(np.broadcast_to(origins[ray], v0.shape), np.broadcast_to(directions[ray], v0.shape),
+                           v0, e1, e2, np.inf)
+        distances[ray] = t.min()
+    return distances
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark BVH builds and scene queries on the baked map's props.")
+    parser.add_argument("--queries", type=int, default=100000, help="rays, segments and spheres per batch")
+    parser.add_argument("--check", type=int, default=20, help="rays compared with a brute-force cast")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the placement and the queries")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    scene = _benchmark_scene(rng)
+
+    # Rays from around head height in all directions, segments like third-person camera arms
+    count = args.queries
+    origins = np.column_stack((rng.uniform(-50, 50, count), rng.uniform(0.5, 4.0, count), rng.uniform(-50, 50, count)))
+    directions = rng.normal(size=(count, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    arms = directions * 5.0
+
+    print(f"{'query':<24}{'count':>8}{'hits':>8}{'ms':>10}{'per second':>14}")
+    for name, run in (("raycast", lambda: scene.raycast(origins, directions, 50.0)[1] >= 0),
+                      ("segment_cast (5 units)", lambda: scene.segment_cast(origins, origins + arms)[1] >= 0),
+                      ("sphere_overlaps (r=0.5)",
+                       lambda: np.isin(np.arange(count), scene.sphere_overlaps(origins, 0.5)[0]))):
+        start = time.perf_counter()
+        hits = run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<24}{count:>8}{int(hits.sum()):>8}{elapsed * 1000:>10.1f}{count / elapsed:>14.0f}")
+
+    if args.check:
+        check = slice(0, min(args.check, count))
+        expected = _brute_force_cast(scene, origins[check], directions[check])
+        expected[expected > 50.0] = np.inf
+        found = scene.raycast(origins[check], directions[check], 50.0)[0]
+        same = np.isclose(found, expected, rtol=1e-9, atol=1e-9) | (np.isinf(found) & np.isinf(expected))
+        print(f"brute-force check: {int(same.sum())}/{len(same)} rays agree")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+import numpy as np
+import glm
+
+from asset_cache import CACHE_ROOT, mesh_cache
+
+# Bump when the file format or the way layouts are generated from a seed changes
+LAYOUT_VERSION = 1
+LAYOUT_DIRECTORY = os.path.join(CACHE_ROOT, "layouts")
+
+
+def random_seed():
+    """Returns a fresh 32-bit scene seed, short enough to be passed back with --seed."""
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+
+def layout_key(seed, recipe, mesh_paths):
+    """
+    Identifies a generated layout.
+
+    Args:
+        seed: Scene seed
+        recipe: JSON-serializable settings the layout is generated with
+            (counts, spacings, height offsets, exclusion zones)
+        mesh_paths: Meshes the layout is derived from, e.g. the ground
+
+    Returns:
+        Hex digest, or None when a mesh source cannot be hashed (frozen builds)
+    """
+    digest = hashlib.sha1(json.dumps([LAYOUT_VERSION, seed, recipe], sort_keys=True).encode('utf-8'))
+    try:
+        for path in mesh_paths:
+            digest.update(mesh_cache.source_hash(path).encode('ascii'))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class SceneLayout:
+    def __init__(self, seed, positions, key=None):
+        """
+        Positions of all props scattered over the terrain, generated from one seed.
+
+        Args:
+            seed: Seed the layout was generated from
+            positions: Object type -> (N, 3) positions, terrain height and
+                height offset included
+            key: layout_key the layout was generated for
+        """
+        self.seed = seed
+        self.positions = {object_type: np.asarray(points, dtype=np.float32).reshape(-1, 3)
+                          for object_type, points in positions.items()}
+        self.key = key
+
+    def vectors(self, object_type):
+        """List of glm.vec3 positions of one object type."""
+        return [glm.vec3(*point) for point in self.positions.get(object_type, np.zeros((0, 3))).tolist()]
+
+    def transforms(self, object_type):
+        """List of glm.mat4 translations of one object type."""
+        return [glm.translate(glm.mat4(1.0), position) for position in self.vectors(object_type)]
+
+    def save(self, path):
+        """
+        Writes the layout to a compressed .npz file.
+
+        Args:
+            path: Layout file; written to a temporary file first and moved into place
+        """
+        object_types = list(self.positions)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez_compressed(
+                file,
+                version=np.int64(LAYOUT_VERSION),
+                seed=np.int64(self.seed),
+                key=np.array(self.key or ""),
+                types=np.array(object_types),
+                counts=np.array([len(self.positions[t]) for t in object_types], dtype=np.int64),
+                positions=np.concatenate([self.positions[t] for t in object_types]) if object_types
+                else np.zeros((0, 3), dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a layout written by save().
+
+        Args:
+            path: Layout file
+
+        Returns:
+            SceneLayout, or None if the file is missing, unreadable or of another version
+        """
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != LAYOUT_VERSION:
+                    return None
+                ends = np.cumsum(data['counts'])
+                points = np.split(data['positions'], ends[:-1])
+                positions = dict(zip(data['types'].tolist(), points))
+                return cls(int(data['seed']), positions, str(data['key']) or None)
+        except (IOError, ValueError, KeyError) as e:
+            print(f"Scene layout '{path}' is unreadable: {e}")
+            return None
+
+
+def load_or_generate(key, generate, path=None):
+    """
+    Returns a stored layout, generating and storing it on a miss.
+
+    Args:
+        key: layout_key of the wanted layout, or None to not store it
+        generate: Callable returning a new SceneLayout
+        path: Layout file to pin instead of the one in LAYOUT_DIRECTORY for
+            key; it is used even if it was generated with another seed,
+            other settings or other assets, and written on first use
+
+    Returns:
+        SceneLayout
+    """
+    pinned = path is not None
+    if path is None and key is not None:
+        path = os.path.join(LAYOUT_DIRECTORY, key + ".npz")
+
+    layout = SceneLayout.load(path) if path is not None else None
+    if layout is not None and (pinned or layout.key == key):
+        if key is not None and layout.key != key:
+            print(f"Scene layout '{path}' does not match the current seed, settings or assets, using it anyway")
+        print(f"Loaded scene layout (seed {layout.seed}) from '{path}'")
+        return layout
+
+    layout = generate()
+    layout.key = key
+    if path is not None:
+        try:
+            layout.save(path)
+        except OSError as e:
+            print(f"Could not write scene layout '{path}': {e}")
+    return layout
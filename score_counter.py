@@ -1,24 +1,14 @@
-import os
-import sys
 import glfw
 import glm
 from text_render import TextRenderer
+from asset_archive import resolver
 
 class ScoreCounter:
     def __init__(self):
         self.collected_balls = 0
 
-        # Check if the application is frozen (packed by PyInstaller)
-        if getattr(sys, 'frozen', False):
-            # If the application is packed, set the path to the folder where PyInstaller stores the files
-            bundle_dir = sys._MEIPASS
-            font_path = os.path.join(bundle_dir, "fonts", "arial.ttf")
-        else:
-            # If the application is running in development mode, use the relative path to the font
-            font_path = os.path.join(os.path.dirname(__file__), "fonts", "arial.ttf")
-        
-        # Load the font with the dynamically set path
-        self.text_renderer = TextRenderer(font_path, 84)
+        # The font comes from the asset archive in frozen builds, the fonts directory otherwise
+        self.text_renderer = TextRenderer(resolver.open_binary("fonts/arial.ttf"), 84)
 
     def increment(self):
         self.collected_balls += 1
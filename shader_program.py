@@ -1,7 +1,6 @@
-import os
-import sys
 from OpenGL.GL import *
 import glm
+from asset_archive import resolver
 
 class ShaderProgram:
     def __init__(self, vertex_source, fragment_source):
@@ -138,15 +137,9 @@ class ShaderProgram:
         glUniform4fv(location, 1, glm.value_ptr(vector))
 
 
-# Function to load shader files based on whether the app is frozen or not
 def load_shader_file(file_name):
-    if getattr(sys, 'frozen', False):
-        # If the application is frozen (PyInstaller), use the _MEIPASS directory
-        bundle_dir = sys._MEIPASS
-        file_path = os.path.join(bundle_dir, "shaders", file_name)
-    else:
-        # If running in development mode, use the normal file path
-        file_path = os.path.join(os.path.dirname(__file__), "shaders", file_name)
-
-    with open(file_path, 'r') as file:
-        return file.read()
+    """
+    Returns the source of a shader in the shaders directory, read through
+    the asset resolver (packed archive in frozen builds, loose file otherwise).
+    """
+    return resolver.read_text(f"shaders/{file_name}")
@@ -20,6 +20,7 @@ in vec3 FragPos;
 in vec3 Normal;
 in vec2 TexCoord;
 in vec4 FragPosLightSpace;
+in vec3 InstanceColor;
 in vec3 WorldPos;
 
 out vec4 FragColor;
@@ -77,10 +78,10 @@ vec3 calculateLight(Light light, vec3 norm, vec3 viewDir)
     float bias = max(0.05 * (1.0 - dot(norm, lightDir)), 0.005);
     float shadow = ShadowCalculation(FragPosLightSpace, bias);
     
-    vec3 ambient = light.ambient_strength * light.color * material.ambient;
+    vec3 ambient = light.ambient_strength * light.color * material.ambient * InstanceColor;
     
     float diff = max(dot(norm, lightDir), 0.0);
-    vec3 diffuse = diff * light.color * material.diffuse * attenuation;
+    vec3 diffuse = diff * light.color * material.diffuse * InstanceColor * attenuation;
     
     vec3 specular;
     if(lightingModel == 0) {
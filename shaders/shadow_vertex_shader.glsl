@@ -1,9 +1,12 @@
 #version 330 core
 layout (location = 0) in vec3 aPos;
+layout (location = 3) in mat4 aInstanceModel;
 
 uniform mat4 lightSpaceMatrix;
 uniform mat4 model;
+uniform bool useInstancing;
 
 void main() {
-    gl_Position = lightSpaceMatrix * model * vec4(aPos, 1.0);
-}
\ No newline at end of file
+    mat4 modelMatrix = useInstancing ? aInstanceModel : model;
+    gl_Position = lightSpaceMatrix * modelMatrix * vec4(aPos, 1.0);
+}
@@ -2,22 +2,39 @@
 layout (location = 0) in vec3 aPos;
 layout (location = 1) in vec2 aTexCoord;
 layout (location = 2) in vec3 aNormal;
+// Per-instance attributes, read when useInstancing is set
+layout (location = 3) in mat4 aInstanceModel;
+layout (location = 7) in mat3 aInstanceNormal;
+layout (location = 10) in vec3 aInstanceColor;
 
 out vec3 Normal;
 out vec3 FragPos;
 out vec2 TexCoord;
 out vec4 FragPosLightSpace;
+out vec3 InstanceColor;
 
 uniform mat4 model;
 uniform mat4 view;
 uniform mat4 projection;
 uniform mat4 lightSpaceMatrix;
+uniform bool useInstancing;
 
 void main() {
-    vec4 worldPos = model * vec4(aPos, 1.0);
+    mat4 modelMatrix;
+    mat3 normalMatrix;
+    if (useInstancing) {
+        modelMatrix = aInstanceModel;
+        normalMatrix = aInstanceNormal;
+        InstanceColor = aInstanceColor;
+    } else {
+        modelMatrix = model;
+        normalMatrix = mat3(transpose(inverse(model)));
+        InstanceColor = vec3(1.0);
+    }
+    vec4 worldPos = modelMatrix * vec4(aPos, 1.0);
     FragPos = vec3(worldPos);
-    Normal = mat3(transpose(inverse(model))) * aNormal;
+    Normal = normalMatrix * aNormal;
     TexCoord = aTexCoord;
     FragPosLightSpace = lightSpaceMatrix * worldPos;
-    gl_Position = projection * view * model * vec4(aPos, 1.0);
-}
\ No newline at end of file
+    gl_Position = projection * view * worldPos;
+}
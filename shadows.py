@@ -9,6 +9,10 @@ class ShadowMapping:
         self.depth_map_fbo = None
         self.depth_map_texture = None
         self.shadow_shader = None
+
+        # Depth-only rendering at shadow map resolution hides simplification,
+        # so casters are drawn with a coarse LOD
+        self.mesh_lod = 2
         
         # Light parameters for shadows
         self.light_position = glm.vec3(0.0, 10.0, 0.0)
@@ -2,58 +2,204 @@ from OpenGL.GL import *
 import numpy as np
 import glm
 import ctypes
-from PIL import Image
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from texture_cache import load_cubemap_face
+
+# Cubemap folders in the order ContextMenu refers to them
+SKYBOX_FOLDERS = ["skybox1", "skybox3", "skybox"]
+
+# Cubemaps kept in VRAM at once (skybox3 alone is 288 MB uncompressed)
+MAX_RESIDENT_CUBEMAPS = 2
+
+# Texel bytes uploaded per frame while a cubemap is being made resident
+UPLOAD_BYTES_PER_FRAME = 8 << 20
+
+# Seconds after startup or the last switch before the other sets are prefetched
+PREFETCH_DELAY = 5.0
+
+
+def cubemap_faces(folder):
+    """Returns the six face image paths of a cubemap folder in GL face order"""
+    return [
+        f"{folder}/posx.jpg",  # Right
+        f"{folder}/negx.jpg",  # Left
+        f"{folder}/posy.jpg",  # Top
+        f"{folder}/negy.jpg",  # Bottom
+        f"{folder}/posz.jpg",  # Front
+        f"{folder}/negz.jpg"   # Back
+    ]
+
+
+def decode_cubemap(folder):
+    """
+    Loads the six decoded faces of a cubemap through the texture cache.
+    Safe to call off the GL thread.
+
+    Args:
+        folder: Directory with posx/negx/posy/negy/posz/negz.jpg
+
+    Returns:
+        List of six (height, width, 3) uint8 arrays in GL face order
+    """
+    return [load_cubemap_face(face) for face in cubemap_faces(folder)]
+
 
 class CSkyBox:
-    def __init__(self, shader_program):
-        """Initialize SkyBox with multiple cubemaps"""
+    def __init__(self, shader_program, decoded=None, active=0, max_resident=MAX_RESIDENT_CUBEMAPS):
+        """
+        Initialize SkyBox with multiple cubemaps
+
+        Only the active set is loaded up front. Other sets are decoded on a
+        background thread when ContextMenu first selects them, or prefetched
+        once the scene has been idle for PREFETCH_DELAY seconds, and are
+        uploaded on the main thread UPLOAD_BYTES_PER_FRAME at a time. Until a set is ready
+        the previously shown one stays on screen. At most max_resident
+        cubemaps are kept in VRAM; the least recently shown one is dropped.
+
+        Args:
+            shader_program: Skybox shader program
+            decoded: Optional {folder: faces} from decode_cubemap, e.g. from AssetLoader
+            active: Index into SKYBOX_FOLDERS shown at startup
+            max_resident: Number of cubemaps kept uploaded at once
+        """
         self.shader_program = shader_program
-        self.current_texture = 0
-        self.textures = []
-        
-        # Setup both cubemap sets
-        self.setup_cubemap("skybox1")  # First set
-        self.setup_cubemap("skybox3")  # Second set
-        self.setup_cubemap("skybox")  # third set
+        self.current_texture = active
+        self.max_resident = max(1, max_resident)
+        self.resident = OrderedDict()   # set index -> GL texture, least recently shown first
+        self.decoded = {}               # set index -> six decoded faces, until the set is resident
+        self.failed = set()
+        self._futures = {}              # set index -> Future of decode_cubemap
+        self._upload = None             # (set index, texture, faces, face, row) being uploaded
+        self._last_request = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="skybox-decode")
+
+        for folder, faces in (decoded or {}).items():
+            if folder in SKYBOX_FOLDERS:
+                self.decoded[SKYBOX_FOLDERS.index(folder)] = faces
+
+        # The startup set is uploaded right away so the first frame has a sky
+        if active not in self.decoded:
+            try:
+                self.decoded[active] = decode_cubemap(SKYBOX_FOLDERS[active])
+            except Exception as e:
+                print(f"Failed to load cubemap texture {SKYBOX_FOLDERS[active]}: {e}")
+                self.failed.add(active)
+        if active in self.decoded:
+            self.resident[active] = self.setup_cubemap(SKYBOX_FOLDERS[active], self.decoded.pop(active))
 
-        
         self.vao = self._setup_mesh()
 
-    def setup_cubemap(self, folder):
-        """Setup cubemap textures from specified folder"""
-        texture = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, texture)
+    @property
+    def textures(self):
+        """GL textures of the resident cubemaps."""
+        return list(self.resident.values())
 
-        # Load and set up each face of the cubemap
-        faces = [
-            f"{folder}/posx.jpg",  # Right
-            f"{folder}/negx.jpg",  # Left
-            f"{folder}/posy.jpg",  # Top
-            f"{folder}/negy.jpg",  # Bottom
-            f"{folder}/posz.jpg",  # Front
-            f"{folder}/negz.jpg"   # Back
-        ]
-
-        for i, face in enumerate(faces):
+    def setup_cubemap(self, folder, faces=None):
+        """Setup cubemap textures from specified folder or already decoded faces"""
+        if faces is None:
             try:
-                image = Image.open(face)
-                img_data = np.array(image.convert("RGB"), dtype=np.uint8)
-                glTexImage2D(
-                    GL_TEXTURE_CUBE_MAP_POSITIVE_X + i,
-                    0, GL_RGB, image.width, image.height, 
-                    0, GL_RGB, GL_UNSIGNED_BYTE, img_data
-                )
+                faces = decode_cubemap(folder)
             except Exception as e:
-                print(f"Failed to load cubemap texture {face}: {e}")
+                print(f"Failed to load cubemap texture {folder}: {e}")
                 return None
 
+        texture = self._create_cubemap()
+        for i, img_data in enumerate(faces):
+            self._upload_face(texture, i, img_data)
+        return texture
+
+    def _create_cubemap(self):
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_CUBE_MAP, texture)
         glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
         glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
         glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
         glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
         glTexParameteri(GL_TEXTURE_CUBE_MAP, GL_TEXTURE_WRAP_R, GL_CLAMP_TO_EDGE)
+        return texture
+
+    def _upload_face(self, texture, face, img_data):
+        glBindTexture(GL_TEXTURE_CUBE_MAP, texture)
+        height, width = img_data.shape[:2]
+        glTexImage2D(
+            GL_TEXTURE_CUBE_MAP_POSITIVE_X + face,
+            0, GL_RGB, width, height,
+            0, GL_RGB, GL_UNSIGNED_BYTE, img_data
+        )
+
+    def request(self, index):
+        """Starts decoding a cubemap set in the background unless it is already available."""
+        if (index in self.resident or index in self.decoded or index in self._futures
+                or index in self.failed):
+            return
+        self._futures[index] = self._executor.submit(decode_cubemap, SKYBOX_FOLDERS[index])
+
+    def update(self):
+        """
+        Advances background loading. Main thread only; called from draw.
+
+        Collects finished decodes, uploads the next strip of the current set
+        if it is not resident yet, and prefetches the next set when idle.
+        """
+        for index, future in list(self._futures.items()):
+            if future.done():
+                del self._futures[index]
+                try:
+                    self.decoded[index] = future.result()
+                except Exception as e:
+                    print(f"Failed to load cubemap texture {SKYBOX_FOLDERS[index]}: {e}")
+                    self.failed.add(index)
 
-        self.textures.append(texture)
+        current = self.current_texture
+        if current not in self.resident and current in self.decoded:
+            if self._upload is None or self._upload[0] != current:
+                if self._upload is not None:
+                    glDeleteTextures(1, [self._upload[1]])
+                self._upload = (current, self._create_cubemap(), self.decoded[current], 0, 0)
+            self._continue_upload()
+
+        # Idle prefetch: decode (not upload) the remaining sets one at a time
+        if not self._futures and time.perf_counter() - self._last_request > PREFETCH_DELAY:
+            for index in range(len(SKYBOX_FOLDERS)):
+                if index not in self.resident and index not in self.decoded and index not in self.failed:
+                    self.request(index)
+                    break
+
+    def _continue_upload(self):
+        """Uploads the next UPLOAD_BYTES_PER_FRAME of the pending cubemap in row strips."""
+        index, texture, faces, face, row = self._upload
+        glBindTexture(GL_TEXTURE_CUBE_MAP, texture)
+        budget = UPLOAD_BYTES_PER_FRAME
+        while budget > 0 and face < len(faces):
+            img_data = faces[face]
+            height, width = img_data.shape[:2]
+            if row == 0:
+                glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + face, 0, GL_RGB, width, height,
+                             0, GL_RGB, GL_UNSIGNED_BYTE, None)
+            rows = min(height - row, max(1, budget // (width * 3)))
+            glTexSubImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X + face, 0, 0, row, width, rows,
+                            GL_RGB, GL_UNSIGNED_BYTE, np.ascontiguousarray(img_data[row:row + rows]))
+            budget -= rows * width * 3
+            row += rows
+            if row == height:
+                face, row = face + 1, 0
+
+        if face < len(faces):
+            self._upload = (index, texture, faces, face, row)
+        else:
+            # Resident sets drop their faces; one is decoded again if it is evicted and reselected
+            self._upload = None
+            self.decoded.pop(index, None)
+            self.resident[index] = texture
+            self._evict()
+
+    def _evict(self):
+        """Drops least recently shown cubemaps beyond max_resident."""
+        while len(self.resident) > self.max_resident:
+            index = next(i for i in self.resident if i != self.current_texture)
+            glDeleteTextures(1, [self.resident.pop(index)])
 
     def _setup_mesh(self):
         """Setup skybox cube vertices"""
@@ -116,6 +262,15 @@ class CSkyBox:
 
     def draw(self, view, projection):
         """Render the skybox"""
+        self.update()
+
+        # Show the requested set once uploaded, the most recently shown one until then
+        if self.current_texture in self.resident:
+            self.resident.move_to_end(self.current_texture)
+        if not self.resident:
+            return
+        texture = next(reversed(self.resident.values()))
+
         glDepthFunc(GL_LEQUAL)
         self.shader_program.use()
         
@@ -127,7 +282,7 @@ class CSkyBox:
         
         glBindVertexArray(self.vao)
         glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_CUBE_MAP, self.textures[self.current_texture])
+        glBindTexture(GL_TEXTURE_CUBE_MAP, texture)
         
         # Set the skybox uniform sampler
         glUniform1i(glGetUniformLocation(self.shader_program.program, "skybox"), 0)
@@ -136,6 +291,19 @@ class CSkyBox:
         glDepthFunc(GL_LESS)
 
     def change_texture(self, index):
-        """Change current skybox texture"""
-        if 0 <= index < len(self.textures):
-            self.current_texture = index
\ No newline at end of file
+        """Change current skybox texture; it appears once loaded"""
+        if 0 <= index < len(SKYBOX_FOLDERS) and index not in self.failed:
+            self.current_texture = index
+            self._last_request = time.perf_counter()
+            self.request(index)
+
+    def cleanup(self):
+        """Stops background decoding and frees the cubemap textures"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        textures = list(self.resident.values())
+        if self._upload is not None:
+            textures.append(self._upload[1])
+        if textures:
+            glDeleteTextures(len(textures), textures)
+        self.resident.clear()
+        self._upload = None
@@ -0,0 +1,140 @@
+import math
+
+
+class SpatialHash:
+    def __init__(self, cell_size=4.0):
+        """
+        Objects on the XZ plane, hashed into a uniform grid for radius queries.
+
+        Every object is a circle, stored in each grid cell its bounding
+        square overlaps (a dict of cell -> set of handles). Inserting, moving
+        and removing an object touch only those few cells, and a query only
+        the cells around it, so neither gets slower as objects are added
+        elsewhere in the world.
+
+        Args:
+            cell_size: Width of a grid cell; about the size of the largest
+                query radius works best
+        """
+        self.cell_size = cell_size
+        self._cells = {}
+        self._objects = {}  # handle -> [item, x, z, radius, cells]
+        self._next_handle = 0
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __iter__(self):
+        """Iterates over the stored items, in insertion order."""
+        return (entry[0] for entry in self._objects.values())
+
+    def __contains__(self, handle):
+        return handle in self._objects
+
+    def __getitem__(self, handle):
+        """Returns the item stored under a handle."""
+        return self._objects[handle][0]
+
+    def _cells_of(self, x, z, radius):
+        size = self.cell_size
+        i_min, i_max = math.floor((x - radius) / size), math.floor((x + radius) / size)
+        j_min, j_max = math.floor((z - radius) / size), math.floor((z + radius) / size)
+        if i_min == i_max and j_min == j_max:
+            return ((i_min, j_min),)
+        return tuple((i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1))
+
+    def insert(self, item, x, z, radius=0.0):
+        """
+        Adds an object.
+
+        Args:
+            item: Object to store, returned by queries
+            x: Center x coordinate
+            z: Center z coordinate
+            radius: Radius of the object's circle
+
+        Returns:
+            Handle for move() and remove()
+        """
+        handle = self._next_handle
+        self._next_handle += 1
+        cells = self._cells_of(x, z, radius)
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(handle)
+        self._objects[handle] = [item, x, z, radius, cells]
+        return handle
+
+    def move(self, handle, x, z):
+        """
+        Moves an object, e.g. an animated one, to a new center.
+
+        Args:
+            handle: Handle returned by insert()
+            x: New center x coordinate
+            z: New center z coordinate
+        """
+        entry = self._objects[handle]
+        cells = self._cells_of(x, z, entry[3])
+        if cells != entry[4]:
+            self._unlink(handle, entry[4])
+            for cell in cells:
+                self._cells.setdefault(cell, set()).add(handle)
+            entry[4] = cells
+        entry[1] = x
+        entry[2] = z
+
+    def remove(self, handle):
+        """
+        Removes an object; handles that were already removed are ignored.
+
+        Args:
+            handle: Handle returned by insert()
+
+        Returns:
+            The removed item, or None
+        """
+        entry = self._objects.pop(handle, None)
+        if entry is None:
+            return None
+        self._unlink(handle, entry[4])
+        return entry[0]
+
+    def _unlink(self, handle, cells):
+        for cell in cells:
+            members = self._cells[cell]
+            members.discard(handle)
+            if not members:
+                del self._cells[cell]
+
+    def query(self, x, z, radius):
+        """
+        Finds the objects whose circles overlap a circle.
+
+        Args:
+            x: Center x coordinate
+            z: Center z coordinate
+            radius: Radius of the query circle
+
+        Returns:
+            List of handles of the objects closer than radius plus their own radius
+        """
+        cells = self._cells_of(x, z, radius)
+        if len(cells) == 1:
+            candidates = self._cells.get(cells[0], ())
+        else:
+            candidates = set()
+            for cell in cells:
+                candidates.update(self._cells.get(cell, ()))
+
+        found = []
+        for handle in candidates:
+            _, object_x, object_z, object_radius, _ = self._objects[handle]
+            reach = radius + object_radius
+            if (object_x - x) ** 2 + (object_z - z) ** 2 < reach * reach:
+                found.append(handle)
+        return found
+
+    def clear(self):
+        """Removes all objects."""
+        self._cells.clear()
+        self._objects.clear()
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupTrace:
+    def __init__(self):
+        """
+        Records a timeline of named startup phases.
+
+        Phases nest and may run on any thread (asset workers included). The
+        timeline is written in the Chrome trace event format, so it can be
+        opened in chrome://tracing or Perfetto as well as read by scripts.
+        Recording costs two perf_counter calls per phase and is always on.
+        """
+        self.start = time.perf_counter()
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def now(self):
+        """Seconds since the trace started."""
+        return time.perf_counter() - self.start
+
+    @contextmanager
+    def phase(self, name, category="startup", **args):
+        """
+        Times the enclosed block.
+
+        Args:
+            name: Phase name shown in the timeline and summary
+            category: Group used by the summary (e.g. "import", "asset", "upload")
+            args: Extra values stored with the event
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        begin = time.perf_counter()
+        stack.append(name)
+        try:
+            yield
+        finally:
+            stack.pop()
+            self.record(name, category, begin, time.perf_counter(), depth=len(stack), **args)
+
+    def record(self, name, category, begin, end, depth=0, **args):
+        """
+        Adds a finished phase measured elsewhere.
+
+        Args:
+            name: Phase name
+            category: Summary group
+            begin: perf_counter value at the start
+            end: perf_counter value at the end
+            depth: Nesting level on its thread (0 for top-level phases)
+        """
+        event = {
+            'name': name,
+            'cat': category,
+            'start': begin - self.start,
+            'duration': end - begin,
+            'thread': threading.current_thread().name,
+            'depth': depth,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        """
+        Returns the phases sorted by duration, longest first.
+
+        Returns:
+            List of dictionaries with name, category, thread, start and duration in seconds
+        """
+        with self._lock:
+            return sorted(self.events, key=lambda event: event['duration'], reverse=True)
+
+    def to_chrome_trace(self):
+        """Returns the timeline as a Chrome trace event dictionary."""
+        with self._lock:
+            events = list(self.events)
+        threads = {}
+        trace_events = []
+        for event in events:
+            tid = threads.setdefault(event['thread'], len(threads))
+            trace_events.append({
+                'name': event['name'],
+                'cat': event['cat'],
+                'ph': 'X',
+                'ts': round(event['start'] * 1e6, 1),
+                'dur': round(event['duration'] * 1e6, 1),
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': event.get('args', {}),
+            })
+        for thread, tid in threads.items():
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                                 'tid': tid, 'args': {'name': thread}})
+        return {
+            'traceEvents': trace_events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'total_seconds': self.now()},
+        }
+
+    def write_json(self, path):
+        """Writes the timeline to a JSON file."""
+        with open(path, 'w') as file:
+            json.dump(self.to_chrome_trace(), file, indent=1)
+
+    def print_summary(self, limit=25):
+        """
+        Prints the longest phases and the time spent per category.
+
+        Args:
+            limit: Number of phases to list
+        """
+        total = self.now()
+        events = self.summary()
+
+        # Category totals count top-level phases only, so nested phases are not counted twice
+        categories = {}
+        for event in events:
+            if event['depth'] == 0:
+                key = (event['cat'], event['thread'] == 'MainThread')
+                categories[key] = categories.get(key, 0.0) + event['duration']
+
+        print(f"Startup took {total * 1000:.1f} ms")
+        print(f"{'category':<24}{'thread':<10}{'ms':>10}{'%':>7}")
+        for (category, main_thread), duration in sorted(categories.items(), key=lambda item: -item[1]):
+            print(f"{category:<24}{'main' if main_thread else 'workers':<10}"
+                  f"{duration * 1000:>10.1f}{duration / total * 100:>7.1f}")
+
+        print(f"\n{'phase':<48}{'thread':<18}{'start ms':>10}{'ms':>10}")
+        for event in events[:limit]:
+            name = "  " * event['depth'] + event['name']
+            print(f"{name[:47]:<48}{event['thread'][:17]:<18}"
+                  f"{event['start'] * 1000:>10.1f}{event['duration'] * 1000:>10.1f}")
+
+
+# Trace shared by all modules; its clock starts when this module is first imported
+trace = StartupTrace()
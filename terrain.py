@@ -0,0 +1,576 @@
+import sys
+import math
+import argparse
+import numpy as np
+
+from asset_cache import mesh_cache, load_render_mesh
+
+# Distance between heightfield samples in world units
+HEIGHTFIELD_SPACING = 0.25
+
+# The error bound is measured on a grid this many times finer than the heightfield
+ERROR_OVERSAMPLE = 4
+
+# Height reported where no terrain triangle covers the query point
+DEFAULT_HEIGHT = -0.8
+
+# Triangles whose normal has a smaller vertical component are walls and are not rasterized
+MIN_NORMAL_Y = 0.001
+
+# Candidate samples tested per rasterization batch, bounds temporary memory
+RASTER_BATCH_SAMPLES = 1 << 22
+
+# Candidate point-triangle pairs tested per batch by TerrainIndex.heights_at
+QUERY_BATCH_CANDIDATES = 1 << 20
+
+# OBJ files used as terrain; their heightfields are built when the cache is warmed
+TERRAIN_MODELS = ("models/ground-large.obj",)
+
+
+def triangle_positions(obj_path):
+    """
+    Loads the most detailed triangles of a mesh.
+
+    Args:
+        obj_path: Path to the .obj file
+
+    Returns:
+        (N, 3) float32 positions, three rows per triangle, or None
+    """
+    vertices, indices, ranges = load_render_mesh(obj_path)
+    if vertices is None:
+        return None
+    if indices is None:
+        return np.asarray(vertices[:, 0:3])
+    first_index, index_count, _, _ = (int(value) for value in ranges[0])
+    return np.asarray(vertices[:, 0:3])[indices[first_index:first_index + index_count]]
+
+
+def rasterize(positions, origin, spacing, shape):
+    """
+    Samples the top surface of a triangle soup on a regular XZ grid.
+
+    A sample takes the plane height of every triangle containing it (edges
+    included) and keeps the highest one, the same rule the per-triangle
+    height scan uses.
+
+    Args:
+        positions: (N, 3) triangle corner positions, three rows per triangle
+        origin: (x, z) world position of sample [0, 0]
+        spacing: Distance between samples
+        shape: (rows along z, columns along x)
+
+    Returns:
+        (rows, columns) float32 heights, -inf where no triangle covers a sample
+    """
+    rows, columns = shape
+    heights = np.full(rows * columns, -np.inf, dtype=np.float32)
+    corners = np.asarray(positions, dtype=np.float64).reshape(-1, 3, 3)
+
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.maximum(np.linalg.norm(normals, axis=1), 1e-20)
+    walkable = np.abs(normals[:, 1]) / lengths >= MIN_NORMAL_Y
+    corners, normals = corners[walkable], normals[walkable]
+    offsets = np.einsum('ij,ij->i', normals, corners[:, 0])
+
+    # Sample window of each triangle's bounding box
+    x, z = corners[:, :, 0], corners[:, :, 2]
+    first_column = np.maximum(np.ceil((x.min(axis=1) - origin[0]) / spacing), 0).astype(np.int64)
+    last_column = np.minimum(np.floor((x.max(axis=1) - origin[0]) / spacing), columns - 1).astype(np.int64)
+    first_row = np.maximum(np.ceil((z.min(axis=1) - origin[1]) / spacing), 0).astype(np.int64)
+    last_row = np.minimum(np.floor((z.max(axis=1) - origin[1]) / spacing), rows - 1).astype(np.int64)
+    widths = np.maximum(last_column - first_column + 1, 0)
+    counts = widths * np.maximum(last_row - first_row + 1, 0)
+
+    start = 0
+    while start < len(counts):
+        end = start + max(1, int(np.searchsorted(np.cumsum(counts[start:]), RASTER_BATCH_SAMPLES)))
+        batch_counts = counts[start:end]
+        triangle = np.repeat(np.arange(start, end), batch_counts)
+        local = np.arange(len(triangle)) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+        column = first_column[triangle] + local % widths[triangle]
+        row = first_row[triangle] + local // widths[triangle]
+        px = origin[0] + column * spacing
+        pz = origin[1] + row * spacing
+
+        tx, tz = x[triangle], z[triangle]
+        d1 = (px - tx[:, 1]) * (tz[:, 0] - tz[:, 1]) - (tx[:, 0] - tx[:, 1]) * (pz - tz[:, 1])
+        d2 = (px - tx[:, 2]) * (tz[:, 1] - tz[:, 2]) - (tx[:, 1] - tx[:, 2]) * (pz - tz[:, 2])
+        d3 = (px - tx[:, 0]) * (tz[:, 2] - tz[:, 0]) - (tx[:, 2] - tx[:, 0]) * (pz - tz[:, 0])
+        inside = ~(((d1 < 0) | (d2 < 0) | (d3 < 0)) & ((d1 > 0) | (d2 > 0) | (d3 > 0)))
+
+        n = normals[triangle[inside]]
+        sample_heights = (offsets[triangle[inside]] - n[:, 0] * px[inside] - n[:, 2] * pz[inside]) / n[:, 1]
+        np.maximum.at(heights, row[inside] * columns + column[inside], sample_heights.astype(np.float32))
+        start = end
+
+    return heights.reshape(rows, columns)
+
+
+def surface_grids(heights, spacing):
+    """
+    Derives per-sample surface normals and slope angles from a height grid.
+
+    Args:
+        heights: (rows, columns) heights; row index follows z, column index x
+        spacing: Distance between samples
+
+    Returns:
+        tuple: (normals (rows, columns, 3) float32 unit vectors pointing up,
+        slopes (rows, columns) float32 angles from horizontal in degrees)
+    """
+    heights = np.asarray(heights, dtype=np.float32)
+    if min(heights.shape) < 2:
+        normals = np.zeros(heights.shape + (3,), dtype=np.float32)
+        normals[..., 1] = 1.0
+        return normals, np.zeros(heights.shape, dtype=np.float32)
+
+    dz, dx = np.gradient(heights, spacing)
+    normals = np.stack((-dx, np.ones_like(dx), -dz), axis=-1)
+    normals /= np.linalg.norm(normals, axis=-1, keepdims=True)
+    slopes = np.degrees(np.arctan(np.hypot(dx, dz)))
+    return normals.astype(np.float32), slopes.astype(np.float32)
+
+
+class Heightfield:
+    def __init__(self, heights, origin, spacing, max_error=0.0, default=DEFAULT_HEIGHT, covered=None):
+        """
+        Terrain height sampled on a regular XZ grid.
+
+        Queries are bilinear lookups of the four surrounding samples, so they
+        cost the same for any terrain size. Between samples the result
+        differs from the exact mesh height by at most max_error (measured when
+        the grid is built); at the samples themselves it is exact.
+
+        Surface normals and slope angles are derived per sample from central
+        differences when the grid is created, and walkability masks per
+        slope limit on first use, so slope checks are single lookups.
+
+        Args:
+            heights: (rows, columns) heights; row index follows z, column index x
+            origin: (x, z) world position of sample [0, 0]
+            spacing: Distance between samples
+            max_error: Largest difference from the mesh height seen when building
+            default: Height returned outside the terrain
+            covered: (rows, columns) bool mask of samples lying on a mesh
+                triangle (default: all); the others hold the default height
+        """
+        self.heights = np.asarray(heights, dtype=np.float32)
+        self.covered = np.ones(self.heights.shape, dtype=bool) if covered is None else np.asarray(covered, dtype=bool)
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.spacing = float(spacing)
+        self.max_error = float(max_error)
+        self.default = default
+        self.rows, self.columns = self.heights.shape
+        self.normals, self.slopes = surface_grids(self.heights, self.spacing)
+        self._walkable = {}
+
+    @classmethod
+    def from_triangles(cls, positions, spacing=HEIGHTFIELD_SPACING):
+        """
+        Rasterizes a terrain mesh into a heightfield.
+
+        Args:
+            positions: (N, 3) triangle corner positions, three rows per triangle
+            spacing: Distance between samples
+
+        Returns:
+            Heightfield covering the mesh's XZ bounding box
+        """
+        positions = np.asarray(positions, dtype=np.float32)
+        low = np.floor(positions[:, [0, 2]].min(axis=0) / spacing) * spacing
+        high = positions[:, [0, 2]].max(axis=0)
+        columns, rows = (np.ceil((high - low) / spacing).astype(np.int64) + 1).tolist()
+
+        heights = rasterize(positions, low, spacing, (rows, columns))
+        covered = np.isfinite(heights)
+        heights[~covered] = DEFAULT_HEIGHT
+        field = cls(heights, low, spacing, covered=covered)
+
+        # Compare with the exact surface on a finer grid; only cells whose four
+        # corners lie on the terrain count, the rest are edge cells
+        fine_spacing = spacing / ERROR_OVERSAMPLE
+        fine_shape = ((rows - 1) * ERROR_OVERSAMPLE + 1, (columns - 1) * ERROR_OVERSAMPLE + 1)
+        exact = rasterize(positions, low, fine_spacing, fine_shape)
+        cell_covered = covered[:-1, :-1] & covered[1:, :-1] & covered[:-1, 1:] & covered[1:, 1:]
+        fx = low[0] + np.arange(fine_shape[1]) * fine_spacing
+        error = 0.0
+        for fine_row in range(0, fine_shape[0], 256):
+            block = exact[fine_row:fine_row + 256]
+            fz = low[1] + np.arange(fine_row, fine_row + len(block)) * fine_spacing
+            gx, gz = np.meshgrid(fx, fz)
+            row = np.minimum(np.arange(fine_row, fine_row + len(block)) // ERROR_OVERSAMPLE, rows - 2)
+            column = np.minimum(np.arange(fine_shape[1]) // ERROR_OVERSAMPLE, columns - 2)
+            valid = np.isfinite(block) & cell_covered[row][:, column]
+            if valid.any():
+                error = max(error, float(np.abs(field.heights_at(np.stack((gx[valid], gz[valid]), axis=1)) - block[valid]).max()))
+        field.max_error = error
+        return field
+
+    @property
+    def bounds(self):
+        """(x_min, x_max, z_min, z_max) of the sampled area."""
+        x0, z0 = self.origin
+        return (x0, x0 + (self.columns - 1) * self.spacing, z0, z0 + (self.rows - 1) * self.spacing)
+
+    def height_at(self, x, z):
+        """
+        Returns the terrain height at a world XZ position.
+
+        Args:
+            x: World x coordinate
+            z: World z coordinate
+
+        Returns:
+            Height as a float, or the default height outside the terrain
+        """
+        fx = (x - self.origin[0]) / self.spacing
+        fz = (z - self.origin[1]) / self.spacing
+        if not (0.0 <= fx <= self.columns - 1 and 0.0 <= fz <= self.rows - 1):
+            return self.default
+        column = min(int(fx), self.columns - 2)
+        row = min(int(fz), self.rows - 2)
+        tx = fx - column
+        tz = fz - row
+        h00, h01 = self.heights[row, column:column + 2].tolist()
+        h10, h11 = self.heights[row + 1, column:column + 2].tolist()
+        return (h00 * (1.0 - tx) + h01 * tx) * (1.0 - tz) + (h10 * (1.0 - tx) + h11 * tx) * tz
+
+    def heights_at(self, points):
+        """
+        Vectorized height_at.
+
+        Args:
+            points: (N, 2) array of world XZ coordinates
+
+        Returns:
+            (N,) float64 heights
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        fx = (points[:, 0] - self.origin[0]) / self.spacing
+        fz = (points[:, 1] - self.origin[1]) / self.spacing
+        inside = (fx >= 0.0) & (fx <= self.columns - 1) & (fz >= 0.0) & (fz <= self.rows - 1)
+        column = np.clip(fx.astype(np.int64), 0, self.columns - 2)
+        row = np.clip(fz.astype(np.int64), 0, self.rows - 2)
+        tx = np.clip(fx - column, 0.0, 1.0)
+        tz = np.clip(fz - row, 0.0, 1.0)
+        h = self.heights
+        result = ((h[row, column] * (1.0 - tx) + h[row, column + 1] * tx) * (1.0 - tz) +
+                  (h[row + 1, column] * (1.0 - tx) + h[row + 1, column + 1] * tx) * tz)
+        return np.where(inside, result, self.default)
+
+    def _nearest_sample(self, x, z):
+        """(row, column) of the sample closest to (x, z), or None outside the grid."""
+        column = round((x - self.origin[0]) / self.spacing)
+        row = round((z - self.origin[1]) / self.spacing)
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return row, column
+        return None
+
+    def slope_at(self, x, z):
+        """Slope angle in degrees at the sample nearest to (x, z); 0 outside the terrain."""
+        sample = self._nearest_sample(x, z)
+        return float(self.slopes[sample]) if sample is not None else 0.0
+
+    def normal_at(self, x, z):
+        """Upward unit normal at the sample nearest to (x, z) as a tuple; (0, 1, 0) outside the terrain."""
+        sample = self._nearest_sample(x, z)
+        return tuple(self.normals[sample].tolist()) if sample is not None else (0.0, 1.0, 0.0)
+
+    def walkable_mask(self, max_slope_angle):
+        """
+        Returns the walkability grid for a slope limit, building it on first use.
+
+        Args:
+            max_slope_angle: Steepest walkable slope in degrees
+
+        Returns:
+            (rows, columns) bool array, True where the slope is at most max_slope_angle
+        """
+        mask = self._walkable.get(max_slope_angle)
+        if mask is None:
+            mask = self._walkable[max_slope_angle] = self.slopes <= max_slope_angle
+        return mask
+
+    def is_walkable(self, x, z, max_slope_angle):
+        """True if the sample nearest to (x, z) is no steeper than max_slope_angle (always True off the terrain)."""
+        sample = self._nearest_sample(x, z)
+        return sample is None or bool(self.walkable_mask(max_slope_angle)[sample])
+
+    def sample_grid(self, grid, points, default=0.0):
+        """
+        Vectorized nearest-sample lookup into one of the per-sample grids.
+
+        Args:
+            grid: Array with the heightfield's (rows, columns) leading shape,
+                e.g. slopes, normals or a walkability mask
+            points: (N, 2) array of world XZ coordinates
+            default: Value for points outside the terrain
+
+        Returns:
+            (N, ...) array of grid values
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        column = np.rint((points[:, 0] - self.origin[0]) / self.spacing).astype(np.int64)
+        row = np.rint((points[:, 1] - self.origin[1]) / self.spacing).astype(np.int64)
+        inside = (column >= 0) & (column < self.columns) & (row >= 0) & (row < self.rows)
+        values = grid[np.clip(row, 0, self.rows - 1), np.clip(column, 0, self.columns - 1)]
+        inside = inside.reshape((-1,) + (1,) * (values.ndim - 1))
+        return np.where(inside, values, default)
+
+
+class TerrainIndex:
+    def __init__(self, positions, cell_size=None, default=DEFAULT_HEIGHT):
+        """
+        Exact terrain height queries through a uniform XZ grid of triangle buckets.
+
+        Every triangle is listed in each grid cell its XZ bounding box
+        overlaps, so a query only tests the few triangles of one cell. The
+        result is the same as testing every triangle: the highest plane
+        height among the triangles containing the point (edges included),
+        with walls (|normal.y| < MIN_NORMAL_Y) reporting their first corner's
+        height.
+
+        Args:
+            positions: (N, 3) triangle corner positions, three rows per triangle
+            cell_size: Grid cell size (default: the mean triangle extent, which
+                keeps buckets small without listing triangles in many cells)
+            default: Height returned where no triangle contains the point
+        """
+        corners = np.asarray(positions, dtype=np.float64).reshape(-1, 3, 3)
+        self.default = default
+        self.triangle_count = len(corners)
+
+        x, z = corners[:, :, 0], corners[:, :, 2]
+        low = np.array([x.min(), z.min()]) if len(corners) else np.zeros(2)
+        high = np.array([x.max(), z.max()]) if len(corners) else np.ones(2)
+        if cell_size is None:
+            extent = np.concatenate((x.max(axis=1) - x.min(axis=1), z.max(axis=1) - z.min(axis=1)))
+            cell_size = float(extent.mean()) if len(corners) else 1.0
+        self.cell_size = max(float(cell_size), 1e-6)
+        self.origin = (float(low[0]), float(low[1]))
+        self.columns, self.rows = (np.floor((high - low) / self.cell_size).astype(np.int64) + 1).tolist()
+
+        # Height plane h = h0 + hx * x + hz * z per triangle; walls keep their first corner's height
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+        wall = np.abs(normals[:, 1]) < MIN_NORMAL_Y
+        ny = np.where(wall, 1.0, normals[:, 1])
+        hx = np.where(wall, 0.0, -normals[:, 0] / ny)
+        hz = np.where(wall, 0.0, -normals[:, 2] / ny)
+        h0 = np.where(wall, corners[:, 0, 1], np.einsum('ij,ij->i', normals, corners[:, 0]) / ny)
+        self.planes = np.stack((h0, hx, hz), axis=1)
+        self.corners_xz = np.stack((x, z), axis=2)
+        self.normals = normals * np.where(normals[:, 1] < 0.0, -1.0, 1.0)[:, None]
+        self.slopes = np.degrees(np.arccos(np.clip(self.normals[:, 1], -1.0, 1.0)))
+
+        # Bucket triangles by the cells their bounding boxes overlap (CSR layout)
+        first_column = np.floor((x.min(axis=1) - low[0]) / self.cell_size).astype(np.int64)
+        last_column = np.floor((x.max(axis=1) - low[0]) / self.cell_size).astype(np.int64)
+        first_row = np.floor((z.min(axis=1) - low[1]) / self.cell_size).astype(np.int64)
+        last_row = np.floor((z.max(axis=1) - low[1]) / self.cell_size).astype(np.int64)
+        widths = last_column - first_column + 1
+        counts = widths * (last_row - first_row + 1)
+        triangle = np.repeat(np.arange(len(corners)), counts)
+        local = np.arange(len(triangle)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = ((first_row[triangle] + local // widths[triangle]) * self.columns +
+                 first_column[triangle] + local % widths[triangle])
+        order = np.argsort(cells, kind='stable')
+        self.cell_triangles = triangle[order]
+        self.cell_starts = np.searchsorted(cells[order], np.arange(self.rows * self.columns + 1))
+
+        # Python copies for the scalar query path, which is dominated by per-element overhead
+        self._cell_starts = self.cell_starts.tolist()
+        self._cell_triangles = self.cell_triangles.tolist()
+        self._triangles = np.concatenate((self.corners_xz.reshape(-1, 6), self.planes), axis=1).tolist()
+        self._slopes = self.slopes.tolist()
+
+    @classmethod
+    def from_model(cls, model, cell_size=None):
+        """Builds the index from a Model's LOD 0 triangles."""
+        return cls(model.positions, cell_size)
+
+    def triangles_near(self, x, z):
+        """
+        Returns the indices of the triangles bucketed in the cell containing (x, z).
+
+        Args:
+            x: World x coordinate
+            z: World z coordinate
+
+        Returns:
+            List of triangle indices, empty outside the grid
+        """
+        column = math.floor((x - self.origin[0]) / self.cell_size)
+        row = math.floor((z - self.origin[1]) / self.cell_size)
+        if not (0 <= column < self.columns and 0 <= row < self.rows):
+            return []
+        cell = row * self.columns + column
+        return self._cell_triangles[self._cell_starts[cell]:self._cell_starts[cell + 1]]
+
+    def _top_triangle(self, x, z):
+        """(height, triangle) of the highest triangle containing (x, z), or (None, -1)."""
+        best, best_triangle = None, -1
+        for triangle in self.triangles_near(x, z):
+            x1, z1, x2, z2, x3, z3, h0, hx, hz = self._triangles[triangle]
+            d1 = (x - x2) * (z1 - z2) - (x1 - x2) * (z - z2)
+            d2 = (x - x3) * (z2 - z3) - (x2 - x3) * (z - z3)
+            d3 = (x - x1) * (z3 - z1) - (x3 - x1) * (z - z1)
+            if (d1 < 0 or d2 < 0 or d3 < 0) and (d1 > 0 or d2 > 0 or d3 > 0):
+                continue
+            height = h0 + hx * x + hz * z
+            if best is None or height > best:
+                best, best_triangle = height, triangle
+        return best, best_triangle
+
+    def height_at(self, x, z):
+        """
+        Returns the exact terrain height at a world XZ position.
+
+        Args:
+            x: World x coordinate
+            z: World z coordinate
+
+        Returns:
+            Height as a float, or the default height where no triangle contains the point
+        """
+        best, _ = self._top_triangle(x, z)
+        return self.default if best is None else best
+
+    def slope_at(self, x, z):
+        """Slope angle in degrees of the triangle under (x, z); 0 off the terrain."""
+        _, triangle = self._top_triangle(x, z)
+        return self._slopes[triangle] if triangle >= 0 else 0.0
+
+    def normal_at(self, x, z):
+        """Upward unit normal of the triangle under (x, z) as a tuple; (0, 1, 0) off the terrain."""
+        _, triangle = self._top_triangle(x, z)
+        return tuple(self.normals[triangle].tolist()) if triangle >= 0 else (0.0, 1.0, 0.0)
+
+    def is_walkable(self, x, z, max_slope_angle):
+        """True if the triangle under (x, z) is no steeper than max_slope_angle (always True off the terrain)."""
+        return self.slope_at(x, z) <= max_slope_angle
+
+    def heights_at(self, points, normals=False, slopes=False):
+        """
+        Vectorized height_at for many points at once.
+
+        Each point is tested against the triangles of its cell in one NumPy
+        pass, so placing thousands of objects costs milliseconds.
+
+        Args:
+            points: (N, 2) array of world XZ coordinates
+            normals: Also return the upward unit normal of the triangle each height comes from
+            slopes: Also return the slope angle in degrees (0 = flat)
+
+        Returns:
+            (N,) float64 heights, or a tuple (heights, normals (N, 3), slopes (N,))
+            with only the requested extras. Points off the terrain get the
+            default height, an up normal and zero slope.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        heights = np.full(len(points), float(self.default))
+        winners = np.full(len(points), -1, dtype=np.int64)
+
+        column = np.floor((points[:, 0] - self.origin[0]) / self.cell_size).astype(np.int64)
+        row = np.floor((points[:, 1] - self.origin[1]) / self.cell_size).astype(np.int64)
+        inside = (column >= 0) & (column < self.columns) & (row >= 0) & (row < self.rows)
+        cells = np.where(inside, row * self.columns + column, 0)
+        starts = self.cell_starts[cells]
+        counts = np.where(inside, self.cell_starts[cells + 1] - starts, 0)
+
+        start = 0
+        while start < len(points):
+            end = start + max(1, int(np.searchsorted(np.cumsum(counts[start:]), QUERY_BATCH_CANDIDATES)))
+            batch_counts = counts[start:end]
+            point = np.repeat(np.arange(start, end), batch_counts)
+            local = np.arange(len(point)) - np.repeat(np.cumsum(batch_counts) - batch_counts, batch_counts)
+            triangle = self.cell_triangles[starts[point] + local]
+
+            px, pz = points[point, 0], points[point, 1]
+            tx, tz = self.corners_xz[triangle, :, 0], self.corners_xz[triangle, :, 1]
+            d1 = (px - tx[:, 1]) * (tz[:, 0] - tz[:, 1]) - (tx[:, 0] - tx[:, 1]) * (pz - tz[:, 1])
+            d2 = (px - tx[:, 2]) * (tz[:, 1] - tz[:, 2]) - (tx[:, 1] - tx[:, 2]) * (pz - tz[:, 2])
+            d3 = (px - tx[:, 0]) * (tz[:, 2] - tz[:, 0]) - (tx[:, 2] - tx[:, 0]) * (pz - tz[:, 0])
+            hit = ~(((d1 < 0) | (d2 < 0) | (d3 < 0)) & ((d1 > 0) | (d2 > 0) | (d3 > 0)))
+            point, triangle, px, pz = point[hit], triangle[hit], px[hit], pz[hit]
+            plane = self.planes[triangle]
+            candidate = plane[:, 0] + plane[:, 1] * px + plane[:, 2] * pz
+
+            # Highest candidate per point: sort by (point, height) and keep each group's last entry
+            order = np.lexsort((candidate, point))
+            last = order[np.r_[point[order][1:] != point[order][:-1], True]] if len(order) else order
+            heights[point[last]] = candidate[last]
+            winners[point[last]] = triangle[last]
+            start = end
+
+        if not (normals or slopes):
+            return heights
+        up = np.array([0.0, 1.0, 0.0])
+        result_normals = np.where((winners >= 0)[:, None], self.normals[np.maximum(winners, 0)], up)
+        result = (heights,)
+        if normals:
+            result += (result_normals,)
+        if slopes:
+            result += (np.where(winners >= 0, self.slopes[np.maximum(winners, 0)], 0.0),)
+        return result
+
+
+def load_heightfield(obj_path, spacing=HEIGHTFIELD_SPACING):
+    """
+    Loads the heightfield of a terrain mesh through the mesh cache.
+
+    Args:
+        obj_path: Path to the terrain .obj file
+        spacing: Distance between samples; a cached grid with another spacing is rebuilt
+
+    Returns:
+        Heightfield, or None if the mesh could not be loaded
+    """
+    tags = ("heightfield", "heightfield_info", "heightfield_coverage")
+
+    def build():
+        positions = triangle_positions(obj_path)
+        if positions is None or len(positions) == 0:
+            return None
+        field = Heightfield.from_triangles(positions, spacing)
+        info = np.array([field.origin[0], field.origin[1], field.spacing, field.max_error])
+        return field.heights, info, field.covered.astype(np.uint8)
+
+    arrays = mesh_cache.get_or_build_many(obj_path, tags, build)
+    if arrays is not None and not math.isclose(float(arrays[1][2]), spacing):
+        arrays = build()
+        if arrays is not None:
+            try:
+                for tag, array in zip(tags, arrays):
+                    mesh_cache.store(obj_path, tag, array)
+            except OSError as e:
+                print(f"Could not write cache entry for '{obj_path}': {e}")
+    if arrays is None:
+        return None
+
+    heights, info, covered = arrays
+    origin_x, origin_z, spacing, max_error = (float(value) for value in info)
+    return Heightfield(heights, (origin_x, origin_z), spacing, max_error, covered=covered != 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and report terrain heightfields.")
+    parser.add_argument("paths", nargs="*", default=list(TERRAIN_MODELS), help="terrain OBJ files")
+    parser.add_argument("--spacing", type=float, default=HEIGHTFIELD_SPACING, help="sample spacing")
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        field = load_heightfield(path, args.spacing)
+        if field is None:
+            print(f"{path}: could not be loaded")
+            continue
+        x_min, x_max, z_min, z_max = field.bounds
+        print(f"{path}: {field.columns}x{field.rows} samples, spacing {field.spacing}, "
+              f"x {x_min:.1f}..{x_max:.1f}, z {z_min:.1f}..{z_max:.1f}, "
+              f"{field.heights.nbytes / 2**20:.1f} MiB, max error {field.max_error:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
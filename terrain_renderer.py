@@ -0,0 +1,464 @@
+import math
+import glm
+import numpy as np
+
+from asset_cache import mesh_cache, load_render_mesh
+from asset_registry import MeshHandle
+from objloader import VERTEX_COMPONENTS
+from mesh_optimizer import build_index_buffer
+from mesh_simplify import simplify, pack_lods, LOD_RATIOS
+
+# Heightfield samples per render-grid step at LOD 0 (2 x 0.25 = 0.5 world units)
+RENDER_STRIDE = 2
+
+# Render-grid quads along each side of a chunk at LOD 0 (16 world units)
+CHUNK_QUADS = 32
+
+# LOD k skips every 2^k render-grid vertices
+LOD_COUNT = 5
+
+# Distance from the camera to a chunk's bounding box at which LOD 1 starts;
+# every doubling of the distance drops one more level
+LOD_DISTANCE = 24.0
+
+# How far skirts reach below the lowest point of their chunk
+SKIRT_MARGIN = 0.5
+
+# Side of the square chunks, in world units, that a terrain mesh is cut into
+MESH_CHUNK_SIZE = 32.0
+
+
+def frustum_planes(matrix):
+    """
+    Extracts the six clip planes of a view-projection matrix (Gribb and Hartmann).
+
+    Args:
+        matrix: glm.mat4 mapping the space of the tested boxes to clip space
+
+    Returns:
+        (6, 4) float64 array of normalized planes (a, b, c, d); a point p is
+        inside when a*x + b*y + c*z + d >= 0 for every plane
+    """
+    m = np.array(matrix, dtype=np.float64)
+    planes = np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def boxes_in_frustum(planes, low, high):
+    """
+    Conservative visibility test of axis-aligned boxes against a frustum.
+
+    Args:
+        planes: (6, 4) planes from frustum_planes
+        low: (N, 3) box minima
+        high: (N, 3) box maxima
+
+    Returns:
+        (N,) bool array, False only for boxes entirely outside a plane
+    """
+    center = (low + high) / 2
+    extent = (high - low) / 2
+    distance = center @ planes[:, :3].T + planes[:, 3]
+    radius = extent @ np.abs(planes[:, :3]).T
+    return np.all(distance + radius >= 0.0, axis=1)
+
+
+def fit_planar_uv(vertex_data):
+    """
+    Fits texture coordinates of a terrain mesh as a linear function of x and z.
+
+    Args:
+        vertex_data: (M, 8) interleaved vertices of the terrain mesh
+
+    Returns:
+        (2, 3) array so that (u, v) = uv_transform @ (x, z, 1)
+    """
+    vertex_data = np.asarray(vertex_data, dtype=np.float64)
+    design = np.stack((vertex_data[:, 0], vertex_data[:, 2], np.ones(len(vertex_data))), axis=1)
+    solution, _, _, _ = np.linalg.lstsq(design, vertex_data[:, 6:8], rcond=None)
+    return solution.T
+
+
+def _lod_samples(count, step):
+    """Render-grid positions used by a LOD along one chunk side: every step-th one plus the last."""
+    samples = np.arange(0, count - 1, step)
+    return np.append(samples, count - 1)
+
+
+def _perimeter(rows, columns):
+    """Local vertex ids around a rows x columns grid, in order, starting at the origin corner."""
+    ids = np.arange(rows * columns).reshape(rows, columns)
+    return np.concatenate((ids[0, :], ids[1:, -1], ids[-1, -2::-1], ids[-2:0:-1, 0]))
+
+
+def grid_vertices(heights, normals, origin, spacing, uv_transform=None):
+    """
+    Interleaved render vertices of a regular height grid.
+
+    Args:
+        heights: (rows, columns) heights
+        normals: (rows, columns, 3) unit normals
+        origin: (x, z) of the first sample
+        spacing: World units between samples
+        uv_transform: (2, 3) planar texture mapping, see fit_planar_uv
+            (default: one texture repeat per world unit)
+
+    Returns:
+        (rows, columns, 8) float32 array
+    """
+    if uv_transform is None:
+        uv_transform = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    rows, columns = heights.shape
+    x = origin[0] + np.arange(columns) * spacing
+    z = origin[1] + np.arange(rows) * spacing
+    gx, gz = np.meshgrid(x, z)
+
+    vertices = np.empty((rows, columns, VERTEX_COMPONENTS), dtype=np.float32)
+    vertices[..., 0] = gx
+    vertices[..., 1] = heights
+    vertices[..., 2] = gz
+    vertices[..., 3:6] = normals
+    vertices[..., 6] = uv_transform[0, 0] * gx + uv_transform[0, 1] * gz + uv_transform[0, 2]
+    vertices[..., 7] = uv_transform[1, 0] * gx + uv_transform[1, 1] * gz + uv_transform[1, 2]
+    return vertices
+
+
+def build_chunk(vertices, covered, interior, lod_count=LOD_COUNT):
+    """
+    Builds the vertex and index buffers of one chunk.
+
+    Pure NumPy, so chunks can be built on a worker thread and uploaded later.
+
+    Args:
+        vertices: (rows, columns, 8) render-grid vertices of the chunk
+        covered: (rows, columns) bool mask of vertices on the terrain
+        interior: Whether the top, right, bottom and left borders touch another chunk
+        lod_count: Number of LODs to build
+
+    Returns:
+        tuple: (vertices, indices, LOD ranges) for MeshHandle, or None if
+        the chunk has no triangles
+    """
+    rows, columns = covered.shape
+    ids = np.arange(rows * columns).reshape(rows, columns)
+    flat_covered = covered.reshape(-1)
+    top = vertices.reshape(-1, VERTEX_COMPONENTS)
+
+    # One skirt vertex below every border vertex, shared by all LODs
+    perimeter = _perimeter(rows, columns)
+    skirt = top[perimeter].copy()
+    skirt_y = top[flat_covered, 1].min() - SKIRT_MARGIN if flat_covered.any() else 0.0
+    skirt[:, 1] = skirt_y
+    skirt_of = np.full(rows * columns, -1, dtype=np.int64)
+    skirt_of[perimeter] = len(top) + np.arange(len(perimeter))
+
+    lods = []
+    for lod in range(lod_count):
+        step = 1 << lod
+        if lod > 0 and step >= max(rows, columns):
+            break
+        r = _lod_samples(rows, step)
+        c = _lod_samples(columns, step)
+        v00 = ids[np.ix_(r[:-1], c[:-1])].reshape(-1)
+        v10 = ids[np.ix_(r[1:], c[:-1])].reshape(-1)
+        v01 = ids[np.ix_(r[:-1], c[1:])].reshape(-1)
+        v11 = ids[np.ix_(r[1:], c[1:])].reshape(-1)
+        keep = flat_covered[v00] & flat_covered[v10] & flat_covered[v01] & flat_covered[v11]
+        triangles = [np.stack((v00, v10, v01), axis=1)[keep], np.stack((v01, v10, v11), axis=1)[keep]]
+
+        # Skirt quads under consecutive border vertices of this LOD, walking
+        # the top, right, bottom and left sides in turn
+        loop = np.concatenate((ids[0, c], ids[r[1:], -1], ids[-1, c[-2::-1]], ids[r[-2::-1], 0]))
+        a, b = loop[:-1], loop[1:]
+        side = np.repeat(np.arange(4), [len(c) - 1, len(r) - 1, len(c) - 1, len(r) - 1])
+        edge = flat_covered[a] & flat_covered[b] & np.array(interior)[side]
+        a, b = a[edge], b[edge]
+        triangles.append(np.stack((a, skirt_of[a], b), axis=1))
+        triangles.append(np.stack((b, skirt_of[a], skirt_of[b]), axis=1))
+
+        indices = np.concatenate(triangles).reshape(-1).astype(np.uint32)
+        if lod == 0 and len(indices) == 0:
+            return None
+        lods.append(indices)
+
+    chunk_vertices = np.concatenate((top, skirt)).astype(np.float32)
+    ranges = []
+    first_index = 0
+    for indices in lods:
+        ranges.append((first_index, len(indices), 0, len(chunk_vertices)))
+        first_index += len(indices)
+    return chunk_vertices, np.concatenate(lods), np.array(ranges, dtype=np.int64)
+
+
+def boundary_vertices(indices, vertex_count):
+    """
+    Finds the vertices on the open border of a triangle mesh.
+
+    Args:
+        indices: (N,) triangle indices
+        vertex_count: Number of vertices
+
+    Returns:
+        (vertex_count,) bool mask of the vertices of edges used by only one triangle
+    """
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    edges = np.sort(triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    unique, counts = np.unique(edges, axis=0, return_counts=True)
+    border = np.zeros(vertex_count, dtype=bool)
+    border[unique[counts == 1].reshape(-1)] = True
+    return border
+
+
+def mesh_chunks(vertices, indices, chunk_size=MESH_CHUNK_SIZE, lod_ratios=LOD_RATIOS):
+    """
+    Cuts a terrain mesh into square chunks, each with its own LOD chain.
+
+    Every triangle goes to the chunk its centroid lies in, so LOD 0 of the
+    chunks is exactly the authored mesh with its normals and UVs. Coarser
+    LODs are simplified with the chunk border locked, so neighbouring chunks
+    meet without cracks whatever LOD each of them is drawn with.
+
+    Pure NumPy, so chunks can be built on a worker thread and uploaded later.
+
+    Args:
+        vertices: (M, 8) interleaved vertices of the terrain mesh
+        indices: (N,) triangle indices
+        chunk_size: Side of a chunk in world units
+        lod_ratios: Triangle count of each LOD relative to LOD 0
+
+    Returns:
+        List of (key, (vertices, indices, LOD ranges)) pairs for TerrainChunks.add_chunk
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if len(triangles) == 0:
+        return []
+    centroids = vertices[triangles, 0:3].mean(axis=1)[:, [0, 2]]
+    cells = np.floor(centroids / chunk_size).astype(np.int64)
+    _, chunk_of, counts = np.unique(cells, axis=0, return_inverse=True, return_counts=True)
+    order = np.argsort(chunk_of.reshape(-1), kind='stable')
+
+    chunks = []
+    for members in np.split(order, np.cumsum(counts)[:-1]):
+        used, local = np.unique(triangles[members], return_inverse=True)
+        chunk_vertices = vertices[used]
+        chunk_indices = local.reshape(-1).astype(np.uint32)
+        locked = boundary_vertices(chunk_indices, len(chunk_vertices))
+
+        lods = [(chunk_vertices, chunk_indices)]
+        for ratio in lod_ratios[1:]:
+            lod_vertices, lod_indices = simplify(chunk_vertices, chunk_indices,
+                                                 int(len(members) * ratio), locked)
+            # Stop once the locked border leaves nothing more to remove
+            if len(lod_indices) == 0 or len(lod_indices) >= len(lods[-1][1]):
+                break
+            lods.append((lod_vertices, lod_indices))
+        i, j = cells[members[0]]
+        chunks.append(((int(i), int(j)), pack_lods(lods)))
+    return chunks
+
+
+def load_mesh_chunks(obj_path, chunk_size=MESH_CHUNK_SIZE):
+    """
+    Loads the chunks of a terrain mesh (see mesh_chunks) through the mesh cache.
+
+    Args:
+        obj_path: Path to the terrain .obj file
+        chunk_size: Side of a chunk; cached chunks of another size are rebuilt
+
+    Returns:
+        List of (key, (vertices, indices, LOD ranges)) pairs, or None if the mesh could not be loaded
+    """
+    tags = ("terrain_chunk_vertices", "terrain_chunk_indices", "terrain_chunk_ranges",
+            "terrain_chunk_table", "terrain_chunk_info")
+
+    def build():
+        vertices, indices, ranges = load_render_mesh(obj_path)
+        if vertices is None:
+            return None
+        if indices is None:
+            # Streamed triangle lists share no vertices, which the border locking relies on
+            vertices, indices = build_index_buffer(vertices)
+        else:
+            first_index, index_count, _, _ = (int(value) for value in ranges[0])
+            indices = indices[first_index:first_index + index_count]
+        chunks = mesh_chunks(vertices, indices, chunk_size)
+        if not chunks:
+            return None
+
+        # One row per chunk: x, z, first vertex, vertex count, first index, index count, first LOD, LOD count
+        table = np.zeros((len(chunks), 8), dtype=np.int64)
+        first = np.zeros(3, dtype=np.int64)
+        for row, (key, (chunk_vertices, chunk_indices, chunk_ranges)) in zip(table, chunks):
+            counts = (len(chunk_vertices), len(chunk_indices), len(chunk_ranges))
+            row[:] = (key[0], key[1], first[0], counts[0], first[1], counts[1], first[2], counts[2])
+            first += counts
+        return (np.concatenate([geometry[0] for _, geometry in chunks]),
+                np.concatenate([geometry[1] for _, geometry in chunks]),
+                np.concatenate([geometry[2] for _, geometry in chunks]),
+                table, np.array([chunk_size], dtype=np.float64))
+
+    arrays = mesh_cache.get_or_build_many(obj_path, tags, build)
+    if arrays is not None and not math.isclose(float(arrays[4][0]), chunk_size):
+        arrays = build()
+        if arrays is not None:
+            try:
+                for tag, array in zip(tags, arrays):
+                    mesh_cache.store(obj_path, tag, array)
+            except OSError as e:
+                print(f"Could not write cache entry for '{obj_path}': {e}")
+    if arrays is None:
+        return None
+
+    vertices, indices, ranges, table, _ = arrays
+    chunks = []
+    for x, z, first_vertex, vertex_count, first_index, index_count, first_lod, lod_count in table.tolist():
+        chunks.append(((x, z), (np.asarray(vertices[first_vertex:first_vertex + vertex_count]),
+                                np.asarray(indices[first_index:first_index + index_count]),
+                                np.asarray(ranges[first_lod:first_lod + lod_count]))))
+    return chunks
+
+
+class TerrainChunks:
+    def __init__(self, chunks=(), lod_count=LOD_COUNT):
+        """
+        Terrain drawn as square chunks with distance-based LODs.
+
+        Each chunk has its own VAO holding every LOD. Chunks are culled
+        against the frustum they are drawn with and pick their LOD from the
+        camera distance. The baked terrain is cut from its authored mesh (see
+        mesh_chunks), whose chunks keep their borders at every LOD. Streamed
+        terrain is built from height grids (see build_chunk), where LOD k
+        uses every 2^k-th vertex and neighbouring chunks at different LODs
+        are stitched by skirts: strips hanging from the shared borders below
+        the lowest point of the chunk, which hide the cracks.
+
+        Chunks can also be added and removed one by one (see add_chunk), for
+        terrain that is streamed in rather than baked.
+
+        Args:
+            chunks: (key, geometry) pairs to upload, e.g. from mesh_chunks
+            lod_count: Number of LODs per chunk
+        """
+        self.lod_count = lod_count
+        self.chunks = {}
+        self._info = {}  # key -> (low, high, triangles per LOD) of each chunk
+        self.triangles_drawn = 0
+        self.chunks_drawn = 0
+        self._dirty = True
+        for key, geometry in chunks:
+            self.add_chunk(key, geometry)
+
+    def add_chunk(self, key, geometry):
+        """
+        Uploads a chunk built by build_chunk. Must run on the GL thread.
+
+        Args:
+            key: Hashable chunk identifier
+            geometry: (vertices, indices, LOD ranges) from build_chunk
+        """
+        self.remove_chunk(key)
+        vertices, indices, ranges = geometry
+        chunk = self.chunks[key] = MeshHandle(f"terrain chunk {key}", vertices, indices, ranges)
+        positions = vertices[:, 0:3]
+        counts = [lod[1] // 3 for lod in chunk.lod_ranges]
+        counts += [counts[-1]] * (self.lod_count - len(counts))
+        self._info[key] = (positions.min(axis=0), positions.max(axis=0), counts)
+        self._dirty = True
+
+    def remove_chunk(self, key):
+        """
+        Frees a chunk; unknown keys are ignored.
+
+        Args:
+            key: Chunk identifier passed to add_chunk
+        """
+        chunk = self.chunks.pop(key, None)
+        if chunk is not None:
+            chunk.delete()
+            del self._info[key]
+            self._dirty = True
+
+    def _refresh(self):
+        """Gathers the per-chunk bounds and triangle counts after chunks were added or removed."""
+        self._handles = list(self.chunks.values())
+        info = [self._info[key] for key in self.chunks]
+        self.low = np.array([low for low, _, _ in info], dtype=np.float64).reshape(-1, 3)
+        self.high = np.array([high for _, high, _ in info], dtype=np.float64).reshape(-1, 3)
+        self.triangle_counts = np.array([counts for _, _, counts in info], dtype=np.int64).reshape(-1, self.lod_count)
+        self._dirty = False
+
+    def select_lods(self, camera_position):
+        """
+        Picks the LOD of every chunk from the camera distance to its bounding box.
+
+        Args:
+            camera_position: Camera position in terrain space (anything with x, y, z)
+
+        Returns:
+            (chunks,) int64 array of LOD indices
+        """
+        if self._dirty:
+            self._refresh()
+        eye = np.array([camera_position.x, camera_position.y, camera_position.z], dtype=np.float64)
+        offset = np.maximum(np.maximum(self.low - eye, eye - self.high), 0.0)
+        distance = np.linalg.norm(offset, axis=1)
+        with np.errstate(divide='ignore'):
+            lods = np.floor(np.log2(np.maximum(distance, 1e-9) / LOD_DISTANCE)).astype(np.int64) + 1
+        return np.clip(lods, 0, self.lod_count - 1)
+
+    def draw(self, clip_matrix, camera_position, model_matrix=None):
+        """
+        Draws the chunks inside a frustum.
+
+        The caller binds the shader and sets the model matrix and material;
+        this works for the main pass and for shadow passes alike.
+
+        Args:
+            clip_matrix: glm.mat4 from world to clip space of the pass (e.g.
+                projection * view, or the light-space matrix)
+            camera_position: glm.vec3 eye position in world space, for LOD selection
+            model_matrix: glm.mat4 the terrain is drawn with (default: identity)
+
+        Returns:
+            Number of chunks drawn
+        """
+        if not self.chunks:
+            self.chunks_drawn = self.triangles_drawn = 0
+            return 0
+        if self._dirty:
+            self._refresh()
+        if model_matrix is not None:
+            clip_matrix = clip_matrix * model_matrix
+            camera_position = glm.vec3(glm.inverse(model_matrix) * glm.vec4(camera_position, 1.0))
+
+        visible = np.flatnonzero(boxes_in_frustum(frustum_planes(clip_matrix), self.low, self.high))
+        lods = self.select_lods(camera_position)[visible]
+        for chunk, lod in zip(visible.tolist(), lods.tolist()):
+            self._handles[chunk].draw(lod)
+
+        self.chunks_drawn = len(visible)
+        self.triangles_drawn = int(self.triangle_counts[visible, lods].sum())
+        return self.chunks_drawn
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with the chunk count and what the last draw call rendered
+        """
+        if self._dirty:
+            self._refresh()
+        return {
+            'chunks': len(self.chunks),
+            'chunks_drawn': self.chunks_drawn,
+            'triangles_drawn': self.triangles_drawn,
+            'triangles_full': int(self.triangle_counts[:, 0].sum()) if len(self.chunks) else 0,
+        }
+
+    def delete(self):
+        """Frees the OpenGL buffers of all chunks."""
+        for chunk in self.chunks.values():
+            chunk.delete()
+        self.chunks = {}
+        self._info = {}
+        self._dirty = True
@@ -0,0 +1,36 @@
+import numpy as np
+
+from objloader import loadOBJPacked, streamOBJ
+
+TRIANGLE = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32)
+
+
+def _stream(path, **kwargs):
+    blocks = []
+    streamOBJ(str(path), lambda block: blocks.append(block.copy()), **kwargs)
+    return np.concatenate(blocks)
+
+
+def test_tab_and_double_space_faces(tmp_path):
+    path = tmp_path / "whitespace.obj"
+    path.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1\t2 3\nf 1  2 3\n")
+
+    packed = loadOBJPacked(str(path))
+
+    np.testing.assert_array_equal(packed[:, 0:3], np.concatenate((TRIANGLE, TRIANGLE)))
+    np.testing.assert_array_equal(packed, _stream(path))
+
+
+def test_mixed_corner_formats(tmp_path):
+    # The token total matches three "v/vt" corners, but the corners differ
+    path = tmp_path / "mixed.obj"
+    path.write_text("v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nvt 1 0\nvt 0 1\nvn 0 0 1\n"
+                    "f 1/1 2 3/3/1\nf -3/-3 -2/-2 -1/-1\n")
+
+    packed = loadOBJPacked(str(path))
+
+    np.testing.assert_array_equal(packed[:, 0:3], np.concatenate((TRIANGLE, TRIANGLE)))
+    np.testing.assert_array_equal(packed[0:3, 6:8], [[0, 0], [0, 0], [0, 1]])
+    np.testing.assert_array_equal(packed[0:3, 3:6], [[0, 0, 0], [0, 0, 0], [0, 0, 1]])
+    np.testing.assert_array_equal(packed[3:6, 6:8], [[0, 0], [1, 0], [0, 1]])
+    np.testing.assert_array_equal(packed, _stream(path, chunk_bytes=16))
@@ -0,0 +1,90 @@
+import numpy as np
+from PIL import Image
+
+from asset_cache import texture_cache
+
+
+def build_mip_chain(img_data):
+    """
+    Builds the full mip chain of an image down to 1x1 with a box filter.
+
+    Args:
+        img_data: (height, width, channels) uint8 array for level 0
+
+    Returns:
+        List of (height, width, channels) uint8 arrays, largest first
+    """
+    # PIL infers RGB or RGBA from the uint8 dtype and the channel count
+    levels = [np.ascontiguousarray(img_data, dtype=np.uint8)]
+    image = Image.fromarray(levels[0])
+    while image.width > 1 or image.height > 1:
+        size = (max(1, image.width // 2), max(1, image.height // 2))
+        image = image.resize(size, Image.BOX)
+        levels.append(np.array(image, dtype=np.uint8))
+    return levels
+
+
+def _pack_levels(levels):
+    """Concatenates mip levels into one flat byte array plus a (levels, 3) shape table."""
+    shapes = np.array([level.shape for level in levels], dtype=np.int32)
+    data = np.concatenate([level.reshape(-1) for level in levels])
+    return data, shapes
+
+
+def _unpack_levels(data, shapes):
+    """Splits a flat byte array back into mip levels without copying."""
+    levels = []
+    offset = 0
+    for height, width, channels in shapes.tolist():
+        size = height * width * channels
+        levels.append(data[offset:offset + size].reshape(height, width, channels))
+        offset += size
+    return levels
+
+
+def load_texture_levels(path):
+    """
+    Returns the flipped RGBA mip chain of a texture through the texture cache.
+
+    On a miss the image is decoded with PIL, flipped for OpenGL and
+    downsampled once; afterwards every level is a slice of one memory-mapped
+    file and can be handed straight to glTexImage2D. Safe to call off the GL
+    thread.
+
+    Args:
+        path: Path to the texture file
+
+    Returns:
+        List of (height, width, 4) uint8 arrays, largest first
+    """
+    def build():
+        image = Image.open(path).transpose(Image.FLIP_TOP_BOTTOM)
+        img_data = np.array(image.convert("RGBA"), dtype=np.uint8)
+        return _pack_levels(build_mip_chain(img_data))
+
+    data, shapes = texture_cache.get_or_build_many(path, ("mips", "mip_shapes"), build)
+    return _unpack_levels(data, np.asarray(shapes))
+
+
+def load_cubemap_face(path):
+    """
+    Returns the decoded RGB pixels of a cubemap face through the texture cache.
+
+    Args:
+        path: Path to the face image
+
+    Returns:
+        (height, width, 3) uint8 array (memory-mapped when cached)
+    """
+    pixels = texture_cache.get_or_build(
+        path, "rgb", lambda: np.array(Image.open(path).convert("RGB"), dtype=np.uint8))
+
+    # After a miss, hand out the stored entry so the decoded copy can be freed
+    if pixels is not None and not isinstance(pixels, np.memmap):
+        try:
+            cached = texture_cache.load(path, "rgb")
+        except OSError:
+            cached = None
+        if cached is not None:
+            return cached
+    return pixels
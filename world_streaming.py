@@ -0,0 +1,402 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import glm
+import numpy as np
+
+from terrain import Heightfield, HEIGHTFIELD_SPACING, surface_grids
+from terrain_renderer import TerrainChunks, grid_vertices, build_chunk, RENDER_STRIDE, CHUNK_QUADS
+
+# Side of a streamed chunk in heightfield samples (the same chunks the baked terrain is cut into)
+WORLD_CHUNK_SAMPLES = CHUNK_QUADS * RENDER_STRIDE
+
+# Chunks whose box is within this XZ distance of the player are loaded ...
+LOAD_RADIUS = 100.0
+
+# ... and kept until it grows past this one, so walking along a chunk border does not thrash
+UNLOAD_RADIUS = 130.0
+
+# Chunks within this distance are waited for by update(block=True), e.g. before the first frame
+BLOCK_RADIUS = 32.0
+
+# Main-thread time per frame spent uploading finished chunks (at least one chunk is uploaded)
+UPLOAD_BUDGET = 0.002
+
+# Procedural terrain: fractal value noise, in world units
+NOISE_OCTAVES = 5
+NOISE_WAVELENGTH = 64.0
+NOISE_AMPLITUDE = 3.0
+NOISE_GAIN = 0.45
+
+# The baked terrain is kept where it exists and fades into the noise over BLEND_WIDTH,
+# starting BLEND_MARGIN inside its bounds where the mesh border is ragged
+BLEND_MARGIN = 12.0
+BLEND_WIDTH = 24.0
+
+# Candidate positions drawn per wanted prop when placing props in a chunk
+PROP_ATTEMPTS = 8
+
+
+def _hash_unit(ix, iz, seed):
+    """Deterministic pseudo-random value in [0, 1) per integer lattice point."""
+    mask = np.uint64(0xffffffff)
+    h = (ix.astype(np.int64).astype(np.uint64) * np.uint64(374761393) +
+         iz.astype(np.int64).astype(np.uint64) * np.uint64(668265263) +
+         np.uint64(seed & 0xffffffff) * np.uint64(2246822519)) & mask
+    h = ((h ^ (h >> np.uint64(13))) * np.uint64(1274126177)) & mask
+    h ^= h >> np.uint64(16)
+    return h.astype(np.float64) / 4294967296.0
+
+
+def value_noise(x, z, seed):
+    """
+    Smoothly interpolated lattice noise.
+
+    Args:
+        x: Array of x coordinates in lattice units
+        z: Array of z coordinates, same shape as x
+        seed: Integer seed
+
+    Returns:
+        Array of values in [-1, 1], same shape as x
+    """
+    ix, iz = np.floor(x), np.floor(z)
+    tx, tz = x - ix, z - iz
+    tx = tx * tx * (3.0 - 2.0 * tx)
+    tz = tz * tz * (3.0 - 2.0 * tz)
+    v00 = _hash_unit(ix, iz, seed)
+    v01 = _hash_unit(ix + 1, iz, seed)
+    v10 = _hash_unit(ix, iz + 1, seed)
+    v11 = _hash_unit(ix + 1, iz + 1, seed)
+    value = (v00 * (1.0 - tx) + v01 * tx) * (1.0 - tz) + (v10 * (1.0 - tx) + v11 * tx) * tz
+    return value * 2.0 - 1.0
+
+
+def fractal_heights(x, z, seed):
+    """
+    Procedural terrain height: NOISE_OCTAVES octaves of value noise.
+
+    Args:
+        x: Array of world x coordinates
+        z: Array of world z coordinates, same shape as x
+        seed: Integer seed
+
+    Returns:
+        Array of heights, same shape as x
+    """
+    heights = np.zeros(np.shape(x), dtype=np.float64)
+    frequency = 1.0 / NOISE_WAVELENGTH
+    amplitude = NOISE_AMPLITUDE
+    for octave in range(NOISE_OCTAVES):
+        heights += amplitude * value_noise(x * frequency, z * frequency, seed + octave)
+        frequency *= 2.0
+        amplitude *= NOISE_GAIN
+    return heights
+
+
+class WorldChunk:
+    def __init__(self, key, heightfield, geometry, props):
+        """
+        One streamed square of the world, built on the worker thread.
+
+        Args:
+            key: (i, j) chunk coordinates
+            heightfield: terrain.Heightfield of the chunk
+            geometry: (vertices, indices, LOD ranges) from terrain_renderer.build_chunk
+            props: Dictionary of prop type -> list of (id, glm.mat4) placed on the chunk
+        """
+        self.key = key
+        self.heightfield = heightfield
+        self.geometry = geometry
+        self.props = props
+        self.collision_entries = []
+        self.collectibles = []
+        self.scene_instances = []
+
+
+class StreamingWorld:
+    def __init__(self, props, seed=0, base=None, uv_transform=None, exclude_zones=(),
+                 on_chunk_loaded=None, on_chunk_unloaded=None):
+        """
+        Endless terrain generated and streamed in chunks around the player.
+
+        Chunk heights come from fractal noise, blended with the baked terrain
+        where it exists, so the hand-made map stays as it is in the middle
+        of an infinite world. A single worker thread builds each chunk's
+        heightfield, render geometry and props; update() uploads finished
+        chunks under a per-frame time budget and frees chunks that fell
+        behind, so memory and per-frame cost depend on the load radius only,
+        not on how far the player walked. Everything derives from the seed
+        and the chunk coordinates, so a chunk that is unloaded and loaded
+        again looks the same; collected props stay collected.
+
+        The world answers the same height, slope and walkability queries as
+        terrain.Heightfield and can be passed to Player as its terrain.
+
+        Args:
+            props: Dictionary of prop type -> (expected count per chunk,
+                minimum spacing, height offset)
+            seed: Integer seed of the world
+            base: terrain.Heightfield of the baked terrain to keep, or None
+            uv_transform: (2, 3) planar texture mapping, see terrain_renderer.fit_planar_uv
+            exclude_zones: (x_min, x_max, z_min, z_max) rectangles kept free of props
+            on_chunk_loaded: Called with each WorldChunk after it was uploaded
+            on_chunk_unloaded: Called with each WorldChunk before it is freed
+        """
+        self.props = props
+        self.seed = seed
+        self.base = base
+        self.uv_transform = uv_transform
+        self.exclude_zones = list(exclude_zones)
+        self.on_chunk_loaded = on_chunk_loaded
+        self.on_chunk_unloaded = on_chunk_unloaded
+        self.spacing = HEIGHTFIELD_SPACING
+        self.chunk_size = WORLD_CHUNK_SAMPLES * self.spacing
+        self.default = 0.0
+
+        self.chunks = {}          # (i, j) -> resident WorldChunk
+        self.terrain = TerrainChunks()
+        self.collected = set()    # (i, j, prop type, id) of props removed by the game
+        self.version = 0          # bumped whenever the resident chunks change
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="world")
+        self._pending = {}        # (i, j) -> Future, closest first
+        self._center = None
+        self._prop_lists = None
+
+    # Generation (worker thread)
+
+    def heights_at(self, points):
+        """
+        World height from the noise and the baked terrain, without chunk lookups.
+
+        Args:
+            points: (N, 2) array of world XZ coordinates
+
+        Returns:
+            (N,) float64 heights
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        heights = fractal_heights(points[:, 0], points[:, 1], self.seed)
+        if self.base is not None:
+            x_min, x_max, z_min, z_max = self.base.bounds
+            inside = np.minimum(np.minimum(points[:, 0] - x_min, x_max - points[:, 0]),
+                                np.minimum(points[:, 1] - z_min, z_max - points[:, 1]))
+            weight = np.clip((inside - BLEND_MARGIN) / BLEND_WIDTH, 0.0, 1.0)
+            weight = weight * weight * (3.0 - 2.0 * weight)
+            blended = weight > 0.0
+            if blended.any():
+                heights[blended] += weight[blended] * (self.base.heights_at(points[blended]) - heights[blended])
+        return heights
+
+    def _build(self, key):
+        """Builds a chunk from its coordinates. Runs on the worker thread."""
+        i, j = key
+        origin = (i * self.chunk_size, j * self.chunk_size)
+
+        # One extra sample around the chunk so normals match across chunk borders
+        samples = np.arange(-1, WORLD_CHUNK_SAMPLES + 2) * self.spacing
+        gx, gz = np.meshgrid(origin[0] + samples, origin[1] + samples)
+        padded = self.heights_at(np.stack((gx.reshape(-1), gz.reshape(-1)), axis=1)).reshape(gx.shape)
+        normals, slopes = surface_grids(padded, self.spacing)
+        heightfield = Heightfield(padded[1:-1, 1:-1], origin, self.spacing, default=self.default)
+        heightfield.normals = np.ascontiguousarray(normals[1:-1, 1:-1])
+        heightfield.slopes = np.ascontiguousarray(slopes[1:-1, 1:-1])
+
+        grid = slice(None, None, RENDER_STRIDE)
+        vertices = grid_vertices(heightfield.heights[grid, grid], heightfield.normals[grid, grid], origin,
+                                 self.spacing * RENDER_STRIDE, self.uv_transform)
+        covered = np.ones(vertices.shape[:2], dtype=bool)
+        # Skirts on every border: the neighbours may be at another LOD or not loaded yet
+        geometry = build_chunk(vertices, covered, (True, True, True, True))
+
+        rng = np.random.default_rng(np.random.SeedSequence([self.seed & 0xffffffff, i + (1 << 31), j + (1 << 31)]))
+        props = {}
+        for object_type, (per_chunk, min_spacing, height_offset) in self.props.items():
+            wanted = rng.poisson(per_chunk)
+            candidates = origin + rng.uniform(0.0, self.chunk_size, size=(wanted * PROP_ATTEMPTS, 2))
+            placed = []
+            for x, z in candidates.tolist():
+                if len(placed) == wanted:
+                    break
+                if any(x_min <= x <= x_max and z_min <= z <= z_max
+                       for x_min, x_max, z_min, z_max in self.exclude_zones):
+                    continue
+                if all((x - px) ** 2 + (z - pz) ** 2 >= min_spacing ** 2 for px, pz in placed):
+                    placed.append((x, z))
+            heights = heightfield.heights_at(placed).tolist()
+            props[object_type] = [
+                (index, glm.translate(glm.mat4(1.0), glm.vec3(x, height + height_offset, z)))
+                for index, ((x, z), height) in enumerate(zip(placed, heights))
+                if (i, j, object_type, index) not in self.collected
+            ]
+        return WorldChunk(key, heightfield, geometry, props)
+
+    # Streaming (main thread)
+
+    def _distance(self, key, x, z):
+        """XZ distance from a point to a chunk's square."""
+        x0, z0 = key[0] * self.chunk_size, key[1] * self.chunk_size
+        dx = max(x0 - x, 0.0, x - x0 - self.chunk_size)
+        dz = max(z0 - z, 0.0, z - z0 - self.chunk_size)
+        return math.hypot(dx, dz)
+
+    def _schedule(self, x, z):
+        """Requests the chunks in the load radius and drops those past the unload radius."""
+        reach = int(math.ceil(LOAD_RADIUS / self.chunk_size))
+        ci, cj = self._center
+        wanted = []
+        for i in range(ci - reach, ci + reach + 1):
+            for j in range(cj - reach, cj + reach + 1):
+                distance = self._distance((i, j), x, z)
+                if distance <= LOAD_RADIUS:
+                    wanted.append((distance, (i, j)))
+        wanted.sort()
+
+        # Cancel far requests and re-queue the rest closest first
+        pending = {}
+        for key, future in self._pending.items():
+            if self._distance(key, x, z) > UNLOAD_RADIUS:
+                future.cancel()
+            else:
+                pending[key] = future
+        for _, key in wanted:
+            if key not in self.chunks and key not in pending:
+                pending[key] = self.executor.submit(self._build, key)
+        self._pending = dict(sorted(pending.items(), key=lambda item: self._distance(item[0], x, z)))
+
+        for key in [key for key in self.chunks if self._distance(key, x, z) > UNLOAD_RADIUS]:
+            self._unload(key)
+
+    def _unload(self, key):
+        chunk = self.chunks.pop(key)
+        if self.on_chunk_unloaded is not None:
+            self.on_chunk_unloaded(chunk)
+        self.terrain.remove_chunk(key)
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._prop_lists = None
+
+    def update(self, position, block=False):
+        """
+        Streams chunks around a position. Call once per frame from the GL thread.
+
+        Args:
+            position: Player position (anything with x and z)
+            block: Wait for the chunks within BLOCK_RADIUS instead of
+                leaving them to later frames (for the first frame)
+
+        Returns:
+            True if chunks were loaded or unloaded
+        """
+        version = self.version
+        x, z = position.x, position.z
+        center = (math.floor(x / self.chunk_size), math.floor(z / self.chunk_size))
+        if center != self._center:
+            self._center = center
+            self._schedule(x, z)
+
+        deadline = time.perf_counter() + UPLOAD_BUDGET
+        for key, future in list(self._pending.items()):
+            if not (block and self._distance(key, x, z) <= BLOCK_RADIUS):
+                if not future.done():
+                    continue
+                if self.version != version and time.perf_counter() > deadline:
+                    break
+            del self._pending[key]
+            try:
+                chunk = future.result()
+            except Exception as e:
+                print(f"Error generating world chunk {key}: {e}")
+                continue
+            if chunk.geometry is not None:
+                self.terrain.add_chunk(key, chunk.geometry)
+            chunk.geometry = None
+            self.chunks[key] = chunk
+            if self.on_chunk_loaded is not None:
+                self.on_chunk_loaded(chunk)
+            self._changed()
+        return self.version != version
+
+    # Queries
+
+    def chunk_at(self, x, z):
+        """Resident WorldChunk containing (x, z), or None."""
+        return self.chunks.get((math.floor(x / self.chunk_size), math.floor(z / self.chunk_size)))
+
+    def height_at(self, x, z):
+        """Terrain height at (x, z); exact for chunks that are not loaded yet."""
+        chunk = self.chunk_at(x, z)
+        if chunk is None:
+            return float(self.heights_at([(x, z)])[0])
+        return chunk.heightfield.height_at(x, z)
+
+    def slope_at(self, x, z):
+        """Slope angle in degrees at (x, z); 0 where no chunk is loaded."""
+        chunk = self.chunk_at(x, z)
+        return chunk.heightfield.slope_at(x, z) if chunk is not None else 0.0
+
+    def normal_at(self, x, z):
+        """Upward unit normal at (x, z) as a tuple; (0, 1, 0) where no chunk is loaded."""
+        chunk = self.chunk_at(x, z)
+        return chunk.heightfield.normal_at(x, z) if chunk is not None else (0.0, 1.0, 0.0)
+
+    def is_walkable(self, x, z, max_slope_angle):
+        """True if (x, z) is no steeper than max_slope_angle (always True where no chunk is loaded)."""
+        chunk = self.chunk_at(x, z)
+        return chunk is None or chunk.heightfield.is_walkable(x, z, max_slope_angle)
+
+    def prop_transforms(self):
+        """
+        Props of all resident chunks.
+
+        Returns:
+            Dictionary of prop type -> list of glm.mat4; fresh lists the caller
+            may modify, rebuilt only after chunks changed
+        """
+        if self._prop_lists is None:
+            self._prop_lists = {object_type: [transform for chunk in self.chunks.values()
+                                              for _, transform in chunk.props[object_type]]
+                                for object_type in self.props}
+        return {object_type: list(transforms) for object_type, transforms in self._prop_lists.items()}
+
+    def remove_prop(self, object_type, transform):
+        """
+        Removes a prop for good, e.g. a collected ball; it does not come back
+        when its chunk is generated again.
+
+        Args:
+            object_type: Prop type
+            transform: glm.mat4 returned by prop_transforms
+        """
+        position = transform[3]
+        chunk = self.chunk_at(position.x, position.z)
+        if chunk is None:
+            return
+        props = chunk.props[object_type]
+        for k, (index, candidate) in enumerate(props):
+            if candidate is transform:
+                del props[k]
+                self.collected.add((chunk.key[0], chunk.key[1], object_type, index))
+                self._prop_lists = None
+                return
+
+    def stats(self):
+        """
+        Returns:
+            Dictionary with resident and pending chunk counts and terrain draw stats
+        """
+        stats = self.terrain.stats()
+        stats.update({'resident': len(self.chunks), 'pending': len(self._pending)})
+        return stats
+
+    def delete(self):
+        """Stops the worker and frees all chunks."""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        self.executor.shutdown(wait=True)
+        self.terrain.delete()
+        self.chunks = {}